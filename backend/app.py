@@ -1,18 +1,34 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, render_template, jsonify, request, session, Response
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import uuid
+import hashlib
 import json
+import math
 import sys
 import os
 import threading
 import time
+import atexit
 import numpy as np
 
 # Importar los modelos
 from models.fireRescueModel import FireRescueModel, grid_data
 from models.fireState import FireState
+from models.fireRisk import fire_risk, MAX_HORIZON
+from models.boardLayouts import build_board
 from models.firefighterRole import FireFighterRole  
 from models.poi import POIType
+from models.gameJournal import GameJournal
+from models.modelSnapshot import (capture_snapshot, restore_snapshot,
+                                  encode_snapshot, decode_snapshot, SNAPSHOT_VERSION)
+from persistence import create_store, CheckpointWriter
+from history import HistoryStream
+from fanout import create_client_manager, encode_frame
+from codec import encode_binary_state, BINARY_MIMETYPE
+from instrumentation import MetricsRegistry, StepProfiler, instrument_model
+from warmpool import WarmPool
+from memory import deep_sizeof, process_memory, thread_names
+from pipeline import FramePipeline, StateFrame
 
 # Configure Flask with frontend paths
 frontend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
@@ -20,18 +36,88 @@ app = Flask(__name__,
             template_folder=os.path.join(frontend_path, 'templates'),
             static_folder=os.path.join(frontend_path, 'static'))
 app.config['SECRET_KEY'] = 'fire-rescue-secret-key-2025'
-socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Almacenar las simulaciones activas
+# Cola de mensajes para repartir los emits entre varios workers de Socket.IO
+# (unix:///ruta.sock o tcp://host:puerto usan broker.py; redis:// etc. los managers de python-socketio)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+# Ritmo máximo de simulation_update por cliente y paquetes en cola a partir de los
+# cuales un cliente se considera atrasado (0 desactiva cada límite)
+SOCKETIO_MAX_CLIENT_FPS = float(os.environ.get('SOCKETIO_MAX_CLIENT_FPS') or 30)
+SOCKETIO_MAX_CLIENT_BACKLOG = int(os.environ.get('SOCKETIO_MAX_CLIENT_BACKLOG') or 8)
+client_manager = create_client_manager(SOCKETIO_MESSAGE_QUEUE)
+socketio = SocketIO(app, cors_allowed_origins="*", client_manager=client_manager)
+
+# Diario de partidas (record/replay), activo por defecto
+JOURNAL_ENABLED = os.environ.get('JOURNAL_ENABLED', 'True').lower() == 'true'
+JOURNAL_KEYFRAME_INTERVAL = int(os.environ.get('JOURNAL_KEYFRAME_INTERVAL') or 120)
+# Historial para ?step=N: bytes del diario en memoria por simulación (0 = sin límite);
+# lo más antiguo se vuelca a archivos temporales en HISTORY_SPILL_DIR
+HISTORY_MEMORY_BUDGET = int(os.environ.get('HISTORY_MEMORY_BUDGET') or 1024 * 1024)
+HISTORY_SPILL_DIR = os.environ.get('HISTORY_SPILL_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'history')
+
+# Hilos que serializan y emiten los estados del auto-run fuera del hilo que avanza
+# la simulación (0 = en el mismo hilo) y frames en espera por simulación
+FRAME_PIPELINE_WORKERS = int(os.environ.get('FRAME_PIPELINE_WORKERS') or 2)
+FRAME_QUEUE_SIZE = int(os.environ.get('FRAME_QUEUE_SIZE') or 2)
+
+# Muestras por petición del mapa de riesgo de fuego (/risk)
+RISK_SAMPLES = int(os.environ.get('RISK_SAMPLES') or 512)
+
+# Simulaciones precalentadas por tablero para create_simulation (0 desactiva el pool)
+SIMULATION_POOL_SIZE = int(os.environ.get('SIMULATION_POOL_SIZE') or 8)
+SIMULATION_POOL_BOARDS = [board.strip() for board in
+                          (os.environ.get('SIMULATION_POOL_BOARDS') or 'stock').split(',') if board.strip()]
+# Máximo de simulaciones por petición en /api/create_simulations
+MAX_BULK_SIMULATIONS = int(os.environ.get('MAX_BULK_SIMULATIONS') or 100)
+
+# Persistencia de simulaciones (compartida entre workers y reinicios)
+default_store_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'simulations.db')
+SIMULATION_STORE = os.environ.get('SIMULATION_STORE') or f'sqlite:///{default_store_path}'
+CHECKPOINT_EVERY_STEPS = int(os.environ.get('CHECKPOINT_EVERY_STEPS') or 1)
+CHECKPOINT_BATCH_SIZE = int(os.environ.get('CHECKPOINT_BATCH_SIZE') or 16)
+CHECKPOINT_FLUSH_INTERVAL = float(os.environ.get('CHECKPOINT_FLUSH_INTERVAL') or 1.0)
+# Segundos sin uso tras los que una simulación se descarga de la memoria del worker
+# (sigue en el almacén y se recarga al pedirla); 0 = no descargar nunca
+SIMULATION_IDLE_TIMEOUT = float(os.environ.get('SIMULATION_IDLE_TIMEOUT') or 0)
+AUTO_STOP_TIMEOUT = 5  # segundos de espera a que termine el paso en curso de un auto-run detenido
+
+# Los checkpoints se codifican al escribirlos (fuera del hilo que avanza la simulación);
+# on_conflict se asigna junto a get_simulation
+checkpoint_writer = CheckpointWriter(create_store(SIMULATION_STORE),
+                                     batch_size=CHECKPOINT_BATCH_SIZE,
+                                     flush_interval=CHECKPOINT_FLUSH_INTERVAL,
+                                     encode=encode_snapshot)
+
+# Almacenar las simulaciones activas (cache local del worker)
 active_simulations = {}
 
+# Métricas Prometheus; la instrumentación por fase del modelo es opcional
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+# /api/debug/memory recorre todas las simulaciones cargadas: solo si se activa
+DEBUG_MEMORY_ENABLED = os.environ.get('DEBUG_MEMORY_ENABLED', 'False').lower() == 'true'
+metrics = MetricsRegistry()
+metrics.gauge('active_simulations', 'Simulations loaded in this worker',
+              lambda: len(active_simulations))
+metrics.gauge('auto_running_simulations', 'Simulations stepping automatically in this worker',
+              lambda: sum(1 for sim in list(active_simulations.values()) if sim.auto_step))
+metrics.gauge('checkpoint_queue_depth', 'Checkpoints waiting to be flushed to the store',
+              lambda: checkpoint_writer.queue_depth)
+client_manager.configure_pacing(SOCKETIO_MAX_CLIENT_FPS, SOCKETIO_MAX_CLIENT_BACKLOG, metrics)
+frame_pipeline = FramePipeline(FRAME_PIPELINE_WORKERS, FRAME_QUEUE_SIZE, metrics)
+metrics.gauge('pipeline_queue_depth', 'State frames waiting to be serialized and emitted',
+              lambda: frame_pipeline.queue_depth)
+
 class SimulationManager:
-    def __init__(self, simulation_id):
+    def __init__(self, simulation_id, model=None, history_budget=None):
         self.simulation_id = simulation_id
-        self.model = FireRescueModel(grid_data.copy())
+        self.model = model if model is not None else FireRescueModel(grid_data.copy())
         self.is_running = False
         self.auto_step = False
         self.step_delay = 1  # segundos entre pasos automáticos
+        self._auto_stop = None
+        self._auto_thread = None
+        self.last_access = time.monotonic()  # para descargar las simulaciones sin uso
         self.event_logs = []  # Store event log messages
         # Track previous state for change detection
         self.prev_knocked_out = set()
@@ -39,15 +125,93 @@ class SimulationManager:
         self.prev_lost_victims = 0
         self.prev_rescued_victims = 0
         self.prev_damage = 0
+        self.journal = None
+        self.history_budget = HISTORY_MEMORY_BUDGET if history_budget is None else history_budget
+        if JOURNAL_ENABLED:
+            self.journal = GameJournal(HistoryStream(self.history_budget, HISTORY_SPILL_DIR),
+                                       keyframe_interval=JOURNAL_KEYFRAME_INTERVAL)
+            self.model.attach_journal(self.journal)
+        # Checkpoints
+        self.revision = 0
+        self.steps_since_checkpoint = 0
+        self.retired = False  # sustituida o eliminada: ya no guarda checkpoints
+        # Cache del estado serializado por formato (y del riesgo, 'risk_<horizonte>'):
+        # {clave: (versión del modelo, payload)}
+        self._state_cache = {}
+        self._logs_version = None
+        self._logs_lock = threading.Lock()
+        self.last_logs = []
+        self._last_frame = None
+        # Instrumentación y perfilado bajo demanda
+        if METRICS_ENABLED:
+            instrument_model(self.model, metrics)
+        self.profiler = None
+    
+    def checkpoint(self, immediate=False, data=None):
+        """Guardar un snapshot compacto de la simulación en el almacén (`data`: ya codificado)
+        
+        Sin `data` solo se captura el estado; checkpoint_writer lo codifica al escribirlo.
+        """
+        if self.retired:
+            return
+        self.revision += 1
+        self.steps_since_checkpoint = 0
+        if data is None:
+            data = self.capture_checkpoint()
+        checkpoint_writer.submit(self.simulation_id, self.revision, data, immediate=immediate)
+    
+    def encode_checkpoint(self):
+        """Snapshot compacto de la simulación, tal como se guarda en el almacén"""
+        return encode_snapshot(self.capture_checkpoint())
+    
+    def capture_checkpoint(self):
+        """Checkpoint sin codificar (copias: no cambia aunque la simulación siga avanzando)"""
+        return {
+            'version': SNAPSHOT_VERSION,
+            'model': capture_snapshot(self.model),
+            'step_delay': self.step_delay,
+            'history_budget': self.history_budget,
+            'event_logs': list(self.event_logs),
+            'prev_knocked_out': list(self.prev_knocked_out),
+            'prev_carrying': list(self.prev_carrying.items()),
+            'prev_lost_victims': self.prev_lost_victims,
+            'prev_rescued_victims': self.prev_rescued_victims,
+            'prev_damage': self.prev_damage,
+        }
+    
+    def set_history_budget(self, history_budget):
+        self.history_budget = history_budget
+        if self.journal is not None:
+            self.journal.stream.memory_budget = history_budget
+    
+    @classmethod
+    def from_checkpoint(cls, simulation_id, revision, data):
+        """Reconstruir una simulación desde un checkpoint"""
+        checkpoint = decode_snapshot(data)
+        sim_manager = cls(simulation_id, model=restore_snapshot(checkpoint['model']),
+                          history_budget=checkpoint.get('history_budget'))
+        sim_manager.revision = revision
+        sim_manager.step_delay = checkpoint['step_delay']
+        sim_manager.event_logs = checkpoint['event_logs']
+        sim_manager.prev_knocked_out = set(checkpoint['prev_knocked_out'])
+        sim_manager.prev_carrying = dict(checkpoint['prev_carrying'])
+        sim_manager.prev_lost_victims = checkpoint['prev_lost_victims']
+        sim_manager.prev_rescued_victims = checkpoint['prev_rescued_victims']
+        sim_manager.prev_damage = checkpoint['prev_damage']
+        return sim_manager
         
-    def generate_step_logs(self):
-        """Generate logs only when important events occur (changes from previous state)"""
+    def generate_step_logs(self, model=None):
+        """Generate logs only when important events occur (changes from previous state)
+        
+        `model` puede ser un StateFrame; por defecto el modelo actual.
+        """
+        model = self.model if model is None else model
         logs = []
         
         current_knocked_out = set()
         current_carrying = {}
         
-        for agent in self.model.agent_list:
+        for agent in model.agent_list:
             # Track knocked out agents
             if agent.is_knocked_out():
                 current_knocked_out.add(agent.unique_id)
@@ -72,34 +236,35 @@ class SimulationManager:
         for agent_id, victim_id in self.prev_carrying.items():
             if agent_id not in current_carrying:
                 # Agent dropped victim - check if rescued
-                if len(self.model.rescued_victims) > self.prev_rescued_victims:
+                if len(model.rescued_victims) > self.prev_rescued_victims:
                     logs.append({
                         'message': f"✅ Victim {victim_id} rescued by Agent {agent_id}!",
                         'type': 'success'
                     })
         
         # Log lost victims (only when count increases)
-        if len(self.model.lost_victims) > self.prev_lost_victims:
-            new_lost = len(self.model.lost_victims) - self.prev_lost_victims
+        if len(model.lost_victims) > self.prev_lost_victims:
+            new_lost = len(model.lost_victims) - self.prev_lost_victims
             logs.append({
-                'message': f"❌ {new_lost} victim(s) lost to fire! ({len(self.model.lost_victims)}/4)",
+                'message': f"❌ {new_lost} victim(s) lost to fire! ({len(model.lost_victims)}/{model.rules.max_victims_lost})",
                 'type': 'danger'
             })
         
         # Log structural damage (only when increases)
-        if self.model.damage_count > self.prev_damage:
-            new_damage = self.model.damage_count - self.prev_damage
+        if model.damage_count > self.prev_damage:
+            new_damage = model.damage_count - self.prev_damage
             logs.append({
-                'message': f"🏚️ Wall damaged! (+{new_damage}, total: {self.model.damage_count}/24)",
-                'type': 'warning' if self.model.damage_count < 18 else 'danger'
+                'message': f"🏚️ Wall damaged! (+{new_damage}, total: {model.damage_count}/{model.rules.max_damage})",
+                # Peligro a partir de 3/4 del daño máximo (18 de 24 con las reglas de serie)
+                'type': 'warning' if model.damage_count < model.rules.max_damage * 3 // 4 else 'danger'
             })
         
         # Update previous state
         self.prev_knocked_out = current_knocked_out
         self.prev_carrying = current_carrying
-        self.prev_lost_victims = len(self.model.lost_victims)
-        self.prev_rescued_victims = len(self.model.rescued_victims)
-        self.prev_damage = self.model.damage_count
+        self.prev_lost_victims = len(model.lost_victims)
+        self.prev_rescued_victims = len(model.rescued_victims)
+        self.prev_damage = model.damage_count
         
         # Add to persistent log history
         self.event_logs.extend(logs)
@@ -108,10 +273,133 @@ class SimulationManager:
         
         return logs
         
-    def get_state(self):
-        """Obtener el estado completo de la simulación"""
+    def current_logs(self, model=None):
+        """Logs de la versión actual del modelo o de un StateFrame (se generan una sola vez por versión)
+        
+        Un frame más antiguo que los últimos logs generados no tiene logs propios:
+        sus cambios ya van en los de la versión posterior.
+        """
+        model = self.model if model is None else model
+        with self._logs_lock:
+            if self._logs_version != model.version:
+                if self._logs_version is not None and model.version < self._logs_version:
+                    return []
+                self._logs_version = model.version
+                self.last_logs = self.generate_step_logs(model)
+            return self.last_logs
+    
+    def get_state(self, state_format='json'):
+        """Obtener el estado completo de la simulación (dict, texto JSON, bytes binarios o EncodedFrame)
+        
+        El resultado se memoiza por versión del modelo y formato; no debe modificarse.
+        """
+        return self.versioned_state(state_format)[1]
+    
+    def versioned_state(self, state_format='json'):
+        """Como get_state, pero devuelve (versión, estado) con la versión del modelo que se serializó"""
+        version = self.model.version
+        cached = self._state_cache.get(state_format)
+        if cached is not None and cached[0] == version:
+            return cached
+        
+        logs = self.current_logs()
+        if state_format == 'binary':
+            payload = encode_binary_state(self.model, logs)
+        elif state_format.startswith('frame_'):
+            # Evento simulation_update ya codificado, compartido por todos los espectadores
+            payload = encode_frame(socketio.server, 'simulation_update',
+                                   self.get_state(state_format[len('frame_'):]))
+        elif state_format == 'json_text':
+            payload = json.dumps(self.get_state('json'), ensure_ascii=False, separators=(',', ':'))
+        else:
+            payload = self.build_state(logs)
+        
+        # Si el hilo automático avanzó mientras se serializaba, no guardar en cache
+        if self.model.version == version:
+            self._state_cache[state_format] = (version, payload)
+        return version, payload
+    
+    def get_risk(self, horizon):
+        """Riesgo de fuego por celda en `horizon` rondas, como texto JSON memoizado por versión"""
+        return self.versioned_risk(horizon)[1]
+    
+    def versioned_risk(self, horizon):
+        """Como get_risk, pero devuelve (versión, riesgo) con la versión del modelo simulada"""
+        key = f'risk_{horizon}'
+        version = self.model.version
+        cached = self._state_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached
+        
+        risk = fire_risk(self.model, horizon, RISK_SAMPLES)
+        payload = json.dumps({
+            'step_count': self.model.step_count,
+            'horizon': horizon,
+            'samples': RISK_SAMPLES,
+            'risk': np.round(risk, 4).tolist()
+        }, separators=(',', ':'))
+        if self.model.version == version:
+            self._state_cache[key] = (version, payload)
+        return version, payload
+    
+    def state_at(self, step, state_format='json_text'):
+        """Estado tras `step` pasos, reconstruido desde el diario (sin logs)
+        
+        Lanza LookupError si el diario está desactivado y ValueError si el paso no está en él.
+        """
+        if self.journal is None:
+            raise LookupError('Journal disabled')
+        model = self.journal.model_at(step)
+        if state_format == 'binary':
+            return encode_binary_state(model, [])
+        return json.dumps(self.build_state([], model), ensure_ascii=False, separators=(',', ':'))
+    
+    def close(self):
+        """Liberar el historial (y su archivo temporal) de una simulación eliminada"""
+        if self.journal is not None:
+            self.journal.stream.close()
+    
+    def retire(self):
+        """Detener y liberar una simulación que sale de active_simulations (sustituida o eliminada)"""
+        self.retired = True
+        self.stop_auto_simulation()
+        thread = self._auto_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(AUTO_STOP_TIMEOUT)
+        self.close()
+    
+    def memory_footprint(self):
+        """Bytes que ocupa la simulación en este worker, en total y por partes"""
+        stream = self.journal.stream if self.journal is not None else None
+        return {
+            # Los ids dan acceso a /step, /auto_start y /delete: solo un prefijo de su hash
+            'simulation': hashlib.sha256(self.simulation_id.encode('utf-8')).hexdigest()[:12],
+            'total_bytes': deep_sizeof(self),
+            'model_bytes': deep_sizeof(self.model),
+            'state_cache_bytes': deep_sizeof(self._state_cache),
+            'journal_memory_bytes': stream.memory_bytes if stream is not None else 0,
+            'journal_spilled_bytes': stream.spilled_bytes if stream is not None else 0,
+            'event_logs': len(self.event_logs),
+            'step_count': self.model.step_count,
+            'auto_running': self.auto_running,
+            'idle_seconds': round(time.monotonic() - self.last_access, 1)
+        }
+    
+    def get_frame(self, state_format='json'):
+        """simulation_update codificado (EncodedFrame) con el estado actual en `state_format`"""
+        return self.get_state(f'frame_{state_format}')
+    
+    def state_etag(self, state_format, version=None):
+        """ETag de `state_format` en `version` (por defecto, la versión actual del modelo)"""
+        if version is None:
+            version = self.model.version
+        return f'{version}.{state_format}'
+    
+    def build_state(self, logs, model=None):
+        """Construir el estado serializable en JSON (del modelo actual o de `model`)"""
+        model = self.model if model is None else model
         agent_data = []
-        for agent in self.model.agent_list:
+        for agent in model.agent_list:
             agent_info = {
                 'id': agent.unique_id,
                 'pos': agent.pos,
@@ -124,7 +412,7 @@ class SimulationManager:
             agent_data.append(agent_info)
             
         poi_data = []
-        for poi in self.model.active_pois:
+        for poi in model.active_pois:
             poi_info = {
                 'id': poi.id,
                 'x': poi.x,
@@ -134,48 +422,95 @@ class SimulationManager:
             }
             poi_data.append(poi_info)
             
-        # Convertir fire_states a formato serializable
-        fire_states_serializable = []
-        for row in self.model.fire_states:
-            row_data = []
-            for cell in row:
-                if cell == FireState.CLEAR:
-                    row_data.append(0)
-                elif cell == FireState.SMOKE:
-                    row_data.append(1)
-                elif cell == FireState.FIRE:
-                    row_data.append(2)
-                else:
-                    row_data.append(0)  # default
-            fire_states_serializable.append(row_data)
+        # Convertir fire_states a formato serializable (0: clear, 1: smoke, 2: fire)
+        fire_codes = model.fire_state_codes()
         
         return {
-            'step_count': self.model.step_count,
-            'round_count': self.model.round_count,
-            'phase': self.model.phase,
-            'current_agent_index': self.model.current_agent_index,
-            'fire_states': fire_states_serializable,
-            'grid_data': self.model.grid_data.tolist(),
+            'step_count': model.step_count,
+            'round_count': model.round_count,
+            'phase': model.phase,
+            'current_agent_index': model.current_agent_index,
+            'fire_states': fire_codes.tolist(),
+            'grid_data': model.grid_data.tolist(),
             'agents': agent_data,
             'pois': poi_data,
-            'rescued_victims': len(self.model.rescued_victims),
-            'lost_victims': len(self.model.lost_victims),
-            'damage_count': self.model.damage_count,
-            'game_over': self.model.game_over,
-            'game_won': self.model.game_won,
-            'end_reason': self.model.end_reason if hasattr(self.model, 'end_reason') else '',
+            'rescued_victims': len(model.rescued_victims),
+            'lost_victims': len(model.lost_victims),
+            'damage_count': model.damage_count,
+            'game_over': model.game_over,
+            'game_won': model.game_won,
+            'end_reason': model.end_reason if hasattr(model, 'end_reason') else '',
             'stats': {
-                'fire_count': int(np.sum(self.model.fire_states == FireState.FIRE)),
-                'smoke_count': int(np.sum(self.model.fire_states == FireState.SMOKE)),
-                'clear_count': int(np.sum(self.model.fire_states == FireState.CLEAR))
+                'fire_count': int(np.count_nonzero(fire_codes == 2)),
+                'smoke_count': int(np.count_nonzero(fire_codes == 1)),
+                'clear_count': int(np.count_nonzero(fire_codes == 0))
             },
-            'logs': self.generate_step_logs()
+            'logs': logs
         }
     
+    def capture_frame(self):
+        """StateFrame inmutable del estado actual (lo toma el hilo que avanza la simulación)"""
+        frame = self._last_frame = StateFrame.capture(self.model, self._last_frame)
+        return frame
+    
+    def publish_frame(self):
+        """Entregar el estado actual a la sala sin esperar a serializarlo (frame_pipeline)"""
+        frame_pipeline.submit(self.simulation_id, self.capture_frame(), self.emit_frame)
+    
+    def emit_update(self):
+        """Emitir el estado actual a la sala desde este hilo"""
+        self.emit_frame(self.capture_frame())
+    
+    def emit_frame(self, frame):
+        """Emitir un frame a la sala en los formatos (JSON y/o binario) que tienen clientes
+        
+        Cada formato se codifica una vez por versión y se reparte tal cual a todos los clientes.
+        Lo llama un worker de frame_pipeline (auto-run) o emit_update.
+        """
+        start = time.perf_counter()
+        rooms = {'json': self.simulation_id, 'binary': binary_room(self.simulation_id)}
+        rooms = {state_format: room for state_format, room in rooms.items()
+                 if client_manager.has_listeners(room)}
+        if not rooms:
+            return
+        
+        frames = {}
+        for state_format in rooms:
+            cached = self._state_cache.get(f'frame_{state_format}')
+            if cached is not None and cached[0] == frame.version:
+                frames[state_format] = cached[1]
+        missing = [state_format for state_format in rooms if state_format not in frames]
+        if missing:
+            logs = self.current_logs(frame)
+            payloads = {}
+            for state_format in missing:
+                if state_format == 'binary':
+                    state = encode_binary_state(frame, logs)
+                else:
+                    state = self.build_state(logs, frame)
+                frames[state_format] = encode_frame(socketio.server, 'simulation_update', state)
+                payloads[state_format] = state
+                payloads[f'frame_{state_format}'] = frames[state_format]
+            # get_state sirve estos mismos payloads mientras el modelo no avance
+            if self.model.version == frame.version:
+                for key, payload in payloads.items():
+                    self._state_cache[key] = (frame.version, payload)
+        
+        for state_format, room in rooms.items():
+            socketio.emit('simulation_update', frames[state_format], room=room)
+        metrics.inc('emits_total', 'Simulation updates emitted to rooms', len(rooms))
+        if METRICS_ENABLED:
+            metrics.histogram('emit_seconds', 'Time spent serializing and emitting updates').observe(
+                time.perf_counter() - start)
+    
     def step(self):
         """Ejecutar un paso de la simulación"""
         if not self.model.is_game_over():
             self.model.step()
+            metrics.inc('steps_total', 'Simulation steps executed')
+            self.steps_since_checkpoint += 1
+            if self.steps_since_checkpoint >= CHECKPOINT_EVERY_STEPS or self.model.is_game_over():
+                self.checkpoint()
             return True
         return False
     
@@ -185,36 +520,142 @@ class SimulationManager:
             return
             
         self.auto_step = True
+        # Un evento por ejecución: el hilo anterior termina aunque se reinicie enseguida
+        stop = self._auto_stop = threading.Event()
         
         # Emit auto status change
         socketio.emit('auto_status', {'auto_running': True}, room=self.simulation_id)
         
         def auto_run():
-            while self.auto_step and not self.model.is_game_over():
+            next_step = time.monotonic()
+            while not stop.is_set() and not self.model.is_game_over():
                 self.step()
-                # Emitir estado actualizado a todos los clientes
-                socketio.emit('simulation_update', self.get_state(), room=self.simulation_id)
-                time.sleep(self.step_delay)
+                # La serialización y el emit van por frame_pipeline: el ritmo solo depende del paso
+                self.publish_frame()
+                next_step = max(next_step + self.step_delay, time.monotonic())
+                stop.wait(next_step - time.monotonic())
             
-            # Auto-step finished (either stopped or game over)
-            if not self.model.is_game_over():
-                self.auto_step = False
-            socketio.emit('auto_status', {'auto_running': False}, room=self.simulation_id)
+            # Auto-step finished (either stopped or game over); stop_auto_simulation ya avisó
+            if not stop.is_set():
+                socketio.emit('auto_status', {'auto_running': False}, room=self.simulation_id)
         
-        thread = threading.Thread(target=auto_run)
+        thread = self._auto_thread = threading.Thread(target=auto_run, name=f'auto-run-{self.simulation_id}')
         thread.daemon = True
         thread.start()
     
+    @property
+    def auto_running(self):
+        """True mientras el hilo de auto_run sigue vivo"""
+        return self._auto_thread is not None and self._auto_thread.is_alive()
+    
     def stop_auto_simulation(self):
         """Detener simulación automática"""
         if not self.auto_step:  # Already stopped
             return
             
         self.auto_step = False
+        self._auto_stop.set()
         
         # Emit auto status change
         socketio.emit('auto_status', {'auto_running': False}, room=self.simulation_id)
 
+def prepare_simulation(board):
+    """Simulación sin id con el primer checkpoint y el estado inicial ya calculados
+    
+    Devuelve (sim_manager, checkpoint codificado); lanza ValueError si el tablero no existe.
+    """
+    sim_manager = SimulationManager(None, model=FireRescueModel(build_board(board)))
+    data = sim_manager.encode_checkpoint()
+    sim_manager.get_state('json_text')
+    return sim_manager, data
+
+def simulation_factory(board):
+    build_board(board)  # tablero desconocido: ValueError al arrancar
+    return lambda: prepare_simulation(board)
+
+simulation_pool = WarmPool({board: simulation_factory(board) for board in SIMULATION_POOL_BOARDS},
+                           SIMULATION_POOL_SIZE)
+metrics.gauge('simulation_pool_available', 'Pre-built simulations ready to be handed out',
+              simulation_pool.available)
+
+def binary_room(simulation_id):
+    """Sala de los clientes que negociaron el formato binario"""
+    return f'{simulation_id}/binary'
+
+def requested_state_format():
+    """Formato pedido por el cliente REST (?format=binary o cabecera Accept)"""
+    state_format = request.args.get('format')
+    if state_format in ('json', 'binary'):
+        return state_format
+    if BINARY_MIMETYPE in request.headers.get('Accept', ''):
+        return 'binary'
+    return 'json'
+
+def get_simulation(simulation_id):
+    """Obtener una simulación activa, cargándola del almacén si otro worker la actualizó"""
+    sim_manager = active_simulations.get(simulation_id)
+    revision = checkpoint_writer.revision(simulation_id)
+    if revision is None:
+        # Eliminada (o nunca guardada) en el almacén
+        if sim_manager is not None:
+            active_simulations.pop(simulation_id, None)
+            sim_manager.retire()
+        return None
+    if sim_manager is not None and revision <= sim_manager.revision:
+        sim_manager.last_access = time.monotonic()
+        return sim_manager
+    
+    checkpoint = checkpoint_writer.load(simulation_id)
+    if checkpoint is None:
+        return None
+    if sim_manager is not None:
+        # Otro worker guardó una revisión más nueva: la copia local deja de avanzar
+        sim_manager.retire()
+    sim_manager = SimulationManager.from_checkpoint(simulation_id, *checkpoint)
+    active_simulations[simulation_id] = sim_manager
+    return sim_manager
+
+def on_checkpoint_conflict(simulation_id, revision):
+    """El almacén rechazó un checkpoint: otro worker guardó antes la misma revisión o una posterior
+    
+    La copia local se descarta para no bifurcar la partida; la siguiente petición
+    carga la del almacén.
+    """
+    sim_manager = active_simulations.pop(simulation_id, None)
+    if sim_manager is None:
+        return
+    checkpoint_writer.discard(simulation_id)
+    sim_manager.retire()
+    metrics.inc('checkpoint_conflicts_total', 'Checkpoints rejected because another worker saved the simulation first')
+
+checkpoint_writer.on_conflict = on_checkpoint_conflict
+
+def evict_idle_simulations():
+    """Descargar las simulaciones sin uso desde hace SIMULATION_IDLE_TIMEOUT (siguen en el almacén)"""
+    now = time.monotonic()
+    for simulation_id, sim_manager in list(active_simulations.items()):
+        if sim_manager.auto_running or now - sim_manager.last_access < SIMULATION_IDLE_TIMEOUT:
+            continue
+        if sim_manager.steps_since_checkpoint:
+            sim_manager.checkpoint()
+        if active_simulations.get(simulation_id) is sim_manager:
+            del active_simulations[simulation_id]
+        sim_manager.close()
+        metrics.inc('simulations_evicted_total', 'Idle simulations unloaded from this worker')
+
+def flush_checkpoints_loop():
+    """Escribir periódicamente los checkpoints pendientes"""
+    while True:
+        checkpoint_writer.wait_due(CHECKPOINT_FLUSH_INTERVAL)
+        if SIMULATION_IDLE_TIMEOUT > 0:
+            evict_idle_simulations()
+        checkpoint_writer.flush()
+
+atexit.register(checkpoint_writer.flush)
+socketio.start_background_task(flush_checkpoints_loop)
+if SIMULATION_POOL_SIZE > 0:
+    socketio.start_background_task(simulation_pool.run)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -223,34 +664,156 @@ def index():
 def simulation():
     return render_template('simulation.html')
 
+def creation_options(data):
+    """(tablero, presupuesto de historial) de una petición de creación; ValueError si no son válidos"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    board = data.get('board') or 'stock'
+    if not isinstance(board, str):
+        raise ValueError('board must be a string')
+    history_budget = data.get('history_memory_budget')
+    if history_budget is not None:
+        # bool es un int en Python, pero true no es un número de bytes
+        if isinstance(history_budget, bool) or not isinstance(history_budget, (int, float, str)):
+            raise ValueError('history_memory_budget must be a non-negative integer')
+        try:
+            history_budget = int(history_budget)
+        except (ValueError, OverflowError):
+            raise ValueError('history_memory_budget must be a non-negative integer')
+        if history_budget < 0:
+            raise ValueError('history_memory_budget must be a non-negative integer')
+    return board, history_budget
+
+def new_simulation(board, history_budget, immediate=True):
+    """Crear y registrar una simulación, del pool si hay una lista; lanza ValueError si el tablero no existe"""
+    prepared = simulation_pool.take(board)
+    if prepared is not None:
+        metrics.inc('simulation_pool_hits_total', 'Simulations handed out from the warm pool', board=board)
+    else:
+        prepared = prepare_simulation(board)
+        metrics.inc('simulation_pool_misses_total', 'Simulations built on request', board=board)
+    sim_manager, data = prepared
+    if history_budget is not None and history_budget != sim_manager.history_budget:
+        sim_manager.set_history_budget(history_budget)
+        data = None  # el checkpoint guarda el presupuesto
+    
+    sim_manager.simulation_id = str(uuid.uuid4())
+    sim_manager.last_access = time.monotonic()
+    active_simulations[sim_manager.simulation_id] = sim_manager
+    sim_manager.checkpoint(immediate=immediate, data=data)
+    return sim_manager
+
 @app.route('/api/create_simulation', methods=['POST'])
 def create_simulation():
     """Crear una nueva simulación"""
-    simulation_id = str(uuid.uuid4())
-    sim_manager = SimulationManager(simulation_id)
-    active_simulations[simulation_id] = sim_manager
+    data = request.get_json(silent=True) or {}
+    try:
+        sim_manager = new_simulation(*creation_options(data))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'simulation_id': simulation_id,
-        'state': sim_manager.get_state()
-    })
+    # El estado inicial ya está serializado (en el pool): no volver a codificarlo
+    body = f'{{"simulation_id":"{sim_manager.simulation_id}","state":{sim_manager.get_state("json_text")}}}'
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/create_simulations', methods=['POST'])
+def create_simulations():
+    """Crear `count` simulaciones en una sola petición (checkpoints en un solo lote)"""
+    data = request.get_json(silent=True) or {}
+    count = data.get('count') if isinstance(data, dict) else None
+    # bool es un int en Python: count=true no es una simulación
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_BULK_SIMULATIONS:
+        return jsonify({'error': f'count must be an integer between 1 and {MAX_BULK_SIMULATIONS}'}), 400
+    try:
+        board, history_budget = creation_options(data)
+        build_board(board)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    simulation_ids = [new_simulation(board, history_budget, immediate=False).simulation_id
+                      for _ in range(count)]
+    checkpoint_writer.flush()
+    
+    return jsonify({'simulation_ids': simulation_ids})
 
 @app.route('/api/simulation/<simulation_id>/state')
 def get_simulation_state(simulation_id):
     """Obtener el estado de una simulación"""
-    if simulation_id not in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
         return jsonify({'error': 'Simulation not found'}), 404
     
-    sim_manager = active_simulations[simulation_id]
-    return jsonify(sim_manager.get_state())
+    state_format = requested_state_format()
+    encoded_format = 'binary' if state_format == 'binary' else 'json_text'
+    step = request.args.get('step', type=int)
+    if step is not None and step != sim_manager.model.step_count:
+        return get_simulation_history_state(sim_manager, step, encoded_format)
+    
+    etag = sim_manager.state_etag(encoded_format)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    # El ETag sale de la versión del cuerpo servido: el hilo automático puede avanzar entre medias
+    version, payload = sim_manager.versioned_state(encoded_format)
+    mimetype = BINARY_MIMETYPE if encoded_format == 'binary' else 'application/json'
+    response = Response(payload, mimetype=mimetype)
+    response.set_etag(sim_manager.state_etag(encoded_format, version))
+    return response
+
+def get_simulation_history_state(sim_manager, step, encoded_format):
+    """Estado de un paso pasado (?step=N); un paso pasado no cambia, así que su ETag es fijo"""
+    etag = f'history.{step}.{encoded_format}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        payload = sim_manager.state_at(step, encoded_format)
+    except LookupError:
+        return jsonify({'error': 'Journal disabled'}), 404
+    except ValueError:
+        journal = sim_manager.journal
+        return jsonify({'error': 'Step not in history',
+                        'first_step': journal.first_step,
+                        'last_step': journal.last_step}), 404
+    
+    mimetype = BINARY_MIMETYPE if encoded_format == 'binary' else 'application/json'
+    response = Response(payload, mimetype=mimetype)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/simulation/<simulation_id>/risk')
+def get_simulation_risk(simulation_id):
+    """Probabilidad de que cada celda esté en llamas dentro de ?horizon=R rondas"""
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
+        return jsonify({'error': 'Simulation not found'}), 404
+    
+    horizon = request.args.get('horizon', 3, type=int)
+    if not 1 <= horizon <= MAX_HORIZON:
+        return jsonify({'error': f'horizon must be between 1 and {MAX_HORIZON}'}), 400
+    
+    etag = sim_manager.state_etag(f'risk_{horizon}')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    version, payload = sim_manager.versioned_risk(horizon)
+    response = Response(payload, mimetype='application/json')
+    response.set_etag(sim_manager.state_etag(f'risk_{horizon}', version))
+    return response
 
 @app.route('/api/simulation/<simulation_id>/step', methods=['POST'])
 def step_simulation(simulation_id):
     """Ejecutar un paso manual de la simulación"""
-    if simulation_id not in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
         return jsonify({'error': 'Simulation not found'}), 404
     
-    sim_manager = active_simulations[simulation_id]
     success = sim_manager.step()
     
     return jsonify({
@@ -261,10 +824,19 @@ def step_simulation(simulation_id):
 @app.route('/api/simulation/<simulation_id>/auto_start', methods=['POST'])
 def start_auto_simulation(simulation_id):
     """Iniciar simulación automática"""
-    if simulation_id not in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
         return jsonify({'error': 'Simulation not found'}), 404
     
-    sim_manager = active_simulations[simulation_id]
+    data = request.get_json(silent=True) or {}
+    if isinstance(data, dict) and 'step_delay' in data:
+        try:
+            step_delay = float(data['step_delay'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'step_delay must be a number'}), 400
+        if not math.isfinite(step_delay):
+            return jsonify({'error': 'step_delay must be a finite number'}), 400
+        sim_manager.step_delay = max(0.0, step_delay)
     sim_manager.start_auto_simulation()
     
     return jsonify({'success': True, 'message': 'Auto simulation started'})
@@ -272,23 +844,91 @@ def start_auto_simulation(simulation_id):
 @app.route('/api/simulation/<simulation_id>/auto_stop', methods=['POST'])
 def stop_auto_simulation(simulation_id):
     """Detener simulación automática"""
-    if simulation_id not in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
         return jsonify({'error': 'Simulation not found'}), 404
     
-    sim_manager = active_simulations[simulation_id]
     sim_manager.stop_auto_simulation()
     
     return jsonify({'success': True, 'message': 'Auto simulation stopped'})
 
+@app.route('/api/simulation/<simulation_id>/journal')
+def get_simulation_journal(simulation_id):
+    """Descargar el diario binario de la simulación (para replay)"""
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
+        return jsonify({'error': 'Simulation not found'}), 404
+    
+    if sim_manager.journal is None:
+        return jsonify({'error': 'Journal disabled'}), 404
+    
+    return Response(sim_manager.journal.getvalue(),
+                    mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename={simulation_id}.journal'})
+
+@app.route('/api/simulation/<simulation_id>/profile/start', methods=['POST'])
+def start_simulation_profile(simulation_id):
+    """Empezar a perfilar los pasos de una simulación (cprofile o pyinstrument)"""
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
+        return jsonify({'error': 'Simulation not found'}), 404
+    if sim_manager.profiler is not None:
+        return jsonify({'error': 'Profiler already running'}), 409
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        sim_manager.profiler = StepProfiler(sim_manager.model, data.get('profiler', 'cprofile'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'profiler': sim_manager.profiler.profiler})
+
+@app.route('/api/simulation/<simulation_id>/profile/stop', methods=['POST'])
+def stop_simulation_profile(simulation_id):
+    """Detener el perfilado y devolver el informe en texto"""
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
+        return jsonify({'error': 'Simulation not found'}), 404
+    if sim_manager.profiler is None:
+        return jsonify({'error': 'Profiler not running'}), 409
+    
+    report = sim_manager.profiler.stop()
+    sim_manager.profiler = None
+    return Response(report, mimetype='text/plain')
+
+@app.route('/metrics')
+def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/debug/memory')
+def get_debug_memory():
+    """Memoria del proceso y huella de las simulaciones cargadas (las `limit` mayores)"""
+    if not DEBUG_MEMORY_ENABLED:
+        return jsonify({'error': 'Not found'}), 404
+    limit = request.args.get('limit', 50, type=int)
+    footprints = sorted((sim_manager.memory_footprint() for sim_manager in list(active_simulations.values())),
+                        key=lambda footprint: footprint['total_bytes'], reverse=True)
+    return jsonify({
+        'process': process_memory(),
+        'active_simulations': len(footprints),
+        'simulation_bytes': sum(footprint['total_bytes'] for footprint in footprints),
+        'auto_run_threads': len(thread_names('auto-run-')),
+        'simulation_pool_available': simulation_pool.available(),
+        'checkpoint_queue_depth': checkpoint_writer.queue_depth,
+        'simulations': footprints[:max(0, limit)]
+    })
+
 @app.route('/api/simulation/<simulation_id>/delete', methods=['DELETE'])
 def delete_simulation(simulation_id):
     """Eliminar una simulación"""
-    if simulation_id not in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is None:
         return jsonify({'error': 'Simulation not found'}), 404
     
-    sim_manager = active_simulations[simulation_id]
-    sim_manager.stop_auto_simulation()
-    del active_simulations[simulation_id]
+    active_simulations.pop(simulation_id, None)
+    sim_manager.retire()
+    checkpoint_writer.delete(simulation_id)
     
     return jsonify({'success': True, 'message': 'Simulation deleted'})
 
@@ -296,20 +936,23 @@ def delete_simulation(simulation_id):
 @socketio.on('join_simulation')
 def on_join_simulation(data):
     simulation_id = data['simulation_id']
+    state_format = 'binary' if data.get('format') == 'binary' else 'json'
     
-    # Leave old room if exists
+    # Salir de la sala anterior, también al volver a la misma simulación en otro formato
     old_simulation_id = session.get('simulation_id')
-    if old_simulation_id and old_simulation_id != simulation_id:
+    if old_simulation_id:
         leave_room(old_simulation_id)
+        leave_room(binary_room(old_simulation_id))
     
-    if simulation_id in active_simulations:
+    sim_manager = get_simulation(simulation_id)
+    if sim_manager is not None:
         session['simulation_id'] = simulation_id
-        join_room(simulation_id)
-        sim_manager = active_simulations[simulation_id]
+        session['state_format'] = state_format
+        join_room(binary_room(simulation_id) if state_format == 'binary' else simulation_id)
         
         # Send current state and auto status
-        emit('joined_simulation', {'simulation_id': simulation_id})
-        emit('simulation_update', sim_manager.get_state())
+        emit('joined_simulation', {'simulation_id': simulation_id, 'format': state_format})
+        emit('simulation_update', sim_manager.get_frame(state_format))
         emit('auto_status', {'auto_running': sim_manager.auto_step})
     else:
         emit('error', {'message': 'Simulation not found'})
@@ -319,6 +962,7 @@ def on_leave_simulation(data):
     simulation_id = data.get('simulation_id')
     if simulation_id:
         leave_room(simulation_id)
+        leave_room(binary_room(simulation_id))
         if session.get('simulation_id') == simulation_id:
             session.pop('simulation_id', None)
 
@@ -327,6 +971,7 @@ def on_disconnect():
     simulation_id = session.get('simulation_id')
     if simulation_id:
         leave_room(simulation_id)
+        leave_room(binary_room(simulation_id))
     print('Client disconnected')
 
 if __name__ == '__main__':
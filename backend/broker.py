@@ -0,0 +1,326 @@
+"""
+Local message broker for multi-worker Socket.IO fan-out.
+
+The broker relays every frame it receives to all subscribed peers. Frames are
+length-prefixed (4-byte big-endian size + payload). On connect the broker sends
+a random challenge, and the peer's first frame declares its role (``SUB`` or
+``PUB``) followed by an HMAC-SHA256 of challenge and role under the shared
+``SOCKETIO_BROKER_KEY``; peers that fail it are disconnected. Addresses are
+either ``unix:///path/to.sock`` (created with mode 0600) or
+``tcp://host:port``, which refuses to start without a key.
+
+Messages are JSON: bytes, tuples and pre-encoded frames are tagged so they
+come back as the same types, and nothing a peer sends is unpickled.
+
+``SocketBrokerManager`` plugs the broker into python-socketio as a pub/sub
+client manager: an emit published by the worker that steps a simulation is
+delivered by every worker to the clients it holds in that room.
+
+Run the broker with:
+
+    python broker.py --address unix:///tmp/fire-rescue-broker.sock
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import selectors
+import socket
+import struct
+import threading
+
+import socketio
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_PEER_BACKLOG = 64 * 1024 * 1024  # bytes pendientes antes de desconectar un peer lento
+ROLE_SUBSCRIBER = b"SUB"
+ROLE_PUBLISHER = b"PUB"
+CHALLENGE_SIZE = 32
+MAX_HELLO_SIZE = 64  # rol + firma; un peer sin autenticar no puede llenar la memoria
+TAG = "__broker__"  # clave reservada para los tipos que JSON no distingue
+
+
+def broker_key(key=None):
+    """Clave compartida como bytes (por defecto SOCKETIO_BROKER_KEY; vacía si no hay)."""
+    key = key if key is not None else os.environ.get("SOCKETIO_BROKER_KEY") or ""
+    return key.encode("utf-8") if isinstance(key, str) else key
+
+
+def sign(key, challenge, role):
+    return hmac.new(key, challenge + role, hashlib.sha256).digest()
+
+
+def parse_address(url):
+    if url.startswith("unix://"):
+        return socket.AF_UNIX, url[len("unix://"):]
+    if url.startswith("tcp://"):
+        host, port = url[len("tcp://"):].rsplit(":", 1)
+        return socket.AF_INET, (host, int(port))
+    raise ValueError(f"Unsupported broker address: {url}")
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def connect(url, role, key=None):
+    family, address = parse_address(url)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(address)
+    challenge = recv_frame(sock)
+    send_frame(sock, role + sign(broker_key(key), challenge, role))
+    return sock
+
+
+def _pack(value):
+    from fanout import EncodedFrame  # fanout importa este módulo
+    if isinstance(value, dict):
+        return {key: _pack(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_pack(item) for item in value]
+    if isinstance(value, tuple):
+        return {TAG: "tuple", "items": [_pack(item) for item in value]}
+    if isinstance(value, (bytes, bytearray)):
+        return {TAG: "bytes", "data": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, EncodedFrame):
+        return {TAG: "frame", "items": [_pack(item) for item in value.encoded]}
+    return value
+
+
+def _unpack(value):
+    from fanout import EncodedFrame
+    tag = value.get(TAG)
+    if tag == "tuple":
+        return tuple(value["items"])
+    if tag == "bytes":
+        return base64.b64decode(value["data"])
+    if tag == "frame":
+        return EncodedFrame(value["items"])
+    return value
+
+
+def dumps_message(message):
+    """Mensaje del client manager (dicts de emit, bytes, EncodedFrame) a bytes JSON."""
+    return json.dumps(_pack(message), separators=(",", ":")).encode("utf-8")
+
+
+def loads_message(payload):
+    """Inverso de dumps_message; solo construye tipos de datos, nunca objetos arbitrarios."""
+    return json.loads(payload, object_hook=_unpack)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Broker connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    (size,) = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    return _recv_exact(sock, size)
+
+
+class _Peer:
+    def __init__(self, sock, challenge):
+        self.sock = sock
+        self.challenge = challenge
+        self.role = None
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+
+
+class Broker:
+    """Broker de un solo hilo basado en selectors."""
+
+    def __init__(self, url, key=None):
+        self.url = url
+        self.key = broker_key(key)
+        family, address = parse_address(url)
+        if family == socket.AF_INET and not self.key:
+            raise ValueError("A tcp:// broker needs SOCKETIO_BROKER_KEY (or --key)")
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if family == socket.AF_UNIX:
+            # Solo el usuario del servidor puede conectarse al socket
+            previous_umask = os.umask(0o177)
+            try:
+                self.listener.bind(address)
+            finally:
+                os.umask(previous_umask)
+        else:
+            self.listener.bind(address)
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.peers = {}
+        self.frames_relayed = 0
+
+    def serve_forever(self):
+        while True:
+            for key, mask in self.selector.select():
+                if key.fileobj is self.listener:
+                    self._accept()
+                    continue
+                peer = self.peers.get(key.fileobj)
+                if peer is None:
+                    continue
+                if mask & selectors.EVENT_READ:
+                    self._read(peer)
+                if mask & selectors.EVENT_WRITE and peer.sock in self.peers:
+                    self._write(peer)
+
+    def _accept(self):
+        sock, _ = self.listener.accept()
+        sock.setblocking(False)
+        peer = self.peers[sock] = _Peer(sock, os.urandom(CHALLENGE_SIZE))
+        peer.outbox += FRAME_HEADER.pack(CHALLENGE_SIZE) + peer.challenge
+        self.selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def _close(self, peer):
+        self.peers.pop(peer.sock, None)
+        self.selector.unregister(peer.sock)
+        peer.sock.close()
+
+    def _read(self, peer):
+        try:
+            data = peer.sock.recv(256 * 1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(peer)
+            return
+        peer.inbox += data
+        while len(peer.inbox) >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack_from(peer.inbox)
+            if peer.role is None and size > MAX_HELLO_SIZE:
+                self._close(peer)
+                return
+            end = FRAME_HEADER.size + size
+            if len(peer.inbox) < end:
+                break
+            frame = bytes(peer.inbox[:end])
+            del peer.inbox[:end]
+            if peer.role is None:
+                if not self._authenticate(peer, frame[FRAME_HEADER.size:]):
+                    self._close(peer)
+                    return
+            else:
+                self._relay(frame)
+
+    def _authenticate(self, peer, hello):
+        """Primer frame del peer: rol + HMAC del desafío; fija el rol si la firma es válida."""
+        for role in (ROLE_SUBSCRIBER, ROLE_PUBLISHER):
+            if hello[:len(role)] == role:
+                if hmac.compare_digest(hello[len(role):], sign(self.key, peer.challenge, role)):
+                    peer.role = role
+                    return True
+        return False
+
+    def _relay(self, frame):
+        self.frames_relayed += 1
+        for peer in list(self.peers.values()):
+            if peer.role != ROLE_SUBSCRIBER or peer.sock not in self.peers:
+                continue
+            if len(peer.outbox) + len(frame) > MAX_PEER_BACKLOG:
+                self._close(peer)
+                continue
+            if not peer.outbox:
+                self.selector.modify(peer.sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            peer.outbox += frame
+
+    def _write(self, peer):
+        try:
+            sent = peer.sock.send(peer.outbox)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(peer)
+            return
+        del peer.outbox[:sent]
+        if not peer.outbox:
+            self.selector.modify(peer.sock, selectors.EVENT_READ)
+
+
+class SocketBrokerManager(socketio.PubSubManager):
+    """Client manager de python-socketio que publica a traves del broker local."""
+
+    name = "socketbroker"
+
+    def __init__(self, url, channel="flask-socketio", write_only=False, logger=None, key=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+        self.key = broker_key(key)
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+        self.published = 0
+
+    def _publish(self, data):
+        payload = dumps_message([self.channel, data])
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = connect(self.url, ROLE_PUBLISHER, self.key)
+                    send_frame(self._publisher, payload)
+                    self.published += 1
+                    break
+                except OSError:
+                    self._publisher = None
+                    if attempt:
+                        self._get_logger().error("Cannot publish to broker at %s", self.url)
+
+    def _listen(self):
+        while True:
+            try:
+                sock = connect(self.url, ROLE_SUBSCRIBER, self.key)
+            except OSError:
+                self._get_logger().error("Cannot connect to broker at %s, retrying", self.url)
+                self.server.sleep(1)
+                continue
+            try:
+                while True:
+                    try:
+                        channel, data = loads_message(recv_frame(sock))
+                    except (ValueError, TypeError, KeyError):
+                        self._get_logger().error("Discarding malformed broker message")
+                        continue
+                    if channel == self.channel:
+                        yield data
+            except (OSError, ConnectionError):
+                self._get_logger().error("Lost connection to broker, reconnecting")
+            finally:
+                sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire Rescue Socket.IO message broker")
+    parser.add_argument(
+        "--address",
+        default=os.environ.get("SOCKETIO_MESSAGE_QUEUE") or "unix:///tmp/fire-rescue-broker.sock",
+    )
+    parser.add_argument(
+        "--key",
+        default=None,
+        help="shared secret peers must prove (default: SOCKETIO_BROKER_KEY; required for tcp://)",
+    )
+    args = parser.parse_args()
+    try:
+        broker = Broker(args.address, args.key)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Broker escuchando en {args.address}")
+    broker.serve_forever()
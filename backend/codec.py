@@ -0,0 +1,190 @@
+"""
+Packed binary encoding of the simulation state.
+
+Layout (little-endian), mirrored by ``decodeBinaryState`` in simulation.js:
+
+    header   magic "FRS", version, width, height, step_count, round_count,
+             phase, current_agent_index, flags (game_over, game_won),
+             damage_count, rescued, lost, agent count, POI count
+    fire     2 bits per cell, row-major, 4 cells per byte (low bits first)
+    walls    3 bits per wall edge (cell-major, top/right/bottom/left),
+             bit stream packed low bit first
+    agents   fixed-size structs: id, x, y, role, action points, carrying id,
+             knockout timer
+    pois     fixed-size structs: id, x, y, type, revealed
+    trailer  end_reason (uint16 length + utf-8), logs (uint32 length + JSON)
+
+The fire / smoke / clear counts are derived from the fire grid by the decoder.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from models.firefighterRole import ROLE_CODES, ROLES_BY_CODE
+from models.poi import POI_TYPE_CODES, POI_TYPES_BY_CODE
+
+BINARY_MIMETYPE = "application/x-fire-rescue-state"
+MAGIC = b"FRS"
+VERSION = 1
+
+HEADER = struct.Struct("<3sBHHIIBBBHHHHH")
+AGENT = struct.Struct("<HHHBBHB")
+POI = struct.Struct("<HHHBB")
+
+PHASES = ("AGENT_TURN", "FIRE_SPREAD")
+FLAG_GAME_OVER = 1
+FLAG_GAME_WON = 2
+
+
+def pack_fire_codes(codes):
+    flat = np.asarray(codes, dtype=np.uint8).ravel()
+    padded = np.zeros(-(-flat.size // 4) * 4, dtype=np.uint8)
+    padded[:flat.size] = flat
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)).tobytes()
+
+
+def unpack_fire_codes(data, height, width):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    codes = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1).ravel()
+    return codes[:height * width].reshape(height, width)
+
+
+def pack_walls(grid_data):
+    values = np.asarray(grid_data, dtype=np.uint8).ravel()
+    bits = ((values[:, None] >> np.arange(3, dtype=np.uint8)) & 1).ravel()
+    return np.packbits(bits, bitorder="little").tobytes()
+
+
+def unpack_walls(data, height, width):
+    count = height * width * 4
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")[:count * 3]
+    values = (bits.reshape(count, 3) << np.arange(3, dtype=np.uint8)).sum(axis=1)
+    return values.reshape(height, width, 4)
+
+
+def encode_binary_state(model, logs):
+    """Codificar el estado del modelo en el formato binario compacto."""
+    flags = 0
+    if model.game_over:
+        flags |= FLAG_GAME_OVER
+    if model.game_won:
+        flags |= FLAG_GAME_WON
+
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            model.width,
+            model.height,
+            model.step_count,
+            model.round_count,
+            PHASES.index(model.phase),
+            model.current_agent_index,
+            flags,
+            model.damage_count,
+            len(model.rescued_victims),
+            len(model.lost_victims),
+            len(model.agent_list),
+            len(model.active_pois),
+        ),
+        pack_fire_codes(model.fire_state_codes()),
+        pack_walls(model.grid_data),
+    ]
+    for agent in model.agent_list:
+        x, y = agent.pos
+        parts.append(
+            AGENT.pack(
+                agent.unique_id,
+                x,
+                y,
+                ROLE_CODES[agent.role],
+                agent.action_points,
+                agent.carrying_victim.id if agent.carrying_victim else 0,
+                agent.knockout_timer,
+            )
+        )
+    for poi in model.active_pois:
+        parts.append(POI.pack(poi.id, poi.x, poi.y, POI_TYPE_CODES[poi.type], poi.revealed))
+
+    end_reason = (model.end_reason or "").encode("utf-8")
+    encoded_logs = json.dumps(logs, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    parts.append(struct.pack("<H", len(end_reason)) + end_reason)
+    parts.append(struct.pack("<I", len(encoded_logs)) + encoded_logs)
+    return b"".join(parts)
+
+
+def decode_binary_state(data):
+    """Decodificar el formato binario al mismo dict que devuelve get_state()."""
+    (magic, version, width, height, step_count, round_count, phase, current_agent_index,
+     flags, damage_count, rescued, lost, agent_count, poi_count) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a binary simulation state")
+    offset = HEADER.size
+
+    fire_size = -(-width * height // 4)
+    fire_codes = unpack_fire_codes(data[offset:offset + fire_size], height, width)
+    offset += fire_size
+    wall_size = -(-width * height * 4 * 3 // 8)
+    walls = unpack_walls(data[offset:offset + wall_size], height, width)
+    offset += wall_size
+
+    agents = []
+    for _ in range(agent_count):
+        agent_id, x, y, role, action_points, carrying, knockout_timer = AGENT.unpack_from(data, offset)
+        offset += AGENT.size
+        role = ROLES_BY_CODE[role]
+        agents.append({
+            "id": agent_id,
+            "pos": [x, y],
+            "role": role.value if role else None,
+            "action_points": action_points,
+            "carrying_victim": carrying or None,
+            "knockout_timer": knockout_timer,
+            "is_knocked_out": knockout_timer > 0,
+        })
+
+    pois = []
+    for _ in range(poi_count):
+        poi_id, x, y, poi_type, revealed = POI.unpack_from(data, offset)
+        offset += POI.size
+        pois.append({
+            "id": poi_id,
+            "x": x,
+            "y": y,
+            "type": POI_TYPES_BY_CODE[poi_type].value,
+            "revealed": bool(revealed),
+        })
+
+    (length,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    end_reason = bytes(data[offset:offset + length]).decode("utf-8")
+    offset += length
+    (length,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    logs = json.loads(bytes(data[offset:offset + length]).decode("utf-8"))
+
+    return {
+        "step_count": step_count,
+        "round_count": round_count,
+        "phase": PHASES[phase],
+        "current_agent_index": current_agent_index,
+        "fire_states": fire_codes.tolist(),
+        "grid_data": walls.tolist(),
+        "agents": agents,
+        "pois": pois,
+        "rescued_victims": rescued,
+        "lost_victims": lost,
+        "damage_count": damage_count,
+        "game_over": bool(flags & FLAG_GAME_OVER),
+        "game_won": bool(flags & FLAG_GAME_WON),
+        "end_reason": end_reason,
+        "stats": {
+            "fire_count": int(np.sum(fire_codes == 2)),
+            "smoke_count": int(np.sum(fire_codes == 1)),
+            "clear_count": int(np.sum(fire_codes == 0)),
+        },
+        "logs": logs,
+    }
@@ -0,0 +1,242 @@
+"""
+Per-client pacing of Socket.IO state updates.
+
+A plain room broadcast writes every ``simulation_update`` into each client's
+Engine.IO queue as soon as it is emitted, so a client on a slow link builds up
+a backlog of stale frames and every one of them is still delivered. The client
+managers built here keep a one-slot mailbox per client for paced events
+instead:
+
+- the newest frame wins: a frame still waiting when a newer one arrives is
+  replaced, never queued behind it;
+- a client receives at most ``max_fps`` frames per second;
+- a client whose Engine.IO queue holds ``max_backlog`` packets or more is
+  behind, and its frame waits (and keeps being replaced) until it drains.
+
+Frames can be encoded once with ``encode_frame`` and emitted as an
+``EncodedFrame``: every recipient (and every worker, through the message
+queue) gets the same packets without serializing the state again.
+
+Replaced frames are counted as ``frames_coalesced_total`` (rate limit) or
+``frames_dropped_total`` (client behind). Pacing happens where the client is
+connected, so with a message queue every worker paces its own clients after
+the broadcast has been fanned out.
+"""
+
+import threading
+import time
+
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+from socketio.base_manager import BaseManager
+
+from broker import SocketBrokerManager
+
+PACED_EVENTS = frozenset({"simulation_update"})
+BACKLOG_POLL_INTERVAL = 0.05  # segundos entre comprobaciones de un cliente atrasado
+FRAME_METRICS = {
+    "frames_sent_total": "Paced frames delivered to clients",
+    "frames_coalesced_total": "Frames replaced by a newer one before the client's rate limit allowed them",
+    "frames_dropped_total": "Frames replaced by a newer one while the client was behind",
+}
+
+
+class EncodedFrame:
+    """Evento ya codificado como paquetes Socket.IO (texto y adjuntos binarios).
+
+    Se emite como dato normal: el client manager lo reparte sin volver a
+    serializarlo, y al publicarse en la cola de mensajes viaja ya codificado.
+    """
+
+    __slots__ = ("encoded", "packets")
+
+    def __init__(self, encoded):
+        self.encoded = tuple(encoded)
+        self.packets = [eio_packet.Packet(eio_packet.MESSAGE, item) for item in self.encoded]
+
+    def __reduce__(self):
+        return EncodedFrame, (self.encoded,)
+
+    @property
+    def size(self):
+        return sum(len(item) for item in self.encoded)
+
+
+def encode_frame(server, event, data, namespace="/"):
+    """Codificar `event` una sola vez para repartirlo a cualquier número de clientes."""
+    encoded = server.packet_class(packet.EVENT, namespace=namespace, data=[event, data]).encode()
+    return EncodedFrame(encoded if isinstance(encoded, list) else [encoded])
+
+
+class _ClientChannel:
+    __slots__ = ("eio_sid", "pending", "last_sent", "behind")
+
+    def __init__(self, eio_sid):
+        self.eio_sid = eio_sid
+        self.pending = None  # paquetes Engine.IO del último frame sin enviar
+        self.last_sent = float("-inf")
+        self.behind = False
+
+
+class PacedDelivery(BaseManager):
+    """Entrega local de eventos con un buzón de un frame por cliente.
+
+    Va justo encima de BaseManager en el MRO, así que en los managers pub/sub
+    intercepta la entrega local de cada worker y no la publicación. Una sola
+    tarea de fondo envía los frames que tuvieron que esperar.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_fps = 0  # 0 = sin límite
+        self.max_backlog = 0  # 0 = no se mira la cola del cliente
+        self.metrics = None
+        self._channels = {}
+        self._waiting = {}  # sid -> canal con un frame pendiente
+        self._flushing = False
+        self._pacing_lock = threading.Lock()
+
+    def configure_pacing(self, max_fps=0, max_backlog=0, metrics=None):
+        self.max_fps = max_fps
+        self.max_backlog = max_backlog
+        self.metrics = metrics
+
+    @property
+    def pacing_enabled(self):
+        return bool(self.max_fps or self.max_backlog)
+
+    def has_listeners(self, room, namespace="/"):
+        """¿Puede haber clientes en `room`? Con cola de mensajes pueden estar en otro worker."""
+        if isinstance(self, socketio.PubSubManager):
+            return True
+        return bool(self.rooms.get(namespace, {}).get(room))
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        if isinstance(data, EncodedFrame):
+            frame = data.packets
+        elif event in PACED_EVENTS and callback is None and self.pacing_enabled:
+            frame = encode_frame(self.server, event, data, namespace or "/").packets
+        else:
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, **kwargs)
+        namespace = namespace or "/"
+        if namespace not in self.rooms:
+            return
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+
+        recipients = [(sid, eio_sid) for sid, eio_sid in self.get_participants(namespace, room)
+                      if sid not in skip_sid]
+        if not self.pacing_enabled:
+            for _, eio_sid in recipients:
+                self._send(eio_sid, frame)
+            self._count("frames_sent_total", len(recipients))
+            return
+
+        outcomes = {"frames_sent_total": 0, "frames_coalesced_total": 0, "frames_dropped_total": 0}
+        ready = []
+        with self._pacing_lock:
+            for sid, eio_sid in recipients:
+                channel = self._channels.get(sid)
+                if channel is None:
+                    channel = self._channels[sid] = _ClientChannel(eio_sid)
+                if channel.pending is not None:
+                    outcomes["frames_dropped_total" if channel.behind else "frames_coalesced_total"] += 1
+                channel.pending = frame
+                if sid not in self._waiting and self._take(channel, time.monotonic()):
+                    ready.append(eio_sid)
+                else:
+                    self._waiting[sid] = channel
+            start_flusher = bool(self._waiting) and not self._flushing
+            if start_flusher:
+                self._flushing = True
+        for eio_sid in ready:
+            self._send(eio_sid, frame)
+        outcomes["frames_sent_total"] = len(ready)
+        for name, amount in outcomes.items():
+            self._count(name, amount)
+        if start_flusher:
+            self.server.start_background_task(self._flush)
+
+    def disconnect(self, sid, namespace, **kwargs):
+        with self._pacing_lock:
+            self._channels.pop(sid, None)
+            self._waiting.pop(sid, None)
+        return super().disconnect(sid, namespace, **kwargs)
+
+    def _take(self, channel, now):
+        """Marcar el frame pendiente como enviado si el cliente puede recibirlo ya."""
+        if self.max_fps and now < channel.last_sent + 1.0 / self.max_fps:
+            return False
+        channel.behind = bool(self.max_backlog) and self._backlog(channel.eio_sid) >= self.max_backlog
+        if channel.behind:
+            return False
+        channel.pending = None
+        channel.last_sent = now
+        return True
+
+    def _flush(self):
+        """Tarea de fondo: enviar los frames pendientes en cuanto cada cliente pueda recibirlos."""
+        while True:
+            ready = []
+            with self._pacing_lock:
+                now = time.monotonic()
+                wake = now + BACKLOG_POLL_INTERVAL
+                for sid, channel in list(self._waiting.items()):
+                    frame = channel.pending
+                    if frame is None:
+                        del self._waiting[sid]
+                    elif self._take(channel, now):
+                        del self._waiting[sid]
+                        ready.append((channel.eio_sid, frame))
+                    elif not channel.behind:
+                        wake = min(wake, channel.last_sent + 1.0 / self.max_fps)
+                done = not self._waiting
+                if done:
+                    self._flushing = False
+            for eio_sid, frame in ready:
+                self._send(eio_sid, frame)
+            self._count("frames_sent_total", len(ready))
+            if done:
+                return
+            self.server.sleep(max(0.0, wake - time.monotonic()))
+
+    def _backlog(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    def _send(self, eio_sid, frame):
+        for item in frame:
+            self.server._send_eio_packet(eio_sid, item)
+
+    def _count(self, name, amount=1):
+        if self.metrics is not None and amount:
+            self.metrics.inc(name, FRAME_METRICS[name], amount)
+
+
+def paced(manager_class):
+    """Subclase de `manager_class` que reparte los eventos paced con PacedDelivery."""
+    if issubclass(manager_class, PacedDelivery):
+        return manager_class
+    return type(f"Paced{manager_class.__name__}", (manager_class, PacedDelivery), {})
+
+
+def create_client_manager(message_queue=None, channel="flask-socketio"):
+    """Client manager con pacing, con la misma elección de cola que Flask-SocketIO.
+
+    unix:// y tcp:// usan el broker local (broker.py).
+    """
+    if not message_queue:
+        return PacedDelivery()
+    if message_queue.startswith(("unix://", "tcp://")):
+        queue_class = SocketBrokerManager
+    elif message_queue.startswith(("redis://", "rediss://")):
+        queue_class = socketio.RedisManager
+    elif message_queue.startswith("kafka://"):
+        queue_class = socketio.KafkaManager
+    elif message_queue.startswith("zmq"):
+        queue_class = socketio.ZmqManager
+    else:
+        queue_class = socketio.KombuManager
+    return paced(queue_class)(message_queue, channel=channel)
@@ -0,0 +1,78 @@
+"""
+Bounded in-memory storage for a simulation's journal.
+
+``HistoryStream`` is the stream ``GameJournal`` writes to in the web app. It
+keeps the most recent bytes of the journal in memory and, once they exceed
+the simulation's memory budget, moves the oldest ones to an anonymous
+temporary file. Keyframes and steps keep their offsets, so
+``GameJournal.model_at`` reads any segment with ``read_at`` wherever it lives.
+The temporary file disappears when the stream is closed or collected.
+"""
+
+import os
+import tempfile
+import threading
+
+
+class HistoryStream:
+    """Stream de solo escritura con lectura por rangos y volcado a disco."""
+
+    def __init__(self, memory_budget=0, spill_dir=None):
+        self.memory_budget = memory_budget  # 0 = todo en memoria
+        self.spill_dir = spill_dir
+        self._buffer = bytearray()  # bytes recientes, a partir del offset _spilled
+        self._spilled = 0
+        self._spill = None
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            self._buffer += data
+            if self.memory_budget and len(self._buffer) > self.memory_budget:
+                # Volcar hasta dejar la mitad del presupuesto, para no escribir en cada paso
+                self._spill_oldest(len(self._buffer) - self.memory_budget // 2)
+        return len(data)
+
+    def _spill_oldest(self, size):
+        if self._spill is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+            self._spill = tempfile.TemporaryFile(prefix="journal-", dir=self.spill_dir)
+        self._spill.seek(0, os.SEEK_END)
+        self._spill.write(self._buffer[:size])
+        self._spill.flush()
+        del self._buffer[:size]
+        self._spilled += size
+
+    def tell(self):
+        return self._spilled + len(self._buffer)
+
+    def read_at(self, start, end):
+        """Bytes [start, end) del diario, estén en memoria o en disco."""
+        with self._lock:
+            parts = []
+            if start < self._spilled:
+                self._spill.seek(start)
+                parts.append(self._spill.read(min(end, self._spilled) - start))
+            if end > self._spilled:
+                parts.append(bytes(self._buffer[max(start - self._spilled, 0):end - self._spilled]))
+            return b"".join(parts)
+
+    def getvalue(self):
+        return self.read_at(0, self.tell())
+
+    @property
+    def memory_bytes(self):
+        return len(self._buffer)
+
+    @property
+    def spilled_bytes(self):
+        return self._spilled
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            self._buffer = bytearray()
+            self._spilled = 0
@@ -0,0 +1,222 @@
+"""
+Opt-in timing instrumentation, Prometheus metrics and on-demand profiling.
+
+``instrument_model`` replaces a model's phase methods, its router's path
+search and its agents' behaviour methods with timed wrappers on the instances
+themselves, so models that are not instrumented run the original code with no
+extra cost.
+
+``MetricsRegistry.render`` produces the Prometheus text exposition format
+(version 0.0.4). ``StepProfiler`` wraps a model's ``step`` with cProfile (or
+pyinstrument when installed) until it is stopped.
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import pyinstrument
+except ImportError:  # dependencia opcional
+    pyinstrument = None
+
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+MODEL_SECONDS_HELP = "Wall-clock time spent in model phases and agent behaviours"
+
+MODEL_TIMED_METHODS = {
+    "agent_turn": "phase",
+    "fire_spread_phase": "phase",
+    "assign_roles": "role_assignment",
+    # Rutas hacia la salida de quien carga una víctima (actualización o recálculo del campo)
+    "exit_distance_field": "pathfinding",
+}
+
+ROUTER_TIMED_METHODS = {
+    "find_path": "pathfinding",
+}
+
+AGENT_TIMED_METHODS = {
+    "rescuer_behavior": "behavior",
+    "extinguisher_behavior": "behavior",
+}
+
+
+class Histogram:
+    """Histograma acumulativo con los buckets de Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class MetricsRegistry:
+    """Contadores, gauges e histogramas con etiquetas, en formato Prometheus."""
+
+    def __init__(self, prefix="fire_rescue"):
+        self.prefix = prefix
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def _name(self, name):
+        return f"{self.prefix}_{name}"
+
+    def histogram(self, name, help_text, **labels):
+        key = (self._name(name), tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                self._help[key[0]] = help_text
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name, help_text, amount=1, **labels):
+        key = (self._name(name), tuple(sorted(labels.items())))
+        with self._lock:
+            self._help[key[0]] = help_text
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, help_text, callback):
+        """Registrar un gauge cuyo valor se calcula al exportar."""
+        with self._lock:
+            self._help[self._name(name)] = help_text
+            self._gauges[self._name(name)] = callback
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            gauges = sorted(self._gauges.items())
+
+        for name, callback in gauges:
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(callback())}")
+
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _timed(method, histogram):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def instrument_model(model, registry):
+    """Cronometrar las fases del modelo, la búsqueda de rutas y los comportamientos de sus agentes."""
+    for method_name, kind in MODEL_TIMED_METHODS.items():
+        histogram = registry.histogram("model_seconds", MODEL_SECONDS_HELP,
+                                       kind=kind, method=method_name)
+        setattr(model, method_name, _timed(getattr(model, method_name), histogram))
+    for method_name, kind in ROUTER_TIMED_METHODS.items():
+        histogram = registry.histogram("model_seconds", MODEL_SECONDS_HELP,
+                                       kind=kind, method=method_name)
+        setattr(model.router, method_name, _timed(getattr(model.router, method_name), histogram))
+    for agent in model.agent_list:
+        for method_name, kind in AGENT_TIMED_METHODS.items():
+            histogram = registry.histogram("model_seconds", MODEL_SECONDS_HELP,
+                                           kind=kind, method=method_name)
+            setattr(agent, method_name, _timed(getattr(agent, method_name), histogram))
+    return model
+
+
+class StepProfiler:
+    """Perfilar cada llamada a model.step hasta llamar a stop()."""
+
+    PROFILERS = ("cprofile", "pyinstrument")
+
+    def __init__(self, model, profiler="cprofile"):
+        if profiler not in self.PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        if profiler == "pyinstrument" and pyinstrument is None:
+            raise ValueError("pyinstrument is not installed")
+        self.model = model
+        self.profiler = profiler
+        self.steps = 0
+        self._profile = cProfile.Profile() if profiler == "cprofile" else pyinstrument.Profiler()
+        self._original_step = model.step
+        model.step = self._step
+
+    def _step(self, *args, **kwargs):
+        # cProfile solo registra el hilo que lo activa: se enciende por paso
+        if self.profiler == "cprofile":
+            self._profile.enable()
+        else:
+            self._profile.start()
+        try:
+            return self._original_step(*args, **kwargs)
+        finally:
+            if self.profiler == "cprofile":
+                self._profile.disable()
+            else:
+                self._profile.stop()
+            self.steps += 1
+
+    def stop(self, limit=40):
+        """Restaurar model.step y devolver el informe en texto."""
+        self.model.step = self._original_step
+        if self.profiler == "pyinstrument":
+            return self._profile.output_text()
+        output = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return f"{self.steps} steps profiled\n" + output.getvalue()
@@ -0,0 +1,46 @@
+"""
+Synthetic building layouts built from the stock board.
+
+``tile_layout`` repeats the stock 8x6 floor ``rows`` x ``cols`` times and opens a
+closed door on every shared border so the tiles form a single building.
+"""
+
+import numpy as np
+
+from models.fireRescueModel import grid_layout
+
+TOP, RIGHT, BOTTOM, LEFT = 0, 1, 2, 3
+CLOSED_DOOR = 4
+
+
+def tile_layout(rows, cols, base=None):
+    base = np.array(grid_layout if base is None else base)
+    tile_height, tile_width = base.shape[:2]
+    grid = np.tile(base, (rows, cols, 1))
+
+    # Puertas entre baldosas vecinas, en el centro de cada borde compartido
+    for row in range(rows):
+        for col in range(cols):
+            top, left = row * tile_height, col * tile_width
+            if col + 1 < cols:
+                y = top + tile_height // 2
+                x = left + tile_width - 1
+                grid[y, x, RIGHT] = CLOSED_DOOR
+                grid[y, x + 1, LEFT] = CLOSED_DOOR
+            if row + 1 < rows:
+                y = top + tile_height - 1
+                x = left + tile_width // 2
+                grid[y, x, BOTTOM] = CLOSED_DOOR
+                grid[y + 1, x, TOP] = CLOSED_DOOR
+    return grid
+
+
+def build_board(name):
+    """Tablero por nombre: 'stock' o 'tiled_<filas>x<columnas>' (p. ej. 'tiled_2x2')."""
+    if name == "stock":
+        return np.array(grid_layout)
+    if name.startswith("tiled_"):
+        rows, _, cols = name[len("tiled_"):].partition("x")
+        if rows.isdigit() and cols.isdigit():
+            return tile_layout(int(rows), int(cols))
+    raise ValueError(f"Unknown board: {name}")
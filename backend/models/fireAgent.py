@@ -1,21 +1,36 @@
 from mesa import Agent
 import numpy as np
-import random
-import heapq
 
 from models.firefighterRole import FireFighterRole
 from models.fireState import FireState
 from models.poi import POIType
 
+# Intentos de muestreo aleatorio antes de recorrer todo el tablero al reaparecer
+RESPAWN_SAMPLE_ATTEMPTS = 32
+
+
+def move_cost(wall_type):
+    """Puntos de acción para cruzar un lado de celda (inf si hay muro)."""
+    if wall_type == 0 or wall_type == 3:
+        return 1
+    elif wall_type == 4:
+        return 2
+    else:
+        return float("inf")
+
 class FireAgent(Agent):
     def __init__(self, unique_id, model):
         super().__init__(model)
+        # Mesa cuenta los ids en Agent._ids, un dict de clase indexado por modelo: sin
+        # quitar la entrada cada modelo quedaría referenciado hasta el final del proceso
+        # (el id se asigna aquí abajo, así que el contador no se usa)
+        Agent._ids.pop(model, None)
         self.action_points = 4
         self.role = None
         self.target_poi = None
         self.carrying_victim = None
         self.knockout_timer = 0
-        self.max_knockout_time = 2
+        self.max_knockout_time = model.rules.max_knockout_time
         self.path = []
         self.unique_id = unique_id
 
@@ -40,23 +55,38 @@ class FireAgent(Agent):
         new_position = self.find_valid_respawn_position()
         if new_position:
             print(f"Agente {self.unique_id} respawneo en {new_position}")
-            self.model.grid.move_agent(self, new_position)
+            self.model._move_agent(self, new_position)
 
         self.path = []
 
     def find_valid_respawn_position(self):
-        valid_positions = []
-        for y in range(self.model.height):
-            for x in range(self.model.width):
-                if self.model._get_fire_state(x, y) == FireState.CLEAR:
-                    if not any(
-                        poi.x == x and poi.y == y for poi in self.model.active_pois
-                    ):
-                        # Ya no verificamos si la celda está vacía porque ahora permitimos múltiples agentes
-                        valid_positions.append((x, y))
-
+        # Ya no verificamos si la celda está vacía porque ahora permitimos múltiples agentes
+        model = self.model
+        poi_positions = {(poi.x, poi.y) for poi in model.active_pois}
+        area = model.width * model.height
+        burning = len(model.fire_cells) + len(model.smoke_cells)
+
+        # Muestreo por rechazo: con fuego disperso casi todas las celdas valen
+        if burning * 2 < area:
+            for _ in range(RESPAWN_SAMPLE_ATTEMPTS):
+                pos = (model.random.randrange(model.width), model.random.randrange(model.height))
+                if (
+                    pos not in model.fire_cells
+                    and pos not in model.smoke_cells
+                    and pos not in poi_positions
+                ):
+                    return pos
+
+        valid_positions = [
+            (x, y)
+            for y in range(model.height)
+            for x in range(model.width)
+            if (x, y) not in model.fire_cells
+            and (x, y) not in model.smoke_cells
+            and (x, y) not in poi_positions
+        ]
         if valid_positions:
-            return random.choice(valid_positions)
+            return model.random.choice(valid_positions)
 
         return None
 
@@ -71,17 +101,15 @@ class FireAgent(Agent):
 
     def rescuer_behavior(self):
         if self.carrying_victim:
-            exits = [(0, 2), (7, 4)]
-            target_exit = self.get_nearest_exit(exits)
-            if target_exit is None:
+            if not self.model.exits:
                 print(f"ERROR: Agente {self.unique_id} - No encuentra la salida LOL")
                 return
 
             print(
-                f"Agente {self.unique_id}: acarreando victima {self.carrying_victim.id}, posicion actual: {self.pos}, salida a la que va: {target_exit}"
+                f"Agente {self.unique_id}: acarreando victima {self.carrying_victim.id}, posicion actual: {self.pos}"
             )
 
-            if self.pos == target_exit:
+            if self.pos in self.model.exits:
                 print(f"Victima salvada por FireFighter {self.unique_id}!")
                 rescued_victim = self.carrying_victim
                 self.carrying_victim = None
@@ -93,8 +121,12 @@ class FireAgent(Agent):
                 self.extinguish_fire(self.pos[0], self.pos[1])
                 return
 
-            print(f"Agente {self.unique_id} moviendo a la salida: {target_exit}")
-            self.move_with_fire_handling(target_exit)
+            # Sigue el gradiente del campo de distancias hacia la salida más cercana
+            print(f"Agente {self.unique_id} moviendo a la salida")
+            self.path = []
+            self._move_with_fire_handling(
+                lambda: self.pos in self.model.exits, self.move_towards_exit
+            )
 
         elif self.target_poi:
             if self.pos == (self.target_poi.x, self.target_poi.y):
@@ -119,9 +151,11 @@ class FireAgent(Agent):
                 else:
                     self.move_towards_target(nearby_fire)
 
-    def extinguisher_behavior(self):
+    def extinguisher_behavior(self, find_target=None):
+        # find_target: elección del objetivo de la política (por defecto el fuego más cercano)
+        find_target = find_target or self.find_nearest_fire
         while self.action_points > 0:
-            target = self.find_nearest_fire()
+            target = find_target()
             if target:
                 if self.pos == target:
                     self.extinguish_fire(target[0], target[1])
@@ -133,15 +167,20 @@ class FireAgent(Agent):
                 break
 
     def move_with_fire_handling(self, target):
+        self._move_with_fire_handling(
+            lambda: self.pos == target, lambda: self.move_towards_target(target)
+        )
+
+    def _move_with_fire_handling(self, reached, advance):
         while self.action_points > 0:
-            if self.pos == target:
+            if reached():
                 break
 
             current_fire_state = self.model._get_fire_state(self.pos[0], self.pos[1])
             if current_fire_state in [FireState.FIRE, FireState.SMOKE]:
                 self.extinguish_fire(self.pos[0], self.pos[1])
                 return
-            moved = self.move_towards_target(target)
+            moved = advance()
             if not moved:
                 break
 
@@ -151,19 +190,18 @@ class FireAgent(Agent):
                 return
 
     def find_nearest_fire(self):
-        best_target = None
-        best_distance = float("inf")
-
-        for y in range(self.model.height):
-            for x in range(self.model.width):
-                fire_state = self.model._get_fire_state(x, y)
-                if fire_state in [FireState.FIRE, FireState.SMOKE]:
-                    distance = abs(x - self.pos[0]) + abs(y - self.pos[1])
-                    if distance < best_distance:
-                        best_target = (x, y)
-                        best_distance = distance
-
-        return best_target
+        # Empates por orden de fila (y, x), igual que el recorrido completo del tablero
+        px, py = self.pos
+        best_key = None
+        for cells in (self.model.fire_cells, self.model.smoke_cells):
+            for x, y in cells:
+                key = (abs(x - px) + abs(y - py), y, x)
+                if best_key is None or key < best_key:
+                    best_key = key
+
+        if best_key is None:
+            return None
+        return best_key[2], best_key[1]
 
     def extinguish_fire(self, x, y):
         fire_state = self.model._get_fire_state(x, y)
@@ -180,18 +218,6 @@ class FireAgent(Agent):
                 self.action_points -= 1
                 self.model._set_fire_state(x, y, FireState.CLEAR)
 
-    def get_nearest_exit(self, exits):
-        best_exit = None
-        best_distance = float("inf")
-
-        for exit in exits:
-            distance = abs(exit[0] - self.pos[0]) + abs(exit[1] - self.pos[1])
-            if distance < best_distance:
-                best_exit = exit
-                best_distance = distance
-
-        return best_exit
-
     def reveal_and_handle_poi(self):
         if self.action_points > 0:
             print(
@@ -228,44 +254,62 @@ class FireAgent(Agent):
             print(f"Agente {self.unique_id} path: {self.path}")
 
         if self.path and len(self.path) > 1:
-            next_pos = self.path[1]
-            cost = self.get_move_cost(self.pos, next_pos)
-            if self.action_points >= cost:
-                wall_type, wall_dir = self.model._get_wall_between_cells(
-                    self.pos[0], self.pos[1], next_pos[0], next_pos[1]
-                )
-                if wall_type == 0 or wall_type == 3:
-                    self.model.grid.move_agent(self, next_pos)
-                    self.action_points -= cost
-                    self.path.pop(0)
-                    if self.carrying_victim:
-                        self.carrying_victim.x = self.pos[0]
-                        self.carrying_victim.y = self.pos[1]
-                        print(
-                            f"Agente {self.unique_id}: se movio a {self.pos} con una victima"
-                        )
-                    return True
-                elif wall_type == 4:
-                    self.open_door(self.pos[0], self.pos[1], wall_dir)
-                    self.path.pop(0)
-                    return True
-                else:
-                    self.path = []
-                    return False
-            else:
-                return False
+            result = self._advance_to(self.path[1])
+            if result in ("moved", "door"):
+                self.path.pop(0)
+                return True
+            if result == "chop":
+                return True
+            if result == "blocked":
+                self.path = []
+            return False
         return False
 
+    def move_towards_exit(self):
+        if self.action_points <= 0:
+            return False
+
+        next_pos = self.model.next_step_to_exit(self.pos)
+        if next_pos is None:
+            return False
+        return self._advance_to(next_pos) in ("moved", "door", "chop")
+
+    def _advance_to(self, next_pos):
+        """Dar un paso a una celda vecina: 'moved', 'door', 'chop', 'blocked' o 'no_ap'."""
+        wall_type, wall_dir = self.model._get_wall_between_cells(
+            self.pos[0], self.pos[1], next_pos[0], next_pos[1]
+        )
+        if wall_type in (1, 2) and self.model.router.allows_chop:
+            # El router planificó atravesar el muro: picarlo (1 PA por golpe)
+            if self.action_points < 1:
+                return "no_ap"
+            self.chop_wall(self.pos[0], self.pos[1], wall_dir)
+            return "chop"
+
+        cost = move_cost(wall_type)
+        if self.action_points < cost:
+            return "no_ap"
+
+        if wall_type == 0 or wall_type == 3:
+            self.model._move_agent(self, next_pos)
+            self.action_points -= cost
+            if self.carrying_victim:
+                self.carrying_victim.x = self.pos[0]
+                self.carrying_victim.y = self.pos[1]
+                print(
+                    f"Agente {self.unique_id}: se movio a {self.pos} con una victima"
+                )
+            return "moved"
+        elif wall_type == 4:
+            self.open_door(self.pos[0], self.pos[1], wall_dir)
+            return "door"
+        return "blocked"
+
     def get_move_cost(self, pos, next_pos):
         wall_type, _ = self.model._get_wall_between_cells(
             pos[0], pos[1], next_pos[0], next_pos[1]
         )
-        if wall_type == 0 or wall_type == 3:
-            return 1
-        elif wall_type == 4:
-            return 2
-        else:
-            return float("inf")
+        return move_cost(wall_type)
 
     def chop_wall(self, x, y, direction):
         if self.action_points >= 1:
@@ -279,70 +323,14 @@ class FireAgent(Agent):
             and 0 <= y < self.model.height
         ):
             if self.model.grid_data[y, x, direction] == 4:
-                self.model.grid_data[y, x, direction] = 3
+                self.model._set_wall(x, y, direction, 3)
                 self.action_points -= 1
                 print(f"Agente {self.unique_id} abrio puerta ({x}, {y})")
 
     def djikstra(self, start, goal):
-        if start == goal:
-            return [start]
-
-        g_score = {start: 0}
-        open_set = [(g_score[start], start)]
-        came_from = {}
-        visited = set()
-
-        while open_set:
-            current_distance, current = heapq.heappop(open_set)
-
-            if current in visited:
-                continue
-
-            visited.add(current)
-
-            if current == goal:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.append(start)
-                path.reverse()
-                return path
-
-            neighbors = self.get_neighbors(current)
-            for neighbor in neighbors:
-                if neighbor in visited:
-                    continue
-
-                tentative_g_score = g_score[current] + self.get_move_cost(
-                    current, neighbor
-                )
-
-                if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    heapq.heappush(open_set, (tentative_g_score, neighbor))
-
-        return []
-
-    def get_neighbors(self, pos):
-        x, y = pos
-        neighbors = []
-        directions = [
-            (0, -1),
-            (1, 0),
-            (0, 1),
-            (-1, 0),
-        ]  # arriba, derecha, abajo, izquierda
-
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-
-            if 0 <= nx < self.model.width and 0 <= ny < self.model.height:
-                neighbors.append((nx, ny))
+        # Ruta por el router compartido del modelo (A* con capas de coste)
+        return self.model.router.find_path(start, goal)
 
-        return neighbors
-    
     def step(self):
         self.reset_ap()
         self.update_knockout()
@@ -359,9 +347,6 @@ class FireAgent(Agent):
             else:
                 self.role = FireFighterRole.EXTINGUISHER
 
-        if self.role == FireFighterRole.RESCUER:
-            self.rescuer_behavior()
-        elif self.role == FireFighterRole.EXTINGUISHER:
-            self.extinguisher_behavior()
+        self.model.policy.act(self)
 
         self.check_knockout()
\ No newline at end of file
@@ -1,13 +1,21 @@
+from collections.abc import Sequence
+
 from mesa import Model
 from mesa.space import MultiGrid
 
 import numpy as np
+import heapq
+import numbers
 import random
 
-from models.fireAgent import FireAgent
-from models.fireState import FireState
-from models.firefighterRole import FireFighterRole
-from models.poi import POI, POIType
+from models.fireAgent import FireAgent, move_cost
+from models.fireState import FireState, FIRE_STATE_CODES
+from models.gameRules import DEFAULT_RULES
+from models.poi import POIType
+from models.policies import resolve_policy
+from models.poiTable import POITable, poi_list_property
+from models.roomGraph import HIERARCHICAL_MIN_CELLS, RoomGraph
+from models.routingEngine import NEIGHBOR_OFFSETS, RoutingEngine
 
 wall_type = [0, 1, 2, 3, 4]  # 0: none, 1: wall 1hp, 2: wall 2hp, 3: open door
 # 4: closed door
@@ -23,26 +31,87 @@ grid_layout = [
 
 grid_data = np.array(grid_layout)
 
+# Salidas del tablero de serie (x, y)
+DEFAULT_EXITS = ((0, 2), (7, 4))
+
+# El diario guarda la semilla como uint32 y fire_risk no admite semillas negativas
+MAX_SEED = 2**32
+
+class FreePositions(Sequence):
+    """Celdas sin POI activo, en orden de filas, sin construir la lista.
+
+    random.choice/sample solo usan len() e índices, así que eligen lo mismo que
+    con la lista completa pero en O(POIs) en lugar de O(celdas).
+    """
+
+    def __init__(self, width, height, occupied):
+        self.width = width
+        self.cells = width * height
+        self.occupied = sorted({y * width + x for x, y in occupied if 0 <= x < width and 0 <= y < height})
+
+    def __len__(self):
+        return self.cells - len(self.occupied)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("position index out of range")
+        cell = index
+        for taken in self.occupied:
+            if taken > cell:
+                break
+            cell += 1
+        return (cell % self.width, cell // self.width)
+
+
 class FireRescueModel(Model):
-    def __init__(self, grid_data):
-        super().__init__()
+    # Listas de POIs: vistas sobre las columnas de self.poi_table
+    all_pois = poi_list_property("all_pois")
+    active_pois = poi_list_property("active_pois")
+    revealed_pois = poi_list_property("revealed_pois")
+    lost_victims = poi_list_property("lost_victims")
+    rescued_victims = poi_list_property("rescued_victims")
+    pois_lost = poi_list_property("pois_lost")
+
+    def __init__(self, grid_data, seed=None, populate=True, exits=DEFAULT_EXITS, rules=None,
+                 policy=None, split_streams=False):
+        if seed is None:
+            seed = random.randrange(2**31)
+        elif isinstance(seed, bool) or not isinstance(seed, numbers.Integral) or not 0 <= seed < MAX_SEED:
+            raise ValueError(f"seed must be an integer between 0 and {MAX_SEED - 1}, got {seed!r}")
+        else:
+            seed = int(seed)
+        super().__init__(seed=seed)
+        self.seed = seed
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.policy = resolve_policy(policy)
+        # Con split_streams la propagación del fuego y los POIs sacan sus números de
+        # flujos propios, así que no dependen de lo que hagan los bomberos (números
+        # aleatorios comunes entre políticas). Por defecto todo usa self.random.
+        if split_streams:
+            self.fire_random = random.Random(f"{seed}:fire")
+            self.poi_random = random.Random(f"{seed}:poi")
+        else:
+            self.fire_random = self.poi_random = self.random
         self.grid_data = grid_data
         height, width = grid_data.shape[:2]
         self.height = height
         self.width = width
+        self.exits = [tuple(pos) for pos in exits]
 
         self.grid = MultiGrid(width, height, torus=False)
         self.running = True
         self.fire_states = np.full((height, width), FireState.CLEAR)
+        # Índices vivos de celdas con fuego/humo y del frente (humo junto a fuego),
+        # mantenidos por _set_fire_state
+        self.fire_cells = set()
+        self.smoke_cells = set()
+        self.frontier_cells = set()
         self.step_count = 0
         self.damage_count = 0
 
-        self.all_pois = []
-        self.active_pois = []
-        self.revealed_pois = []
-        self.lost_victims = []
-        self.rescued_victims = []
-        self.pois_lost = []
+        self.poi_table = POITable()
 
         self.current_agent_index = 0
         self.agent_list = []
@@ -64,35 +133,43 @@ class FireRescueModel(Model):
             "round": [],
         }
 
+        self.journal = None
+        # Contador de versión: cambia con cada mutación del estado observable
+        self.version = 0
+        # Versión de muros/puertas, para invalidar el campo de distancias a las salidas
+        self.wall_version = 0
+        self._exit_field = None
+        self._exit_field_changes = []  # lados abiertos desde el último cálculo del campo
+        # Router compartido por todos los agentes (grafo CSR + capas de coste);
+        # en tableros grandes planifica primero por salas
+        self.router = RoutingEngine(self)
+        if self.width * self.height >= HIERARCHICAL_MIN_CELLS:
+            self.router.room_graph = RoomGraph(self.router)
+
+        if not populate:
+            return
+
         self._create_poi_pool()
         self._place_initial_pois()
         self._place_initial_fires()
         self.place_firefighters()
 
     def _create_poi_pool(self):
+        pool = []
         poi_id = 1
-        for i in range(10):
-            poi = POI(poi_id, POIType.VICTIM, -1, -1)
-            self.all_pois.append(poi)
+        for i in range(self.rules.victim_pois):
+            pool.append(self.poi_table.add(poi_id, POIType.VICTIM, -1, -1))
             poi_id += 1
 
-        for i in range(5):
-            poi = POI(poi_id, POIType.FALSE, -1, -1)
-            self.all_pois.append(poi)
+        for i in range(self.rules.false_alarm_pois):
+            pool.append(self.poi_table.add(poi_id, POIType.FALSE, -1, -1))
             poi_id += 1
 
-        random.shuffle(self.all_pois)
+        self.poi_random.shuffle(pool)
+        self.all_pois = pool
 
     def _get_valid_positions_for_poi(self):
-        valid_positions = []
-
-        for y in range(self.height):
-            for x in range(self.width):
-                if any(poi.x == x and poi.y == y for poi in self.active_pois):
-                    continue
-                valid_positions.append((x, y))
-
-        return valid_positions
+        return FreePositions(self.width, self.height, ((poi.x, poi.y) for poi in self.active_pois))
 
     def _place_initial_pois(self):
         valid_positions = self._get_valid_positions_for_poi()
@@ -100,9 +177,9 @@ class FireRescueModel(Model):
         if len(self.all_pois) == 0 or len(valid_positions) == 0:
             return
 
-        num_pois = min(3, len(self.all_pois), len(valid_positions))
-        initial_pois = random.sample(self.all_pois, num_pois)
-        selected_positions = random.sample(valid_positions, num_pois)
+        num_pois = min(self.rules.initial_pois, len(self.all_pois), len(valid_positions))
+        initial_pois = self.poi_random.sample(self.all_pois, num_pois)
+        selected_positions = self.poi_random.sample(valid_positions, num_pois)
 
         for poi, (x, y) in zip(initial_pois, selected_positions):
             poi.x = x
@@ -126,12 +203,12 @@ class FireRescueModel(Model):
         if len(valid_positions) == 0:
             return None
 
-        new_poi = random.choice(self.all_pois)
-        selected_position = random.choice(valid_positions)
+        new_poi = self.poi_random.choice(self.all_pois)
+        selected_position = self.poi_random.choice(valid_positions)
 
         new_poi.x = selected_position[0]
         new_poi.y = selected_position[1]
-        self.fire_states[new_poi.y, new_poi.x] = FireState.CLEAR
+        self._set_fire_state(new_poi.x, new_poi.y, FireState.CLEAR)
         self.active_pois.append(new_poi)
         self.all_pois.remove(new_poi)
 
@@ -166,15 +243,14 @@ class FireRescueModel(Model):
 
     def check_pois_in_danger(self):
         for poi in self.active_pois[:]:
-            fire_state = self._get_fire_state(poi.x, poi.y)
-            if fire_state == FireState.FIRE:
+            if (poi.x, poi.y) in self.fire_cells:
                 if poi.type == POIType.VICTIM:
                     self.lost_victims.append(poi)
                 self.active_pois.remove(poi)
                 self.pois_lost.append(poi)
                 self.place_new_poi()
 
-        if len(self.lost_victims) >= 4:
+        if len(self.lost_victims) >= self.rules.max_victims_lost:
             self.end_game(
                 False, f"Derrota: {len(self.lost_victims)} victimas perdidas por fuego"
             )
@@ -182,13 +258,13 @@ class FireRescueModel(Model):
         return self.pois_lost
 
     def _place_initial_fires(self):
-        self.fire_states[1, 3] = FireState.FIRE
-        self.fire_states[0, 7] = FireState.FIRE
-        self.fire_states[3, 1] = FireState.FIRE
+        self._set_fire_state(3, 1, FireState.FIRE)
+        self._set_fire_state(7, 0, FireState.FIRE)
+        self._set_fire_state(1, 3, FireState.FIRE)
 
     def spread_fire_random(self):
-        x = random.randint(0, self.width - 1)
-        y = random.randint(0, self.height - 1)
+        x = self.fire_random.randint(0, self.width - 1)
+        y = self.fire_random.randint(0, self.height - 1)
 
         current_state = self._get_fire_state(x, y)
 
@@ -216,20 +292,14 @@ class FireRescueModel(Model):
                         self._set_fire_state(ax, ay, FireState.FIRE)
 
     def spread_smoke_to_fire(self):
-        fire_positions = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if self._get_fire_state(x, y) == FireState.FIRE:
-                    fire_positions.append((x, y))
-
+        # Solo el frente puede arder: humo con fuego adyacente y sin muro en medio
         smoke_to_convert = []
-        for fx, fy in fire_positions:
-            adjacent_cells = self._get_adjacent_cells(fx, fy)
-            for adj in adjacent_cells:
-                ax, ay = adj["pos"]
-                wall_type = adj["wall_type"]
-                if self._get_fire_state(ax, ay) == FireState.SMOKE and wall_type == 0:
-                    smoke_to_convert.append((ax, ay))
+        for sx, sy in self.frontier_cells:
+            for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+                fx, fy = sx + dx, sy + dy
+                if (fx, fy) in self.fire_cells and self.grid_data[fy, fx, (direction + 2) % 4] == 0:
+                    smoke_to_convert.append((sx, sy))
+                    break
 
         for sx, sy in smoke_to_convert:
             self._set_fire_state(sx, sy, FireState.FIRE)
@@ -237,55 +307,149 @@ class FireRescueModel(Model):
     def _get_fire_state(self, x, y):
         return self.fire_states[y, x]
 
+    def fire_state_codes(self):
+        codes = np.zeros((self.height, self.width), dtype=np.uint8)
+        for state, code in FIRE_STATE_CODES.items():
+            codes[self.fire_states == state] = code
+        return codes
+
     def _set_fire_state(self, x, y, state):
         self.fire_states[y, x] = state
+        self._index_fire_cell(x, y, state)
+        self.version += 1
+        if self.journal is not None:
+            self.journal.record_fire(x, y, state)
+
+    def _index_fire_cell(self, x, y, state):
+        pos = (x, y)
+        self.fire_cells.discard(pos)
+        self.smoke_cells.discard(pos)
+        if state == FireState.FIRE:
+            self.fire_cells.add(pos)
+        elif state == FireState.SMOKE:
+            self.smoke_cells.add(pos)
+
+        # El cambio solo afecta al frente de la celda y sus vecinas
+        self._update_frontier(pos)
+        for dx, dy in NEIGHBOR_OFFSETS:
+            self._update_frontier((x + dx, y + dy))
+
+    def _update_frontier(self, pos):
+        x, y = pos
+        if pos in self.smoke_cells and any(
+            (x + dx, y + dy) in self.fire_cells for dx, dy in NEIGHBOR_OFFSETS
+        ):
+            self.frontier_cells.add(pos)
+        else:
+            self.frontier_cells.discard(pos)
+
+    def rebuild_fire_index(self):
+        """Recalcular los índices de fuego/humo tras asignar fire_states en bloque."""
+        self.fire_cells = {(int(x), int(y)) for y, x in zip(*np.nonzero(self.fire_states == FireState.FIRE))}
+        self.smoke_cells = {(int(x), int(y)) for y, x in zip(*np.nonzero(self.fire_states == FireState.SMOKE))}
+        self.frontier_cells = set()
+        for pos in self.smoke_cells:
+            self._update_frontier(pos)
+
+    def _set_wall(self, x, y, direction, wall_type):
+        previous = self.grid_data[y, x, direction]
+        self.grid_data[y, x, direction] = wall_type
+        self.version += 1
+        self.wall_version += 1
+        # Actualizaciones locales: el coste no depende del tamaño del tablero
+        self._exit_field_wall_changed(x, y, direction, previous, wall_type)
+        self.router.wall_changed(x, y, direction, wall_type)
+        if self.journal is not None:
+            self.journal.record_wall(x, y, direction, wall_type)
+
+    def exit_distance_field(self):
+        """Coste mínimo desde cada celda hasta la salida más cercana (Dijkstra inverso).
+
+        Abrir lados solo baja distancias: los cambios pendientes se aplican
+        relajando desde las celdas afectadas. Se recalcula entero cuando algún
+        cambio encarece un lado o los muros cambian sin pasar por _set_wall.
+        """
+        if self._exit_field is not None:
+            version, distances = self._exit_field
+            if version + len(self._exit_field_changes) == self.wall_version:
+                if self._exit_field_changes:
+                    self._apply_exit_field_changes(distances)
+                    self._exit_field = (self.wall_version, distances)
+                return distances
+
+        distances = np.full((self.height, self.width), np.inf)
+        open_set = []
+        for x, y in self.exits:
+            distances[y, x] = 0
+            heapq.heappush(open_set, (0, x, y))
+        self._relax_exit_field(distances, open_set)
+
+        self._exit_field = (self.wall_version, distances)
+        self._exit_field_changes = []
+        return distances
+
+    def _relax_exit_field(self, distances, open_set):
+        grid, width, height = self.grid_data, self.width, self.height
+        while open_set:
+            distance, x, y = heapq.heappop(open_set)
+            if distance > distances.item(y, x):
+                continue
+            # Relajar las celdas desde las que se entra en (x, y)
+            for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    cost = distance + move_cost(grid.item(ny, nx, (direction + 2) % 4))
+                    if cost < distances.item(ny, nx):
+                        distances[ny, nx] = cost
+                        heapq.heappush(open_set, (cost, nx, ny))
+
+    def _exit_field_wall_changed(self, x, y, direction, previous, wall_type):
+        """Anotar un lado cambiado de (x, y) para actualizar el campo al consultarlo."""
+        if self._exit_field is None:
+            return
+        if (self._exit_field[0] + len(self._exit_field_changes) != self.wall_version - 1
+                or move_cost(wall_type) > move_cost(previous)):
+            # Más caro (las distancias pueden subir en cualquier parte) o cambios perdidos
+            self._exit_field = None
+            self._exit_field_changes = []
+            return
+        self._exit_field_changes.append((x, y, direction))
 
-    def assign_roles(self):
-        for agent in self.agent_list:
-            agent.role = None
-            agent.target_poi = None
-
-        carrying_agents = []
-        for agent in self.agent_list:
-            if agent.carrying_victim:
-                agent.role = FireFighterRole.RESCUER
-                carrying_agents.append(agent)
-
-        available_pois = []
-        for poi in self.active_pois:
-            if not poi.revealed:
-                available_pois.append(poi)
-
-        available_agents = []
-        for agent in self.agent_list:
-            if not agent.carrying_victim:
-                available_agents.append(agent)
-
-        potential_assignments = []
-        for poi in available_pois:
-            for agent in available_agents:
-                distance = abs(poi.x - agent.pos[0]) + abs(poi.y - agent.pos[1])
-                potential_assignments.append((distance, agent, poi))
-
-        potential_assignments.sort(key=lambda x: x[0])
-        assigned_rescuers = set(carrying_agents)
-        poi_assignments = set()
-        max_rescuers = 3
-
-        for distance, agent, poi in potential_assignments:
-            if len(assigned_rescuers) >= max_rescuers:
-                break
+    def _apply_exit_field_changes(self, distances):
+        # Solo bajan las distancias que mejoran desde las celdas con lados abiertos
+        open_set = []
+        for x, y, direction in self._exit_field_changes:
+            dx, dy = NEIGHBOR_OFFSETS[direction]
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                cost = distances.item(ny, nx) + move_cost(self.grid_data.item(y, x, direction))
+                if cost < distances.item(y, x):
+                    distances[y, x] = cost
+                    heapq.heappush(open_set, (cost, x, y))
+        self._relax_exit_field(distances, open_set)
+        self._exit_field_changes = []
+
+    def next_step_to_exit(self, pos):
+        """Vecina por la que baja el campo de distancias, o None si no hay camino."""
+        distances = self.exit_distance_field()
+        x, y = pos
+        best, best_cost = None, distances[y, x]
+        if not np.isfinite(best_cost) or best_cost == 0:
+            return None
+        for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                cost = move_cost(self.grid_data[y, x, direction]) + distances[ny, nx]
+                if cost <= best_cost and (best is None or cost < best[0]):
+                    best = (cost, (nx, ny))
+        return best[1] if best else None
 
-            if agent not in assigned_rescuers and poi not in poi_assignments:
-                agent.role = FireFighterRole.RESCUER
-                agent.target_poi = poi
-                assigned_rescuers.add(agent)
-                poi_assignments.add(poi)
+    def _move_agent(self, agent, pos):
+        self.grid.move_agent(agent, pos)
+        self.version += 1
 
-        for agent in self.agent_list:
-            if agent.role is None and not agent.is_knocked_out():
-                agent.role = FireFighterRole.EXTINGUISHER
-                agent.target_poi = None
+    def assign_roles(self):
+        self.policy.assign_roles(self)
 
     def place_firefighters(self):
         valid_positions = []
@@ -300,7 +464,7 @@ class FireRescueModel(Model):
 
                 valid_positions.append((x, y))
 
-        selected_positions = random.sample(valid_positions, 6)
+        selected_positions = self.random.sample(valid_positions, self.rules.firefighters)
         for i, pos in enumerate(selected_positions):
             firefighter = FireAgent(i, self)
             self.grid.place_agent(firefighter, pos)
@@ -326,10 +490,7 @@ class FireRescueModel(Model):
         current_agent.reset_ap()
 
         if not current_agent.is_knocked_out():
-            if current_agent.role == FireFighterRole.RESCUER:
-                current_agent.rescuer_behavior()
-            elif current_agent.role == FireFighterRole.EXTINGUISHER:
-                current_agent.extinguisher_behavior()
+            self.policy.act(current_agent)
 
         current_agent.check_knockout()
         self.current_agent_index = (self.current_agent_index + 1) % len(self.agent_list)
@@ -400,7 +561,7 @@ class FireRescueModel(Model):
                 print(
                     f"Muro grueso dañado en ({x}, {y}), contador de daño: {self.damage_count}"
                 )
-                self.grid_data[y, x, direction] = 1
+                self._set_wall(x, y, direction, 1)
                 self.damage_count += 1
                 self.check_damage_loss_condition()
                 return False
@@ -408,23 +569,23 @@ class FireRescueModel(Model):
                 print(
                     f"Muro destruido en ({x}, {y}), contador de daño: {self.damage_count}"
                 )
-                self.grid_data[y, x, direction] = 0
+                self._set_wall(x, y, direction, 0)
                 self.damage_count += 1
                 self.check_damage_loss_condition()
                 return True
             elif current_wall in [3, 4]:
-                self.grid_data[y, x, direction] = 0
+                self._set_wall(x, y, direction, 0)
                 return True
             else:
                 return True
 
     def check_damage_loss_condition(self):
-        if self.damage_count > 24:
+        if self.damage_count > self.rules.max_damage:
             self.end_game(False, "Derrota: Demasiados daños")
 
     def check_win_condition(self):
-        if len(self.rescued_victims) >= 7:
-            self.end_game(True, "Victoria: 7 victimas rescatadas")
+        if len(self.rescued_victims) >= self.rules.victims_to_win:
+            self.end_game(True, f"Victoria: {self.rules.victims_to_win} victimas rescatadas")
 
     def end_game(self, won, reason):
         self.game_over = True
@@ -437,9 +598,9 @@ class FireRescueModel(Model):
         print(f"{'=' * 50}")
         print(f"Resultado: {reason}")
         print("Estadísticas finales:")
-        print(f"- Víctimas rescatadas: {len(self.rescued_victims)}/7")
-        print(f"- Víctimas perdidas: {len(self.lost_victims)}/4")
-        print(f"- Daño estructural: {self.damage_count}/24")
+        print(f"- Víctimas rescatadas: {len(self.rescued_victims)}/{self.rules.victims_to_win}")
+        print(f"- Víctimas perdidas: {len(self.lost_victims)}/{self.rules.max_victims_lost}")
+        print(f"- Daño estructural: {self.damage_count}/{self.rules.max_damage}")
         print(f"- Rondas jugadas: {self.round_count}")
 
         fire_count = np.sum(self.fire_states == FireState.FIRE)
@@ -477,11 +638,19 @@ class FireRescueModel(Model):
                 print(f"Posición {pos}: {len(agent_ids)} agentes - IDs: {agent_ids}")
         print("--- Fin Distribución ---\n")
 
+    def attach_journal(self, journal):
+        self.journal = journal
+        journal.start(self)
+
     def step(self):
         if self.phase == "AGENT_TURN":
             self.agent_turn()
         elif self.phase == "FIRE_SPREAD":
             self.fire_spread_phase()
+        self.version += 1
+
+        if self.journal is not None:
+            self.journal.end_step(self)
 
 model = FireRescueModel(grid_data)
 
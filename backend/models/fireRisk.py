@@ -0,0 +1,87 @@
+"""
+Monte Carlo fire risk: probability that each cell is on fire within R rounds.
+
+``fire_risk`` replays only the fire phases (``spread_fire_random`` followed by
+``spread_smoke_to_fire``) from the model's current state, for many samples at
+once: fire states are a (samples, height, width) array and walls a
+(samples, height, width, 4) array, and every phase is a handful of NumPy
+operations over all samples. No model is copied.
+
+Firefighters are not simulated (nothing is extinguished) and POI placement is
+ignored, so fire never goes out in a sample: "on fire at the horizon" and "on
+fire at some point within it" are the same event. A round is one fire phase
+per firefighter, as in the game.
+"""
+
+import numpy as np
+
+from models.fireState import FIRE_STATE_CODES, FireState
+from models.routingEngine import NEIGHBOR_OFFSETS
+
+CLEAR = FIRE_STATE_CODES[FireState.CLEAR]
+SMOKE = FIRE_STATE_CODES[FireState.SMOKE]
+FIRE = FIRE_STATE_CODES[FireState.FIRE]
+
+DEFAULT_SAMPLES = 512
+MAX_HORIZON = 20  # rondas
+
+
+def fire_risk(model, horizon, samples=DEFAULT_SAMPLES, seed=None):
+    """Array (alto, ancho) con la probabilidad de fuego de cada celda tras `horizon` rondas.
+
+    Sin `seed` las muestras dependen de la semilla y la versión del modelo, así
+    que el mismo estado da siempre el mismo resultado.
+    """
+    height, width = model.height, model.width
+    rng = np.random.default_rng([model.seed, model.version] if seed is None else seed)
+    states = np.broadcast_to(model.fire_state_codes(), (samples, height, width)).copy()
+    walls = np.broadcast_to(np.asarray(model.grid_data, dtype=np.int8),
+                            (samples, height, width, 4)).copy()
+
+    for _ in range(horizon * max(1, len(model.agent_list))):
+        _spread_random(states, walls, rng)
+        _spread_smoke(states, walls)
+    return (states == FIRE).mean(axis=0)
+
+
+def _spread_random(states, walls, rng):
+    # spread_fire_random en todas las muestras: una celda al azar por muestra
+    samples, height, width = states.shape
+    sample_index = np.arange(samples)
+    ys, xs = np.divmod(rng.integers(0, height * width, size=samples), width)
+    current = states[sample_index, ys, xs]
+    states[sample_index, ys, xs] = np.where(current == CLEAR, SMOKE, FIRE)
+
+    # Explosión: dañar el lado de cada vecina y prenderla si se puede pasar
+    exploding = current == FIRE
+    if not exploding.any():
+        return
+    sample_index, ys, xs = sample_index[exploding], ys[exploding], xs[exploding]
+    for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        nx, ny = xs + dx, ys + dy
+        inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        index = sample_index[inside], ny[inside], nx[inside]
+        wall = walls[index + (direction,)]
+        # damage_wall: muro de 2 pasa a 1 y frena; muro de 1 o puerta se abren
+        walls[index + (direction,)] = np.where(wall == 2, 1, 0)
+        passes = wall != 2
+        states[tuple(axis[passes] for axis in index)] = FIRE
+
+
+def _spread_smoke(states, walls):
+    # spread_smoke_to_fire: humo con una vecina en llamas cuyo lado hacia él está abierto
+    fire = states == FIRE
+    ignite = np.zeros_like(fire)
+    for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        open_fire = fire & (walls[..., (direction + 2) % 4] == 0)
+        ignite |= _shifted(open_fire, dx, dy)
+    states[ignite & (states == SMOKE)] = FIRE
+
+
+def _shifted(array, dx, dy):
+    """result[..., y, x] = array[..., y + dy, x + dx] (False fuera del tablero)."""
+    height, width = array.shape[-2:]
+    result = np.zeros_like(array)
+    result[..., max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+        array[..., max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+    return result
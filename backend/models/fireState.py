@@ -3,4 +3,8 @@ from enum import Enum
 class FireState(Enum):
     CLEAR = "clear"
     SMOKE = "smoke"
-    FIRE = "fire"
\ No newline at end of file
+    FIRE = "fire"
+
+# Codigos numericos usados en el estado serializado (0: clear, 1: smoke, 2: fire)
+FIRE_STATE_CODES = {FireState.CLEAR: 0, FireState.SMOKE: 1, FireState.FIRE: 2}
+FIRE_STATES_BY_CODE = {code: state for state, code in FIRE_STATE_CODES.items()}
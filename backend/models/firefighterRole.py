@@ -2,4 +2,8 @@ from enum import Enum
 
 class FireFighterRole(Enum):
     RESCUER = "rescuer"
-    EXTINGUISHER = "extinguisher"
\ No newline at end of file
+    EXTINGUISHER = "extinguisher"
+
+# 0 se reserva para agentes sin rol
+ROLE_CODES = {None: 0, FireFighterRole.RESCUER: 1, FireFighterRole.EXTINGUISHER: 2}
+ROLES_BY_CODE = {code: role for role, code in ROLE_CODES.items()}
@@ -0,0 +1,455 @@
+"""
+Append-only binary journal of a game, plus a replayer.
+
+Layout: a fixed header (magic, seed, board size, keyframe interval) followed by
+records. A KEYFRAME record holds an encoded snapshot (see modelSnapshot); a STEP
+record holds the events produced by one ``FireRescueModel.step()``:
+
+    fire cell changes, wall/door changes, agent moves, agent state changes,
+    POI placement/status changes and counter changes (agent index, round,
+    damage, end of game).
+
+Events are fixed-size structs, so a typical round costs a few hundred bytes.
+
+``GameJournal`` indexes the keyframes it writes, so ``model_at(step)`` rebuilds
+any recorded step from the nearest keyframe by replaying at most one keyframe
+interval of steps. Streams that implement ``read_at(start, end)`` (see
+``history.py`` in the backend) are read without copying the whole journal.
+"""
+
+import bisect
+import io
+import struct
+
+from models.fireState import FIRE_STATE_CODES, FIRE_STATES_BY_CODE
+from models.firefighterRole import ROLE_CODES, ROLES_BY_CODE
+from models.modelSnapshot import (
+    capture_snapshot,
+    collect_pois,
+    decode_snapshot,
+    encode_snapshot,
+    restore_snapshot,
+)
+
+MAGIC = b"FRJ1"
+HEADER = struct.Struct("<4sIHHH")  # magic, seed, height, width, keyframe interval
+
+RECORD_KEYFRAME = ord("K")
+RECORD_STEP = ord("S")
+KEYFRAME = struct.Struct("<BII")  # tag, step_count, snapshot length
+STEP = struct.Struct("<BBH")  # tag, flags, number of events
+
+EVENT_FIRE = 1
+EVENT_WALL = 2
+EVENT_MOVE = 3
+EVENT_AGENT = 4
+EVENT_POI = 5
+EVENT_AGENT_INDEX = 6
+EVENT_ROUND = 7
+EVENT_DAMAGE = 8
+EVENT_END = 9
+EVENT_LIST = 10
+
+EVENTS = {
+    EVENT_FIRE: struct.Struct("<BHHB"),  # x, y, fire code
+    EVENT_WALL: struct.Struct("<BHHBB"),  # x, y, direction, wall type
+    EVENT_MOVE: struct.Struct("<BBHH"),  # agent, x, y
+    EVENT_AGENT: struct.Struct("<BBBBBBHH"),  # agent, ap, knockout, max knockout, role, carrying, target
+    EVENT_POI: struct.Struct("<BHhhBB"),  # poi, x, y, revealed, list flags
+    EVENT_AGENT_INDEX: struct.Struct("<BB"),
+    EVENT_ROUND: struct.Struct("<BH"),
+    EVENT_DAMAGE: struct.Struct("<BH"),
+    EVENT_END: struct.Struct("<BH"),  # reason length, followed by the utf-8 reason
+    EVENT_LIST: struct.Struct("<BBH"),  # POI list index, length, followed by uint16 ids
+}
+
+EVENT_NAMES = {
+    EVENT_FIRE: "fire",
+    EVENT_WALL: "wall",
+    EVENT_MOVE: "move",
+    EVENT_AGENT: "agent",
+    EVENT_POI: "poi",
+    EVENT_AGENT_INDEX: "agent_index",
+    EVENT_ROUND: "round",
+    EVENT_DAMAGE: "damage",
+    EVENT_END: "end",
+    EVENT_LIST: "list",
+}
+
+# Bits del byte de flags de cada paso
+FLAG_FIRE_SPREAD = 1
+FLAG_GAME_OVER = 2
+FLAG_GAME_WON = 4
+FLAG_GAME_LOST = 8
+FLAG_RUNNING = 16
+
+# Bits de pertenencia de un POI a las listas del modelo
+POI_LIST_FLAGS = (
+    ("all_pois", 1),
+    ("active_pois", 2),
+    ("revealed_pois", 4),
+    ("lost_victims", 8),
+    ("rescued_victims", 16),
+    ("pois_lost", 32),
+)
+
+
+def _step_flags(model):
+    flags = 0
+    if model.phase == "FIRE_SPREAD":
+        flags |= FLAG_FIRE_SPREAD
+    if model.game_over:
+        flags |= FLAG_GAME_OVER
+    if model.game_won:
+        flags |= FLAG_GAME_WON
+    if model.game_lost:
+        flags |= FLAG_GAME_LOST
+    if model.running:
+        flags |= FLAG_RUNNING
+    return flags
+
+
+def _poi_flags(model):
+    # POITable guarda la pertenencia con estos mismos bits
+    return model.poi_table.flags()
+
+
+def _agent_record(agent):
+    return (
+        agent.action_points,
+        agent.knockout_timer,
+        agent.max_knockout_time,
+        ROLE_CODES[agent.role],
+        agent.carrying_victim.id if agent.carrying_victim else 0,
+        agent.target_poi.id if agent.target_poi else 0,
+    )
+
+
+class GameJournal:
+    """Escribe el diario de una partida sobre un stream binario."""
+
+    def __init__(self, stream=None, keyframe_interval=120):
+        self.stream = stream if stream is not None else io.BytesIO()
+        self.keyframe_interval = keyframe_interval
+        self.last_keyframe_step = 0
+        self.keyframes = []  # (step_count, offset del registro en el stream)
+        self.last_step = 0
+        self.end_offset = 0  # fin del último registro completo
+        self._fire = {}
+        self._walls = {}
+
+    def start(self, model):
+        self.stream.write(
+            HEADER.pack(MAGIC, model.seed, model.height, model.width, self.keyframe_interval)
+        )
+        self._fire.clear()
+        self._walls.clear()
+        self._pois = {poi.id: poi for poi in collect_pois(model)}
+        self._remember(model)
+        self.write_keyframe(model)
+
+    def _remember(self, model):
+        self._agent_pos = {agent.unique_id: agent.pos for agent in model.agent_list}
+        self._agent_state = {
+            agent.unique_id: _agent_record(agent) for agent in model.agent_list
+        }
+        self._poi_state = {
+            poi.id: (poi.x, poi.y, poi.revealed, flags)
+            for poi, flags in self._current_poi_state(model)
+        }
+        self._poi_lists = [
+            [poi.id for poi in getattr(model, name)] for name, _ in POI_LIST_FLAGS
+        ]
+        self._agent_index = model.current_agent_index
+        self._round = model.round_count
+        self._damage = model.damage_count
+        self._game_over = model.game_over
+
+    def _current_poi_state(self, model):
+        flags = _poi_flags(model)
+        return [(poi, flags.get(poi_id, 0)) for poi_id, poi in self._pois.items()]
+
+    def record_fire(self, x, y, state):
+        self._fire[(x, y)] = FIRE_STATE_CODES[state]
+
+    def record_wall(self, x, y, direction, wall_type):
+        self._walls[(x, y, direction)] = wall_type
+
+    def write_keyframe(self, model):
+        data = encode_snapshot(capture_snapshot(model, include_rng=False))
+        offset = self.stream.tell()
+        self.stream.write(KEYFRAME.pack(RECORD_KEYFRAME, model.step_count, len(data)))
+        self.stream.write(data)
+        self.last_keyframe_step = model.step_count
+        # end_offset antes que last_step: quien lee last_step ya ve el registro completo
+        self.end_offset = self.stream.tell()
+        self.last_step = model.step_count
+        self.keyframes.append((model.step_count, offset))
+
+    def end_step(self, model):
+        """Escribir los eventos del paso que acaba de ejecutarse."""
+        events = []
+
+        for (x, y), code in self._fire.items():
+            events.append(EVENTS[EVENT_FIRE].pack(EVENT_FIRE, x, y, code))
+        self._fire.clear()
+
+        for (x, y, direction), wall_type in self._walls.items():
+            events.append(EVENTS[EVENT_WALL].pack(EVENT_WALL, x, y, direction, wall_type))
+        self._walls.clear()
+
+        for agent in model.agent_list:
+            agent_id = agent.unique_id
+            if agent.pos != self._agent_pos.get(agent_id):
+                events.append(EVENTS[EVENT_MOVE].pack(EVENT_MOVE, agent_id, *agent.pos))
+                self._agent_pos[agent_id] = agent.pos
+            record = _agent_record(agent)
+            if record != self._agent_state.get(agent_id):
+                events.append(EVENTS[EVENT_AGENT].pack(EVENT_AGENT, agent_id, *record))
+                self._agent_state[agent_id] = record
+
+        changed_pois = []
+        for poi, flags in self._current_poi_state(model):
+            state = (poi.x, poi.y, poi.revealed, flags)
+            if state != self._poi_state[poi.id]:
+                events.append(EVENTS[EVENT_POI].pack(EVENT_POI, poi.id, *state))
+                self._poi_state[poi.id] = state
+                changed_pois.append(poi.id)
+        if changed_pois:
+            events.extend(self._list_order_events(model, changed_pois))
+
+        if model.current_agent_index != self._agent_index:
+            self._agent_index = model.current_agent_index
+            events.append(EVENTS[EVENT_AGENT_INDEX].pack(EVENT_AGENT_INDEX, self._agent_index))
+        if model.round_count != self._round:
+            self._round = model.round_count
+            events.append(EVENTS[EVENT_ROUND].pack(EVENT_ROUND, self._round))
+        if model.damage_count != self._damage:
+            self._damage = model.damage_count
+            events.append(EVENTS[EVENT_DAMAGE].pack(EVENT_DAMAGE, self._damage))
+        if model.game_over and not self._game_over:
+            self._game_over = True
+            reason = model.end_reason.encode("utf-8")
+            events.append(EVENTS[EVENT_END].pack(EVENT_END, len(reason)) + reason)
+
+        self.stream.write(STEP.pack(RECORD_STEP, _step_flags(model), len(events)))
+        self.stream.write(b"".join(events))
+        self.end_offset = self.stream.tell()
+        self.last_step = model.step_count
+
+        if model.step_count - self.last_keyframe_step >= self.keyframe_interval:
+            self.write_keyframe(model)
+
+    def _list_order_events(self, model, changed_pois):
+        # Los eventos POI agregan a las listas en orden de id; si el orden real
+        # del modelo es otro, se escribe la lista completa.
+        events = []
+        for index, (name, _) in enumerate(POI_LIST_FLAGS):
+            current = [poi.id for poi in getattr(model, name)]
+            previous = self._poi_lists[index]
+            if current == previous:
+                continue
+            current_set = set(current)
+            previous_set = set(previous)
+            predicted = [poi_id for poi_id in previous if poi_id in current_set]
+            predicted += [
+                poi_id
+                for poi_id in changed_pois
+                if poi_id in current_set and poi_id not in previous_set
+            ]
+            if predicted != current:
+                events.append(
+                    EVENTS[EVENT_LIST].pack(EVENT_LIST, index, len(current))
+                    + struct.pack(f"<{len(current)}H", *current)
+                )
+            self._poi_lists[index] = current
+        return events
+
+    def getvalue(self):
+        return self.stream.getvalue()
+
+    @property
+    def first_step(self):
+        return self.keyframes[0][0] if self.keyframes else 0
+
+    def model_at(self, step):
+        """Reconstruir el paso `step` desde el keyframe anterior más cercano.
+
+        Solo lee el tramo del diario entre ese keyframe y el siguiente, así que el
+        coste es O(keyframe_interval) sea cual sea la longitud de la partida.
+        """
+        keyframes = self.keyframes
+        last_step, end_offset = self.last_step, self.end_offset
+        if not keyframes or not keyframes[0][0] <= step <= last_step:
+            raise ValueError(f"Step {step} outside journal range {self.first_step}..{last_step}")
+        index = bisect.bisect_right([keyframe_step for keyframe_step, _ in keyframes], step) - 1
+        start = keyframes[index][1]
+        end = keyframes[index + 1][1] if index + 1 < len(keyframes) else end_offset
+        if hasattr(self.stream, "read_at"):
+            segment = self.stream.read_at(start, end)
+        else:
+            segment = self.stream.getvalue()[start:end]
+        return _model_from_keyframe(memoryview(segment), 0, step)
+
+
+def _read_events(data, offset, count):
+    events = []
+    for _ in range(count):
+        tag = data[offset]
+        layout = EVENTS[tag]
+        values = layout.unpack_from(data, offset)
+        offset += layout.size
+        if tag == EVENT_END:
+            length = values[1]
+            reason = bytes(data[offset:offset + length]).decode("utf-8")
+            offset += length
+            values = (tag, reason)
+        elif tag == EVENT_LIST:
+            index, length = values[1], values[2]
+            poi_ids = struct.unpack_from(f"<{length}H", data, offset)
+            offset += 2 * length
+            values = (tag, index, poi_ids)
+        events.append((EVENT_NAMES[tag],) + tuple(values[1:]))
+    return events, offset
+
+
+class JournalReplayer:
+    """Reconstruye cualquier paso de un diario a partir del keyframe mas cercano."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        magic, self.seed, self.height, self.width, self.keyframe_interval = HEADER.unpack_from(
+            self.data, 0
+        )
+        if magic != MAGIC:
+            raise ValueError("Not a game journal")
+
+        self.keyframes = []  # (step_count, offset del registro)
+        self.last_step = 0
+        offset = HEADER.size
+        while offset < len(self.data):
+            tag = self.data[offset]
+            if tag == RECORD_KEYFRAME:
+                _, step_count, length = KEYFRAME.unpack_from(self.data, offset)
+                self.keyframes.append((step_count, offset))
+                self.last_step = step_count
+                offset += KEYFRAME.size + length
+            elif tag == RECORD_STEP:
+                _, _, count = STEP.unpack_from(self.data, offset)
+                _, offset = _read_events(self.data, offset + STEP.size, count)
+                self.last_step += 1
+            else:
+                raise ValueError(f"Corrupt journal record at offset {offset}")
+        self._keyframe_steps = [step for step, _ in self.keyframes]
+
+    def iter_steps(self, offset=HEADER.size, step_count=0):
+        """Generar (step_count, flags, eventos) para cada paso desde un offset."""
+        return _iter_steps(self.data, offset, step_count)
+
+    def model_at(self, step):
+        """Devolver un FireRescueModel con el estado del juego tras `step` pasos."""
+        first_step = self.keyframes[0][0]
+        if not first_step <= step <= self.last_step:
+            raise ValueError(f"Step {step} outside journal range {first_step}..{self.last_step}")
+        index = bisect.bisect_right(self._keyframe_steps, step) - 1
+        return _model_from_keyframe(self.data, self.keyframes[index][1], step)
+
+
+def _iter_steps(data, offset, step_count):
+    while offset < len(data):
+        tag = data[offset]
+        if tag == RECORD_KEYFRAME:
+            _, step_count, length = KEYFRAME.unpack_from(data, offset)
+            offset += KEYFRAME.size + length
+            continue
+        _, flags, count = STEP.unpack_from(data, offset)
+        events, offset = _read_events(data, offset + STEP.size, count)
+        step_count += 1
+        yield step_count, flags, events
+
+
+def _model_from_keyframe(data, offset, step):
+    """Restaurar el keyframe que empieza en `offset` y aplicar pasos hasta `step`."""
+    _, keyframe_step, length = KEYFRAME.unpack_from(data, offset)
+    start = offset + KEYFRAME.size
+    model = restore_snapshot(decode_snapshot(bytes(data[start:start + length])))
+    if keyframe_step == step:
+        return model
+
+    agents = {agent.unique_id: agent for agent in model.agent_list}
+    pois = {poi.id: poi for poi in collect_pois(model)}
+    poi_flags = _poi_flags(model)
+    for step_count, flags, events in _iter_steps(data, start + length, keyframe_step):
+        apply_step(model, flags, events, agents, pois, poi_flags)
+        if step_count >= step:
+            break
+    return model
+
+
+def apply_step(model, flags, events, agents, pois, poi_flags):
+    """Aplicar los eventos de un paso sobre un modelo restaurado."""
+    for event in events:
+        kind = event[0]
+        if kind == "fire":
+            _, x, y, code = event
+            model._set_fire_state(x, y, FIRE_STATES_BY_CODE[code])
+        elif kind == "wall":
+            _, x, y, direction, wall_type = event
+            model._set_wall(x, y, direction, wall_type)
+        elif kind == "move":
+            _, agent_id, x, y = event
+            model._move_agent(agents[agent_id], (x, y))
+        elif kind == "agent":
+            _, agent_id, ap, knockout, max_knockout, role, carrying, target = event
+            agent = agents[agent_id]
+            agent.action_points = ap
+            agent.knockout_timer = knockout
+            agent.max_knockout_time = max_knockout
+            agent.role = ROLES_BY_CODE[role]
+            agent.carrying_victim = pois.get(carrying)
+            agent.target_poi = pois.get(target)
+        elif kind == "poi":
+            _, poi_id, x, y, revealed, new_flags = event
+            poi = pois[poi_id]
+            poi.x, poi.y, poi.revealed = x, y, bool(revealed)
+            old_flags = poi_flags.get(poi_id, 0)
+            for name, bit in POI_LIST_FLAGS:
+                if new_flags & bit and not old_flags & bit:
+                    getattr(model, name).append(poi)
+                elif old_flags & bit and not new_flags & bit:
+                    getattr(model, name).remove(poi)
+            poi_flags[poi_id] = new_flags
+        elif kind == "agent_index":
+            model.current_agent_index = event[1]
+        elif kind == "round":
+            model.round_count = event[1]
+        elif kind == "damage":
+            model.damage_count = event[1]
+        elif kind == "end":
+            model.end_reason = event[1]
+        elif kind == "list":
+            _, index, poi_ids = event
+            setattr(model, POI_LIST_FLAGS[index][0], [pois[poi_id] for poi_id in poi_ids])
+
+    model.step_count += 1
+    model.phase = "FIRE_SPREAD" if flags & FLAG_FIRE_SPREAD else "AGENT_TURN"
+    model.game_over = bool(flags & FLAG_GAME_OVER)
+    model.game_won = bool(flags & FLAG_GAME_WON)
+    model.game_lost = bool(flags & FLAG_GAME_LOST)
+    model.running = bool(flags & FLAG_RUNNING)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Replay a game journal")
+    parser.add_argument("journal")
+    parser.add_argument("--step", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.journal, "rb") as journal_file:
+        replayer = JournalReplayer(journal_file.read())
+    step = replayer.last_step if args.step is None else args.step
+    replayed = replayer.model_at(step)
+    print(json.dumps(capture_snapshot(replayed, include_rng=False), indent=2))
@@ -0,0 +1,36 @@
+"""
+Tunable rule parameters of a Fire Rescue game.
+
+The defaults are the stock rules. A ``GameRules`` instance is passed to
+``FireRescueModel(..., rules=...)`` and is stored in snapshots, so journals and
+checkpoints replay with the rules they were played with.
+"""
+
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass(frozen=True)
+class GameRules:
+    max_knockout_time: int = 2  # turnos que un agente queda noqueado
+    max_rescuers: int = 3  # tope de rescatistas en assign_roles
+    victims_to_win: int = 7
+    max_victims_lost: int = 4
+    max_damage: int = 24  # se pierde al superar este daño estructural
+    victim_pois: int = 10  # tamaño del mazo de POIs
+    false_alarm_pois: int = 5
+    initial_pois: int = 3
+    firefighters: int = 6
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        names = {field.name for field in fields(cls)}
+        unknown = set(data) - names
+        if unknown:
+            raise ValueError(f"Unknown game rules: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+DEFAULT_RULES = GameRules()
@@ -0,0 +1,184 @@
+"""
+Compact snapshots of a FireRescueModel.
+
+A snapshot is a plain dict (board as digit strings, agents and POIs as small
+records) that can be encoded to zlib-compressed JSON bytes and restored into a
+fully working model.
+"""
+
+import json
+import zlib
+
+import numpy as np
+
+from models.fireAgent import FireAgent
+from models.fireRescueModel import DEFAULT_EXITS, FireRescueModel
+from models.fireState import FIRE_STATES_BY_CODE
+from models.gameRules import GameRules
+from models.firefighterRole import ROLE_CODES, ROLES_BY_CODE
+from models.poi import POI_TYPES_BY_CODE
+from models.poiTable import POI_LISTS
+from models.policies import DEFAULT_POLICY, policy_name
+
+SNAPSHOT_VERSION = 1
+
+
+def _digits(array):
+    return (np.asarray(array, dtype=np.uint8).ravel() + ord("0")).tobytes().decode("ascii")
+
+
+def _from_digits(text, shape):
+    values = np.frombuffer(text.encode("ascii"), dtype=np.uint8) - ord("0")
+    return values.reshape(shape)
+
+
+def collect_pois(model):
+    """Todos los POIs del modelo, ordenados por id."""
+    return sorted(model.poi_table, key=lambda poi: poi.id)
+
+
+def _poi_rows(table):
+    # Directamente de las columnas: [id, tipo, x, y, revelado] ordenado por id
+    size = table.size
+    order = np.argsort(table.ids[:size], kind="stable")
+    columns = zip(
+        table.ids[:size][order].tolist(),
+        table.types[:size][order].tolist(),
+        table.xs[:size][order].tolist(),
+        table.ys[:size][order].tolist(),
+        table.revealed[:size][order].tolist(),
+    )
+    return [list(row) for row in columns]
+
+
+def capture_snapshot(model, include_rng=True):
+    """Capturar el estado completo del modelo como un dict serializable."""
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "seed": model.seed,
+        "height": model.height,
+        "width": model.width,
+        "exits": [list(pos) for pos in model.exits],
+        "rules": model.rules.to_dict(),
+        "grid_data": _digits(model.grid_data),
+        "fire_states": _digits(model.fire_state_codes()),
+        "state_version": model.version,
+        "step_count": model.step_count,
+        "round_count": model.round_count,
+        "phase": model.phase,
+        "current_agent_index": model.current_agent_index,
+        "damage_count": model.damage_count,
+        "running": model.running,
+        "game_over": model.game_over,
+        "game_won": model.game_won,
+        "game_lost": model.game_lost,
+        "end_reason": model.end_reason,
+        "pois": _poi_rows(model.poi_table),
+        "poi_lists": {
+            name: [poi.id for poi in getattr(model, name)] for name in POI_LISTS
+        },
+        "agents": [
+            {
+                "id": agent.unique_id,
+                "pos": list(agent.pos) if agent.pos else None,
+                "action_points": agent.action_points,
+                "role": ROLE_CODES[agent.role],
+                "target_poi": agent.target_poi.id if agent.target_poi else None,
+                "carrying_victim": agent.carrying_victim.id if agent.carrying_victim else None,
+                "knockout_timer": agent.knockout_timer,
+                "max_knockout_time": agent.max_knockout_time,
+                "path": [list(pos) for pos in agent.path],
+            }
+            for agent in model.agent_list
+        ],
+    }
+    # Solo fuera de la configuración de serie, para no cambiar los snapshots habituales
+    if type(model.policy) is not type(DEFAULT_POLICY):
+        snapshot["policy"] = policy_name(model.policy)
+    split_streams = model.fire_random is not model.random
+    if split_streams:
+        snapshot["split_streams"] = True
+    if include_rng:
+        snapshot["rng_state"] = _rng_state(model.random)
+        if split_streams:
+            snapshot["rng_streams"] = {"fire": _rng_state(model.fire_random),
+                                       "poi": _rng_state(model.poi_random)}
+    return snapshot
+
+
+def _rng_state(rng):
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def _set_rng_state(rng, state):
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
+
+
+def restore_snapshot(snapshot):
+    """Reconstruir un FireRescueModel a partir de un snapshot."""
+    height, width = snapshot["height"], snapshot["width"]
+    grid_data = _from_digits(snapshot["grid_data"], (height, width, 4)).astype(int)
+    model = FireRescueModel(grid_data, seed=snapshot["seed"], populate=False,
+                            exits=snapshot.get("exits", DEFAULT_EXITS),
+                            rules=GameRules.from_dict(snapshot.get("rules", {})),
+                            policy=snapshot.get("policy"),
+                            split_streams=snapshot.get("split_streams", False))
+
+    fire_codes = _from_digits(snapshot["fire_states"], (height, width))
+    for code, state in FIRE_STATES_BY_CODE.items():
+        model.fire_states[fire_codes == code] = state
+    model.rebuild_fire_index()
+
+    model.version = snapshot.get("state_version", 0)
+    for name in (
+        "step_count",
+        "round_count",
+        "phase",
+        "current_agent_index",
+        "damage_count",
+        "running",
+        "game_over",
+        "game_won",
+        "game_lost",
+        "end_reason",
+    ):
+        setattr(model, name, snapshot[name])
+
+    pois = {}
+    for poi_id, type_code, x, y, revealed in snapshot["pois"]:
+        pois[poi_id] = model.poi_table.add(poi_id, POI_TYPES_BY_CODE[type_code], x, y, revealed)
+    for name, poi_ids in snapshot["poi_lists"].items():
+        setattr(model, name, [pois[poi_id] for poi_id in poi_ids])
+
+    for data in snapshot["agents"]:
+        agent = FireAgent(data["id"], model)
+        agent.action_points = data["action_points"]
+        agent.role = ROLES_BY_CODE[data["role"]]
+        agent.target_poi = pois.get(data["target_poi"])
+        agent.carrying_victim = pois.get(data["carrying_victim"])
+        agent.knockout_timer = data["knockout_timer"]
+        agent.max_knockout_time = data["max_knockout_time"]
+        agent.path = [tuple(pos) for pos in data["path"]]
+        if data["pos"] is not None:
+            model.grid.place_agent(agent, tuple(data["pos"]))
+        model.agent_list.append(agent)
+
+    if "rng_state" in snapshot:
+        _set_rng_state(model.random, snapshot["rng_state"])
+    for name, state in snapshot.get("rng_streams", {}).items():
+        _set_rng_state(getattr(model, f"{name}_random"), state)
+
+    return model
+
+
+def encode_snapshot(snapshot):
+    return zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_snapshot(data):
+    snapshot = json.loads(zlib.decompress(data).decode("utf-8"))
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')}")
+    return snapshot
@@ -4,10 +4,41 @@ class POIType(Enum):
     FALSE = "false"
     VICTIM = "victim"
 
+POI_TYPE_CODES = {POIType.FALSE: 0, POIType.VICTIM: 1}
+POI_TYPES_BY_CODE = {code: poi_type for poi_type, code in POI_TYPE_CODES.items()}
+
+# Campos de la vista que se escriben también en una columna de la tabla
+_COLUMNS = {"x": "xs", "y": "ys", "revealed": "revealed"}
+
 class POI:
-    def __init__(self, poi_id, poi_type: POIType, x, y):
-        self.id = poi_id
-        self.type = poi_type
-        self.x = x
-        self.y = y
-        self.revealed = False
+    """Vista de una fila de POITable; los datos viven en las columnas de la tabla.
+
+    Hay una sola vista por fila, así que la identidad de objeto sigue sirviendo
+    para `in`, `remove` y conjuntos. La vista guarda además una copia de cada
+    campo como atributo de Python: las lecturas (en assign_roles, en cada
+    iteración de las listas, al serializar) son accesos normales, y escribir
+    x, y o revealed actualiza también la columna.
+    """
+
+    __slots__ = ("_table", "_row", "id", "type", "x", "y", "revealed", "_status")
+
+    def __init__(self, table, row, poi_id, poi_type, x, y, revealed):
+        set_field = object.__setattr__  # sin copiar a las columnas: la tabla ya las escribió
+        set_field(self, "_table", table)
+        set_field(self, "_row", row)
+        set_field(self, "id", poi_id)
+        set_field(self, "type", poi_type)
+        set_field(self, "x", x)
+        set_field(self, "y", y)
+        set_field(self, "revealed", revealed)
+        set_field(self, "_status", 0)  # bits de pertenencia a las listas (copia de table.status)
+
+    def __setattr__(self, name, value):
+        column = _COLUMNS.get(name)
+        if column is not None:
+            getattr(self._table, column)[self._row] = value
+            value = bool(value) if name == "revealed" else int(value)
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"POI(id={self.id}, type={self.type.value}, pos=({self.x}, {self.y}), revealed={self.revealed})"
@@ -0,0 +1,176 @@
+"""
+Struct-of-arrays storage for the POIs of one model.
+
+Every POI is a row of NumPy columns (id, type, x, y, revealed, status). List
+membership (deck, active, revealed, lost, rescued, destroyed) is a bit in
+``status``; the order inside each list is an insertion stamp per list. The
+model exposes each list as a ``POIList`` view with the list operations the
+game uses: iteration, ``len``, indexing, ``in``, ``append`` and ``remove``.
+``in`` and ``remove`` check a status bit instead of scanning a list.
+
+The columns serve the whole-table operations (snapshots, journal flags, list
+rebuilds). Each ``POI`` view also keeps its fields and status bits as Python
+scalars, kept in step on every write, because reading single NumPy elements
+on the per-POI hot paths costs more than the Python objects save.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from models.poi import POI, POI_TYPE_CODES
+
+# Listas del modelo; el bit de cada una es 1 << índice (igual que en el diario)
+POI_LISTS = (
+    "all_pois",
+    "active_pois",
+    "revealed_pois",
+    "lost_victims",
+    "rescued_victims",
+    "pois_lost",
+)
+
+
+class POITable:
+    def __init__(self, capacity=16):
+        self.size = 0
+        self.rows = []
+        self._by_id = {}
+        self._clock = 0
+        self._counts = [0] * len(POI_LISTS)
+        self._members = [None] * len(POI_LISTS)  # listas ordenadas, calculadas bajo demanda
+        self._allocate(capacity)
+        self.lists = {name: POIList(self, index) for index, name in enumerate(POI_LISTS)}
+
+    def _allocate(self, capacity):
+        def grow(old, dtype, shape=()):
+            column = np.zeros((capacity,) + shape, dtype=dtype)
+            if old is not None:
+                column[:self.size] = old[:self.size]
+            return column
+
+        self.ids = grow(getattr(self, "ids", None), np.uint16)
+        self.types = grow(getattr(self, "types", None), np.uint8)
+        self.xs = grow(getattr(self, "xs", None), np.int16)
+        self.ys = grow(getattr(self, "ys", None), np.int16)
+        self.revealed = grow(getattr(self, "revealed", None), np.bool_)
+        self.status = grow(getattr(self, "status", None), np.uint8)
+        self.stamps = grow(getattr(self, "stamps", None), np.uint32, (len(POI_LISTS),))
+
+    def add(self, poi_id, poi_type, x, y, revealed=False):
+        """Añadir un POI (sin lista) y devolver su vista."""
+        if self.size == len(self.ids):
+            self._allocate(len(self.ids) * 2)
+        row = self.size
+        self.ids[row] = poi_id
+        self.types[row] = POI_TYPE_CODES[poi_type]
+        self.xs[row] = x
+        self.ys[row] = y
+        self.revealed[row] = revealed
+        self.size += 1
+        poi = POI(self, row, int(poi_id), poi_type, int(x), int(y), bool(revealed))
+        self.rows.append(poi)
+        self._by_id[poi_id] = poi
+        return poi
+
+    def get(self, poi_id):
+        return self._by_id.get(poi_id)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def flags(self):
+        """{id: bits de pertenencia} de todos los POIs."""
+        return dict(zip(self.ids[:self.size].tolist(), self.status[:self.size].tolist()))
+
+    def contains(self, index, poi):
+        return poi is not None and poi._table is self and bool(poi._status & (1 << index))
+
+    def append(self, index, poi):
+        # Las listas no admiten duplicados: un POI ya presente no se vuelve a añadir
+        if self.contains(index, poi):
+            return
+        self._clock += 1
+        poi._status |= 1 << index
+        self.status[poi._row] = poi._status
+        self.stamps[poi._row, index] = self._clock
+        self._counts[index] += 1
+        if self._members[index] is not None:
+            self._members[index].append(poi)
+
+    def remove(self, index, poi):
+        if not self.contains(index, poi):
+            raise ValueError(f"{poi!r} not in {POI_LISTS[index]}")
+        poi._status &= ~(1 << index)
+        self.status[poi._row] = poi._status
+        self._counts[index] -= 1
+        if self._members[index] is not None:
+            self._members[index].remove(poi)
+
+    def assign(self, index, pois):
+        mask = ~np.uint8(1 << index)
+        self.status[:self.size] &= mask
+        for poi in self.rows:
+            poi._status &= ~(1 << index)
+        self._counts[index] = 0
+        self._members[index] = None
+        for poi in pois:
+            self.append(index, poi)
+
+    def members(self, index):
+        if self._members[index] is None:
+            rows = np.flatnonzero(self.status[:self.size] & (1 << index))
+            rows = rows[np.argsort(self.stamps[rows, index], kind="stable")]
+            self._members[index] = [self.rows[row] for row in rows.tolist()]
+        return self._members[index]
+
+    def count(self, index):
+        return self._counts[index]
+
+
+class POIList(Sequence):
+    """Vista viva de una de las listas de POIs del modelo."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __len__(self):
+        return self._table.count(self._index)
+
+    def __getitem__(self, item):
+        members = self._table.members(self._index)
+        return members[item] if isinstance(item, int) else list(members[item])
+
+    def __iter__(self):
+        return iter(self._table.members(self._index))
+
+    def __contains__(self, poi):
+        return self._table.contains(self._index, poi)
+
+    def append(self, poi):
+        self._table.append(self._index, poi)
+
+    def remove(self, poi):
+        self._table.remove(self._index, poi)
+
+    def __repr__(self):
+        return f"POIList({POI_LISTS[self._index]}, {list(self)!r})"
+
+
+def poi_list_property(name):
+    """Propiedad del modelo que expone la lista `name` de su POITable."""
+    index = POI_LISTS.index(name)
+
+    def getter(model):
+        return model.poi_table.lists[name]
+
+    def setter(model, pois):
+        model.poi_table.assign(index, list(pois))
+
+    return property(getter, setter)
@@ -0,0 +1,151 @@
+"""
+Firefighter policies: how roles are assigned and how each agent plays its turn.
+
+A policy is passed to ``FireRescueModel(..., policy=...)`` as an instance or a
+name, and the model calls it from ``assign_roles`` and ``agent_turn``:
+
+    greedy    the stock behaviour: POIs go to the nearest free agents
+              (Manhattan distance), up to ``max_rescuers``
+    routed    like greedy, but distances are routed path lengths, so POIs
+              behind walls or fire go to the agent that can actually reach
+              them first
+    guard     greedy roles; extinguishers attack the fire or smoke closest to
+              an unrevealed POI instead of the one closest to themselves
+
+Other policies subclass ``Policy`` and override ``assignment_cost`` and/or
+``act``. They can be used without registering them by naming them as
+``module:ClassName`` (``resolve_policy`` imports the module), which also works
+in batch worker processes and snapshots.
+"""
+
+import importlib
+
+from models.firefighterRole import FireFighterRole
+
+INF = float("inf")
+
+
+class Policy:
+    """Política greedy de serie; las subclases cambian solo lo que necesitan."""
+
+    name = "greedy"
+
+    def assignment_cost(self, model, agent, poi):
+        """Coste de mandar `agent` a `poi` (INF = no se puede asignar)."""
+        return abs(poi.x - agent.pos[0]) + abs(poi.y - agent.pos[1])
+
+    def assign_roles(self, model):
+        for agent in model.agent_list:
+            agent.role = None
+            agent.target_poi = None
+
+        carrying_agents = [agent for agent in model.agent_list if agent.carrying_victim]
+        for agent in carrying_agents:
+            agent.role = FireFighterRole.RESCUER
+
+        available_pois = [poi for poi in model.active_pois if not poi.revealed]
+        available_agents = [agent for agent in model.agent_list if not agent.carrying_victim]
+
+        potential_assignments = []
+        for poi in available_pois:
+            for agent in available_agents:
+                cost = self.assignment_cost(model, agent, poi)
+                if cost != INF:
+                    potential_assignments.append((cost, agent, poi))
+
+        # sort estable: los empates se quedan en orden POI -> agente
+        potential_assignments.sort(key=lambda x: x[0])
+        assigned_rescuers = set(carrying_agents)
+        poi_assignments = set()
+        max_rescuers = model.rules.max_rescuers
+
+        for cost, agent, poi in potential_assignments:
+            if len(assigned_rescuers) >= max_rescuers:
+                break
+
+            if agent not in assigned_rescuers and poi not in poi_assignments:
+                agent.role = FireFighterRole.RESCUER
+                agent.target_poi = poi
+                assigned_rescuers.add(agent)
+                poi_assignments.add(poi)
+
+        for agent in model.agent_list:
+            if agent.role is None and not agent.is_knocked_out():
+                agent.role = FireFighterRole.EXTINGUISHER
+                agent.target_poi = None
+
+    def act(self, agent):
+        """Jugar los puntos de acción de un agente no noqueado según su rol."""
+        if agent.role == FireFighterRole.RESCUER:
+            agent.rescuer_behavior()
+        elif agent.role == FireFighterRole.EXTINGUISHER:
+            agent.extinguisher_behavior()
+
+
+class RoutedPolicy(Policy):
+    """Asignación por longitud del camino del router en lugar de Manhattan."""
+
+    name = "routed"
+
+    def assignment_cost(self, model, agent, poi):
+        path = model.router.find_path(agent.pos, (poi.x, poi.y))
+        return len(path) - 1 if path else INF
+
+
+class GuardPolicy(Policy):
+    """Los extintores atacan el fuego más cercano a un POI sin revelar."""
+
+    name = "guard"
+
+    def act(self, agent):
+        if agent.role == FireFighterRole.EXTINGUISHER:
+            agent.extinguisher_behavior(lambda: guard_target(agent))
+        else:
+            super().act(agent)
+
+
+def guard_target(agent):
+    """Celda con fuego o humo más cercana a un POI sin revelar (desempate: al agente)."""
+    model = agent.model
+    pois = [(poi.x, poi.y) for poi in model.active_pois if not poi.revealed]
+    if not pois:
+        return agent.find_nearest_fire()
+
+    px, py = agent.pos
+    best_key = None
+    for cells in (model.fire_cells, model.smoke_cells):
+        for x, y in cells:
+            danger = min(abs(x - poi_x) + abs(y - poi_y) for poi_x, poi_y in pois)
+            key = (danger, abs(x - px) + abs(y - py), y, x)
+            if best_key is None or key < best_key:
+                best_key = key
+
+    if best_key is None:
+        return None
+    return best_key[3], best_key[2]
+
+
+POLICIES = {policy.name: policy for policy in (Policy, RoutedPolicy, GuardPolicy)}
+DEFAULT_POLICY = Policy()
+
+
+def resolve_policy(policy=None):
+    """Instancia de política a partir de None, un nombre, 'modulo:Clase' o una instancia."""
+    if policy is None:
+        return DEFAULT_POLICY
+    if isinstance(policy, Policy):
+        return policy
+    if policy in POLICIES:
+        return POLICIES[policy]()
+    module_name, _, attribute = policy.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown policy: {policy} (expected one of {', '.join(POLICIES)} or module:Class)")
+    policy_class = getattr(importlib.import_module(module_name), attribute)
+    return policy_class()
+
+
+def policy_name(policy):
+    """Nombre con el que `resolve_policy` vuelve a construir la política."""
+    if POLICIES.get(policy.name) is type(policy):
+        return policy.name
+    return f"{type(policy).__module__}:{type(policy).__qualname__}"
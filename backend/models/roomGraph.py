@@ -0,0 +1,177 @@
+"""
+Room-level abstraction of the board for hierarchical pathfinding.
+
+A room is a connected region of cells joined by open sides (no wall and no
+door on either side). Sides between different rooms are portals: doors, and
+walls when the router may chop through them. ``RoomGraph.corridor`` plans at
+the room level (A* over rooms, entering each room through the cheapest usable
+portal) and returns the rooms on the route;
+``RoutingEngine.find_path`` then refines the path with A* restricted to those
+rooms.
+
+Walls only ever open during a game, so the graph is updated incrementally:
+when ``damage_wall`` removes the last wall or door between two rooms they are
+merged (the smaller room is relabelled into the larger one) and their portals
+are combined. Door and wall damage that leaves a side closed only changes
+portal costs, which are read from the router when planning. Any other wall
+change (for example restoring a snapshot) triggers a full rebuild.
+"""
+
+import heapq
+
+from models.routingEngine import INF, NEIGHBOR_OFFSETS
+
+# Tableros a partir de este número de celdas planifican por salas; en los
+# pequeños (el estándar tiene 48) A* sobre la rejilla completa ya es barato
+HIERARCHICAL_MIN_CELLS = 256
+
+
+class RoomGraph:
+    def __init__(self, engine):
+        self.engine = engine
+        self.model = engine.model
+        self.width = engine.width
+        self.height = engine.height
+        self._wall_version = None
+        self.labels = []  # celda -> id de sala
+        self.members = {}  # sala -> celdas
+        self.portals = {}  # sala -> {sala vecina: aristas CSR que salen de la sala hacia ella}
+
+    def _open(self, cell, direction, grid):
+        """True si el lado no tiene muro ni puerta en ninguna de las dos celdas."""
+        x, y = cell % self.width, cell // self.width
+        dx, dy = NEIGHBOR_OFFSETS[direction]
+        return grid[y, x, direction] == 0 and grid[y + dy, x + dx, (direction + 2) % 4] == 0
+
+    def rebuild(self):
+        grid = self.model.grid_data
+        indptr, indices, directions = self.engine.indptr, self.engine.indices, self.engine._edge_dir
+        cells = self.width * self.height
+        labels = [-1] * cells
+        self.members, self.portals = {}, {}
+
+        for seed in range(cells):
+            if labels[seed] != -1:
+                continue
+            labels[seed] = seed
+            room = [seed]
+            for cell in room:  # BFS: la lista crece mientras se recorre
+                for edge in range(indptr[cell], indptr[cell + 1]):
+                    neighbor = indices[edge]
+                    if labels[neighbor] == -1 and self._open(cell, directions[edge], grid):
+                        labels[neighbor] = seed
+                        room.append(neighbor)
+            self.members[seed] = room
+            self.portals[seed] = {}
+
+        for cell in range(cells):
+            room = labels[cell]
+            for edge in range(indptr[cell], indptr[cell + 1]):
+                other = labels[indices[edge]]
+                if other != room:
+                    self.portals[room].setdefault(other, []).append(edge)
+
+        self.labels = labels
+        self._wall_version = self.model.wall_version
+
+    def wall_changed(self, x, y, direction, wall_type):
+        """Actualizar la abstracción tras model._set_wall (llamado con wall_version ya incrementado)."""
+        if self._wall_version is None:
+            return
+        if self._wall_version != self.model.wall_version - 1:
+            # Cambios de muros que no pasaron por aquí: reconstruir al planificar
+            self._wall_version = None
+            return
+        self._wall_version = self.model.wall_version
+
+        dx, dy = NEIGHBOR_OFFSETS[direction]
+        nx, ny = x + dx, y + dy
+        if wall_type != 0 or not (0 <= nx < self.width and 0 <= ny < self.height):
+            return
+        if self.model.grid_data[ny, nx, (direction + 2) % 4] != 0:
+            return
+        first, second = self.labels[y * self.width + x], self.labels[ny * self.width + nx]
+        if first != second:
+            self._merge(first, second)
+
+    def _merge(self, first, second):
+        # La sala pequeña se fusiona en la grande
+        if len(self.members[first]) < len(self.members[second]):
+            first, second = second, first
+        for cell in self.members[second]:
+            self.labels[cell] = first
+        self.members[first].extend(self.members.pop(second))
+
+        portals = self.portals[first]
+        portals.pop(second, None)
+        for neighbor, edges in self.portals.pop(second).items():
+            if neighbor == first:
+                continue
+            portals.setdefault(neighbor, []).extend(edges)
+            reverse = self.portals[neighbor]
+            reverse.setdefault(first, []).extend(reverse.pop(second))
+
+    def corridor(self, source, target):
+        """Salas de la ruta de menor coste entre dos celdas, o None si no hay ruta.
+
+        A* sobre salas: cada sala se alcanza por la celda de entrada del portal
+        usado, y el coste de un salto es el del portal más la distancia Manhattan
+        desde la celda de entrada anterior hasta él.
+        """
+        if self._wall_version != self.model.wall_version:
+            self.rebuild()
+        engine = self.engine
+        labels = self.labels
+        start_room, goal_room = labels[source], labels[target]
+        if start_room == goal_room:
+            return {start_room}
+
+        edge_costs, penalties, indices = engine.edge_costs, engine.penalties, engine.indices
+        width = self.width
+        gx, gy = target % width, target // width
+        scale = engine.min_edge_cost
+
+        distances = {start_room: 0}
+        entries = {start_room: source}  # celda por la que se entra en cada sala
+        came_from = {}
+        open_set = [(0, 0, start_room)]
+        closed = set()
+        while open_set:
+            _, distance, room = heapq.heappop(open_set)
+            if room in closed:
+                continue
+            if room == goal_room:
+                rooms = {room}
+                while room != start_room:
+                    room = came_from[room]
+                    rooms.add(room)
+                return rooms
+            closed.add(room)
+            entry = entries[room]
+            ex, ey = entry % width, entry // width
+
+            for neighbor, edges in self.portals[room].items():
+                if neighbor in closed:
+                    continue
+                best, best_cell = INF, None
+                for edge in edges:
+                    cost = edge_costs[edge]
+                    if cost == INF:
+                        continue
+                    cell = indices[edge]
+                    x, y = cell % width, cell // width
+                    # Manhattan hasta la celda de entrada (cota inferior del camino dentro de la sala)
+                    total = cost + penalties.get(cell, 0) + (abs(x - ex) + abs(y - ey) - 1) * scale
+                    if total < best:
+                        best, best_cell = total, cell
+                if best_cell is None:
+                    continue
+                tentative = distance + best
+                if tentative < distances.get(neighbor, INF):
+                    distances[neighbor] = tentative
+                    entries[neighbor] = best_cell
+                    came_from[neighbor] = room
+                    x, y = best_cell % width, best_cell // width
+                    estimate = tentative + (abs(x - gx) + abs(y - gy)) * scale
+                    heapq.heappush(open_set, (estimate, tentative, neighbor))
+        return None
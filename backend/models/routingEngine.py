@@ -0,0 +1,243 @@
+"""
+Shared weighted-graph router for the board.
+
+The board is stored once as a CSR adjacency (``indptr`` / ``indices`` with the
+wall direction of every edge). Edge costs come from pluggable cost layers:
+
+    WallCostLayer     open edges, doors and (opt-in) chopping through walls
+    HazardCostLayer   extra cost for entering smoke or fire cells
+
+Edge costs are built once and then updated one side at a time by
+``wall_changed`` (any wall change the engine did not see, detected through
+``model.wall_version``, rebuilds them); cell penalties are rebuilt only when
+the model state changes (``model.version``). Paths are found with A* and a
+Manhattan heuristic scaled by the cheapest edge, which is admissible because
+every layer only adds non-negative costs.
+
+On large boards the model attaches a ``RoomGraph`` (see ``roomGraph.py``): the
+route is first planned over rooms and A* then only expands cells of the rooms
+on that route.
+"""
+
+import heapq
+
+import numpy as np
+
+INF = float("inf")
+
+# Vecinos en el orden de las direcciones de muro: arriba, derecha, abajo, izquierda
+NEIGHBOR_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+
+class CostLayer:
+    """Capa de costes: costes por arista (muros) y/o penalizaciones por celda."""
+
+    def edge_costs(self, walls):
+        return None
+
+    def cell_penalties(self, model, engine):
+        return None
+
+
+class WallCostLayer(CostLayer):
+    """Coste de cruzar cada lado: libre/puerta abierta, puerta cerrada, muro."""
+
+    def __init__(self, open_cost=1, door_cost=2, chop_costs=None):
+        # chop_costs: {1: coste muro 1hp, 2: coste muro 2hp}; None = muros infranqueables
+        self.open_cost = open_cost
+        self.door_cost = door_cost
+        self.chop_costs = chop_costs
+
+    def edge_costs(self, walls):
+        table = np.full(5, INF)
+        table[[0, 3]] = self.open_cost
+        table[4] = self.door_cost
+        if self.chop_costs:
+            for wall_type, cost in self.chop_costs.items():
+                table[wall_type] = cost
+        return table[walls]
+
+
+class HazardCostLayer(CostLayer):
+    """Penalización por entrar en celdas con humo o fuego."""
+
+    def __init__(self, smoke_penalty=1, fire_penalty=1):
+        self.smoke_penalty = smoke_penalty
+        self.fire_penalty = fire_penalty
+
+    def cell_penalties(self, model, engine):
+        penalties = {}
+        if self.smoke_penalty:
+            for x, y in model.smoke_cells:
+                penalties[y * engine.width + x] = self.smoke_penalty
+        if self.fire_penalty:
+            for x, y in model.fire_cells:
+                penalties[y * engine.width + x] = self.fire_penalty
+        return penalties
+
+
+def default_layers():
+    return [WallCostLayer(), HazardCostLayer()]
+
+
+# Topología CSR compartida por todos los modelos con el mismo tamaño de tablero
+_TOPOLOGIES = {}
+
+
+def board_topology(width, height):
+    """(indptr, indices, y, x y dirección de cada arista) para un tablero width x height."""
+    topology = _TOPOLOGIES.get((width, height))
+    if topology is None:
+        indptr = [0]
+        indices, sources, directions = [], [], []
+        for y in range(height):
+            for x in range(width):
+                for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < width and 0 <= ny < height:
+                        indices.append(ny * width + nx)
+                        sources.append(y * width + x)
+                        directions.append(direction)
+                indptr.append(len(indices))
+        edge_y, edge_x = np.divmod(np.array(sources, dtype=np.intp), width)
+        topology = (indptr, indices, edge_y, edge_x, np.array(directions, dtype=np.intp))
+        _TOPOLOGIES[(width, height)] = topology
+    return topology
+
+
+class RoutingEngine:
+    def __init__(self, model, layers=None):
+        self.model = model
+        self.layers = default_layers() if layers is None else list(layers)
+        self.width = model.width
+        self.height = model.height
+
+        # Adyacencia CSR: aristas de la celda i en indices[indptr[i]:indptr[i + 1]]
+        (self.indptr, self.indices, self._edge_y, self._edge_x,
+         self._edge_dir) = board_topology(self.width, self.height)
+
+        self._wall_version = None
+        self._state_version = None
+        self.edge_costs = []
+        self.min_edge_cost = 1
+        self.penalties = {}
+        self.room_graph = None  # RoomGraph opcional para planificar por salas
+
+    @property
+    def allows_chop(self):
+        return any(getattr(layer, "chop_costs", None) for layer in self.layers)
+
+    def set_layers(self, layers):
+        self.layers = list(layers)
+        self._wall_version = None
+        self._state_version = None
+
+    def _side_cost(self, wall_type):
+        cost = 0
+        for layer in self.layers:
+            layer_costs = layer.edge_costs(np.array([wall_type]))
+            if layer_costs is not None:
+                cost += layer_costs[0]
+        cost = float(cost)
+        return int(cost) if cost != INF and cost.is_integer() else cost
+
+    def wall_changed(self, x, y, direction, wall_type):
+        """Actualizar la arista de un lado tras model._set_wall (con wall_version ya incrementado)."""
+        if self._wall_version == self.model.wall_version - 1:
+            cell = y * self.width + x
+            for edge in range(self.indptr[cell], self.indptr[cell + 1]):
+                if self._edge_dir[edge] == direction:
+                    previous = self.edge_costs[edge]
+                    cost = self.edge_costs[edge] = self._side_cost(wall_type)
+                    if cost < self.min_edge_cost:
+                        self.min_edge_cost = cost
+                    elif previous == self.min_edge_cost and cost > previous:
+                        finite = [cost for cost in self.edge_costs if cost != INF]
+                        self.min_edge_cost = min(finite) if finite else 1
+                    break
+            self._wall_version = self.model.wall_version
+        if self.room_graph is not None:
+            self.room_graph.wall_changed(x, y, direction, wall_type)
+
+    def _refresh(self):
+        model = self.model
+        if self._wall_version != model.wall_version:
+            walls = np.asarray(model.grid_data)[self._edge_y, self._edge_x, self._edge_dir]
+            costs = np.zeros(len(self.indices))
+            for layer in self.layers:
+                layer_costs = layer.edge_costs(walls)
+                if layer_costs is not None:
+                    costs += layer_costs
+            finite = costs[np.isfinite(costs)]
+            self.min_edge_cost = float(finite.min()) if finite.size else 1
+            # Costes enteros como int (objetos compartidos) para no guardar un float por arista
+            self.edge_costs = [
+                int(cost) if cost != INF and cost.is_integer() else cost for cost in costs.tolist()
+            ]
+            self._wall_version = model.wall_version
+
+        if self._state_version != model.version:
+            penalties = {}
+            for layer in self.layers:
+                layer_penalties = layer.cell_penalties(model, self)
+                if layer_penalties:
+                    for cell, penalty in layer_penalties.items():
+                        penalties[cell] = penalties.get(cell, 0) + penalty
+            self.penalties = penalties
+            self._state_version = model.version
+
+    def find_path(self, start, goal):
+        """Camino más barato de start a goal (A*), o [] si no hay ninguno."""
+        if start == goal:
+            return [start]
+        self._refresh()
+
+        width = self.width
+        indptr, indices = self.indptr, self.indices
+        edge_costs, penalties = self.edge_costs, self.penalties
+        scale = self.min_edge_cost
+        gx, gy = goal
+        source = start[1] * width + start[0]
+        target = gy * width + gx
+
+        # Con grafo de salas, A* solo expande las salas de la ruta planificada
+        rooms = labels = None
+        if self.room_graph is not None:
+            rooms = self.room_graph.corridor(source, target)
+            if rooms is None:
+                return []
+            labels = self.room_graph.labels
+
+        g_score = {source: 0}
+        came_from = {}
+        closed = set()
+        open_set = [(0, 0, source)]
+        while open_set:
+            _, distance, cell = heapq.heappop(open_set)
+            if cell in closed:
+                continue
+            if cell == target:
+                path = []
+                while cell != source:
+                    path.append((cell % width, cell // width))
+                    cell = came_from[cell]
+                path.append(start)
+                path.reverse()
+                return path
+            closed.add(cell)
+
+            for edge in range(indptr[cell], indptr[cell + 1]):
+                cost = edge_costs[edge]
+                if cost == INF:
+                    continue
+                neighbor = indices[edge]
+                if rooms is not None and labels[neighbor] not in rooms:
+                    continue
+                tentative = distance + cost + penalties.get(neighbor, 0)
+                if tentative < g_score.get(neighbor, INF):
+                    g_score[neighbor] = tentative
+                    came_from[neighbor] = cell
+                    nx, ny = neighbor % width, neighbor // width
+                    estimate = tentative + (abs(nx - gx) + abs(ny - gy)) * scale
+                    heapq.heappush(open_set, (estimate, tentative, neighbor))
+        return []
@@ -0,0 +1,283 @@
+"""
+Persistence of simulation checkpoints.
+
+Stores are keyed by simulation id and hold an opaque checkpoint blob plus a
+revision number. ``SQLiteSimulationStore`` is the default and can be shared by
+several gunicorn workers on the same host; ``MemorySimulationStore`` keeps the
+old single-process behaviour.
+
+Writes are compare-and-swap: each checkpoint names the revision it was built
+on (0 for a new simulation) and is only stored if that is still the stored
+revision, so two workers stepping the same simulation cannot overwrite each
+other's steps. ``save_many`` returns the rejected checkpoints and
+``CheckpointWriter`` reports them to its ``on_conflict`` callback.
+
+``CheckpointWriter`` batches writes so stepping does not pay a database round
+trip on every step. Checkpoints can be submitted unencoded; they are encoded
+when flushed, on the flushing thread, and one replaced by a newer checkpoint of
+the same simulation before the flush is never encoded at all.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class SimulationStore:
+    """Interfaz de los almacenes de simulaciones."""
+
+    def save_many(self, checkpoints):
+        """Guardar una lista de (simulation_id, revision, data, base).
+
+        Cada checkpoint solo se escribe si la revisión guardada sigue siendo
+        `base` (0: la simulación no debe existir). Devuelve los
+        (simulation_id, revision) rechazados.
+        """
+        raise NotImplementedError
+
+    def load(self, simulation_id):
+        """Devolver (revision, data) o None si no existe."""
+        raise NotImplementedError
+
+    def revision(self, simulation_id):
+        """Devolver la ultima revision guardada o None si no existe."""
+        raise NotImplementedError
+
+    def delete(self, simulation_id):
+        raise NotImplementedError
+
+    def simulation_ids(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySimulationStore(SimulationStore):
+    def __init__(self):
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+
+    def save_many(self, checkpoints):
+        rejected = []
+        with self._lock:
+            for simulation_id, revision, data, base in checkpoints:
+                stored = self._checkpoints.get(simulation_id)
+                if (stored[0] if stored is not None else 0) != base:
+                    rejected.append((simulation_id, revision))
+                else:
+                    self._checkpoints[simulation_id] = (revision, data)
+        return rejected
+
+    def load(self, simulation_id):
+        with self._lock:
+            return self._checkpoints.get(simulation_id)
+
+    def revision(self, simulation_id):
+        checkpoint = self.load(simulation_id)
+        return checkpoint[0] if checkpoint else None
+
+    def delete(self, simulation_id):
+        with self._lock:
+            self._checkpoints.pop(simulation_id, None)
+
+    def simulation_ids(self):
+        with self._lock:
+            return list(self._checkpoints)
+
+
+class SQLiteSimulationStore(SimulationStore):
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS simulations (
+                    simulation_id TEXT PRIMARY KEY,
+                    revision INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    data BLOB NOT NULL
+                )"""
+            )
+            self._connection.commit()
+
+    def save_many(self, checkpoints):
+        now = time.time()
+        rows = [
+            (simulation_id, revision, now, sqlite3.Binary(data), base)
+            for simulation_id, revision, data, base in checkpoints
+        ]
+        rejected = []
+        with self._lock:
+            for row in rows:
+                cursor = self._connection.execute(
+                    """INSERT INTO simulations (simulation_id, revision, updated_at, data)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(simulation_id) DO UPDATE SET
+                        revision = excluded.revision,
+                        updated_at = excluded.updated_at,
+                        data = excluded.data
+                    WHERE simulations.revision = ?""",
+                    row,
+                )
+                if cursor.rowcount == 0:
+                    rejected.append((row[0], row[1]))
+            self._connection.commit()
+        return rejected
+
+    def load(self, simulation_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT revision, data FROM simulations WHERE simulation_id = ?",
+                (simulation_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def revision(self, simulation_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT revision FROM simulations WHERE simulation_id = ?",
+                (simulation_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, simulation_id):
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM simulations WHERE simulation_id = ?", (simulation_id,)
+            )
+            self._connection.commit()
+
+    def simulation_ids(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT simulation_id FROM simulations").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def create_store(url):
+    """Crear un almacen a partir de una URL: ``sqlite:///ruta.db`` o ``memory://``."""
+    if url.startswith("sqlite:///"):
+        return SQLiteSimulationStore(url[len("sqlite:///"):])
+    if url.startswith("memory://"):
+        return MemorySimulationStore()
+    raise ValueError(f"Unsupported simulation store: {url}")
+
+
+class CheckpointWriter:
+    """Agrupa checkpoints pendientes y los escribe en lotes.
+
+    `data` puede llegar ya codificado (bytes) o como el objeto que `encode`
+    convierte en bytes al escribirlo. Los checkpoints de una simulación que se
+    acumulan entre dos escrituras se guardan como uno, sobre la revisión
+    anterior al primero. Salvo con immediate=True, submit no
+    escribe: avisa al hilo que espera en wait_due() cuando el lote está listo.
+
+    Las escrituras se serializan: si dos flush se solaparan, el segundo podría
+    guardar la revisión N+1 antes de que el primero guarde la N, y el almacén
+    rechazaría como conflicto una partida que ningún otro worker tocó.
+    """
+
+    def __init__(self, store, batch_size=16, flush_interval=1.0, encode=None, on_conflict=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.encode = encode
+        self.on_conflict = on_conflict  # on_conflict(simulation_id, revision) por cada checkpoint rechazado
+        self._pending = {}
+        self._in_flight = {}  # lote que un flush está escribiendo
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._due = threading.Event()
+        self._last_flush = time.monotonic()
+
+    def submit(self, simulation_id, revision, data, immediate=False, base=None):
+        """Encolar un checkpoint construido sobre `base` (por defecto revision - 1)."""
+        with self._lock:
+            previous = self._pending.get(simulation_id)
+            if previous is not None:
+                base = previous[2]
+            elif base is None:
+                base = revision - 1
+            self._pending[simulation_id] = (revision, data, base)
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if immediate:
+            self.flush()
+        elif due:
+            self._due.set()
+
+    def wait_due(self, timeout):
+        """Esperar hasta `timeout` segundos o hasta que un lote esté listo para escribirse."""
+        self._due.wait(timeout)
+        self._due.clear()
+
+    def _encoded(self, data):
+        return data if isinstance(data, (bytes, bytearray)) else self.encode(data)
+
+    def pending(self, simulation_id):
+        """Checkpoint aún no guardado (encolado o en escritura), o None"""
+        with self._lock:
+            pending = self._pending.get(simulation_id)
+            return pending if pending is not None else self._in_flight.get(simulation_id)
+
+    def discard(self, simulation_id):
+        with self._lock:
+            self._pending.pop(simulation_id, None)
+
+    def delete(self, simulation_id):
+        """Descartar lo pendiente y borrar del almacén, sin que un flush en curso lo vuelva a escribir"""
+        with self._flush_lock:
+            self.discard(simulation_id)
+            self.store.delete(simulation_id)
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.items())
+                self._in_flight = self._pending
+                self._pending = {}
+                self._last_flush = time.monotonic()
+            if not batch:
+                return
+            try:
+                rejected = self.store.save_many(
+                    [(simulation_id, revision, self._encoded(data), base)
+                     for simulation_id, (revision, data, base) in batch]
+                )
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+        # Fuera del lock: on_conflict detiene la simulación y puede volver a encolar o escribir
+        if self.on_conflict is not None:
+            for simulation_id, revision in rejected:
+                self.on_conflict(simulation_id, revision)
+
+    def load(self, simulation_id):
+        pending = self.pending(simulation_id)
+        if pending is not None:
+            return pending[0], self._encoded(pending[1])
+        return self.store.load(simulation_id)
+
+    def revision(self, simulation_id):
+        pending = self.pending(simulation_id)
+        if pending is not None:
+            return pending[0]
+        return self.store.revision(simulation_id)
@@ -0,0 +1,199 @@
+"""
+Pipelined delivery of simulation state updates.
+
+The auto-run loop only steps the model and captures a ``StateFrame``: an
+immutable copy of what the state encoders read (header fields, fire codes,
+walls, agents and POIs), taken in microseconds on the stepping thread. The
+frame is handed to ``FramePipeline``, whose worker threads build the JSON and
+binary states, encode the Socket.IO frames and emit them, so payload size and
+spectator count no longer add to the step period.
+
+Each simulation has a bounded queue of ``queue_size`` frames between the two
+stages. When the serializer falls behind, the oldest waiting frame is dropped
+(newest wins, as in ``fanout.py``), so the stepping loop never blocks; event
+logs are diffs against the last delivered state, so no log is lost with it.
+A simulation's frames are serialized in order by one worker at a time.
+Dropped frames are counted as ``pipeline_frames_skipped_total``.
+"""
+
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from models.firefighterRole import FireFighterRole
+from models.gameRules import GameRules
+from models.poi import POIType
+
+
+class POIFrame(NamedTuple):
+    id: int
+    x: int
+    y: int
+    type: POIType
+    revealed: bool
+
+
+class AgentFrame(NamedTuple):
+    unique_id: int
+    pos: tuple
+    role: Optional[FireFighterRole]
+    action_points: int
+    carrying_victim: Optional[POIFrame]
+    knockout_timer: int
+
+    def is_knocked_out(self):
+        return self.knockout_timer > 0
+
+
+def _poi_frame(poi):
+    return POIFrame(poi.id, poi.x, poi.y, poi.type, bool(poi.revealed))
+
+
+@dataclass(frozen=True, eq=False)
+class StateFrame:
+    """Copia inmutable del estado observable, con los nombres de atributo del modelo.
+
+    build_state, encode_binary_state y generate_step_logs la leen igual que a un
+    FireRescueModel.
+    """
+
+    version: int
+    wall_version: int
+    width: int
+    height: int
+    step_count: int
+    round_count: int
+    phase: str
+    current_agent_index: int
+    damage_count: int
+    game_over: bool
+    game_won: bool
+    end_reason: str
+    rules: GameRules
+    fire_codes: np.ndarray
+    grid_data: np.ndarray
+    agent_list: tuple
+    active_pois: tuple
+    rescued_victims: tuple  # ids
+    lost_victims: tuple  # ids
+
+    @classmethod
+    def capture(cls, model, previous=None):
+        """Tomar el frame del modelo; reutiliza los muros de `previous` si no cambiaron."""
+        if previous is not None and previous.wall_version == model.wall_version:
+            grid = previous.grid_data
+        else:
+            grid = np.array(model.grid_data)
+            grid.setflags(write=False)
+        codes = model.fire_state_codes()
+        codes.setflags(write=False)
+        return cls(
+            version=model.version,
+            wall_version=model.wall_version,
+            width=model.width,
+            height=model.height,
+            step_count=model.step_count,
+            round_count=model.round_count,
+            phase=model.phase,
+            current_agent_index=model.current_agent_index,
+            damage_count=model.damage_count,
+            game_over=model.game_over,
+            game_won=model.game_won,
+            end_reason=model.end_reason,
+            rules=model.rules,
+            fire_codes=codes,
+            grid_data=grid,
+            agent_list=tuple(
+                AgentFrame(agent.unique_id, agent.pos, agent.role, agent.action_points,
+                           _poi_frame(agent.carrying_victim) if agent.carrying_victim else None,
+                           agent.knockout_timer)
+                for agent in model.agent_list
+            ),
+            active_pois=tuple(_poi_frame(poi) for poi in model.active_pois),
+            rescued_victims=tuple(poi.id for poi in model.rescued_victims),
+            lost_victims=tuple(poi.id for poi in model.lost_victims),
+        )
+
+    def fire_state_codes(self):
+        return self.fire_codes
+
+    def is_game_over(self):
+        return self.game_over
+
+
+class _Channel:
+    __slots__ = ("frames", "scheduled")
+
+    def __init__(self):
+        self.frames = deque()  # (frame, handler) en espera
+        self.scheduled = False  # hay un worker vaciando este canal
+
+
+class FramePipeline:
+    """Etapa de serialización y emisión: cola acotada por clave y un pool de hilos.
+
+    Con workers=0 cada frame se procesa en el hilo que lo entrega (sin pipeline).
+    """
+
+    def __init__(self, workers=2, queue_size=2, metrics=None):
+        self.workers = workers
+        self.queue_size = max(1, queue_size)
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="frame-pipeline") if workers else None
+        self._channels = {}  # clave (id de simulación) -> _Channel con frames pendientes
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, frame, handler):
+        """Encolar handler(frame) detrás de los frames anteriores de `key`; nunca bloquea."""
+        if self._executor is None:
+            handler(frame)
+            return
+        skipped = 0
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            while len(channel.frames) >= self.queue_size:
+                channel.frames.popleft()
+                skipped += 1
+            channel.frames.append((frame, handler))
+            start = not channel.scheduled
+            channel.scheduled = True
+        if skipped and self.metrics is not None:
+            self.metrics.inc("pipeline_frames_skipped_total",
+                             "State frames replaced by a newer one before they were serialized", skipped)
+        if start:
+            self._executor.submit(self._drain, key, channel)
+
+    def _drain(self, key, channel):
+        while True:
+            with self._lock:
+                if not channel.frames:
+                    channel.scheduled = False
+                    if self._channels.get(key) is channel:
+                        del self._channels[key]
+                    self._idle.notify_all()
+                    return
+                frame, handler = channel.frames.popleft()
+            try:
+                handler(frame)
+            except Exception:
+                # Un frame que falla no debe dejar la simulación sin más actualizaciones
+                traceback.print_exc()
+
+    @property
+    def queue_depth(self):
+        """Frames esperando a ser serializados (sin contar los que están en curso)."""
+        with self._lock:
+            return sum(len(channel.frames) for channel in self._channels.values())
+
+    def wait_idle(self, timeout=None):
+        """Esperar a que no quede ningún frame pendiente ni en curso; False si vence el plazo."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._channels, timeout)
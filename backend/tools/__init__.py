@@ -0,0 +1 @@
+# Herramientas de desarrollo: benchmarks, pruebas de carga y experimentos
@@ -0,0 +1,305 @@
+"""
+Batch runner for seeded headless games, shared by the experiment tools.
+
+A *point* is a dict of parameters: ``GameRules`` fields plus the optional
+``board`` name (see ``models.boardLayouts.build_board``), ``max_steps``,
+``policy`` (see ``models/policies.py``) and ``split_streams``.
+``run_batch`` plays every (point, seed) pair that is not already in the
+result cache, in a process pool, or with a target precision only as many
+seeds per point as it takes to narrow the confidence interval to the
+requested width. Workers write each game's outcome and per-round series
+straight into a ``ResultStore`` (``tools/results.py``): shared-memory arrays,
+or memory-mapped ``.npy`` files when a directory is given, so no result is
+pickled back to the parent.
+
+Cache keys hash the model source code, the parameters and the seed, so
+changing any file in ``models/`` invalidates old results automatically.
+"""
+
+import contextlib
+import glob
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+
+import numpy as np
+
+from models.boardLayouts import build_board
+from models.fireRescueModel import MAX_SEED, FireRescueModel
+from models.gameRules import GameRules
+from tools.results import ResultStore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE = os.path.join(BACKEND_DIR, "data", "batch_cache.db")
+DEFAULT_MAX_STEPS = 5000
+DEFAULT_CHUNK = 100  # semillas por punto entre comprobaciones del modo de precisión
+TARGET_METRICS = ("win_rate", "rescued")
+
+
+# Código del que dependen los resultados guardados: el modelo, play_game y el esquema de resultados
+VERSIONED_SOURCES = ("models/*.py", "tools/batch.py", "tools/results.py")
+
+
+def code_version():
+    """Hash del código que produce los resultados (VERSIONED_SOURCES)."""
+    digest = hashlib.sha256()
+    paths = sorted(path for pattern in VERSIONED_SOURCES for path in glob.glob(os.path.join(BACKEND_DIR, pattern)))
+    for path in paths:
+        digest.update(os.path.relpath(path, BACKEND_DIR).encode("utf-8"))
+        with open(path, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def point_key(point):
+    return json.dumps(point, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(version, point, seed):
+    return hashlib.sha256(f"{version}|{point_key(point)}|{seed}".encode("utf-8")).hexdigest()
+
+
+def build_model(point, seed):
+    params = dict(point)
+    board = params.pop("board", "stock")
+    policy = params.pop("policy", None)
+    split_streams = params.pop("split_streams", False)
+    params.pop("max_steps", None)
+    return FireRescueModel(build_board(board), seed=seed, rules=GameRules.from_dict(params),
+                           policy=policy, split_streams=split_streams)
+
+
+def series_rounds(point):
+    """Rondas que caben en max_steps (cada ronda son dos pasos por bombero)."""
+    firefighters = point.get("firefighters", GameRules().firefighters)
+    return point.get("max_steps", DEFAULT_MAX_STEPS) // (2 * max(1, firefighters)) + 1
+
+
+def _record_round(series, index, model):
+    if index < len(series):
+        series[index] = (len(model.fire_cells), len(model.smoke_cells), model.damage_count,
+                         len(model.rescued_victims), len(model.lost_victims))
+
+
+def play_game(point, seed, series=None):
+    """Jugar una partida completa sin salida por pantalla y resumir el resultado.
+
+    Con `series` (array rondas x SERIES_FIELDS) se guarda además el estado al
+    empezar cada ronda; la fila `rounds` es el estado final.
+    """
+    max_steps = point.get("max_steps", DEFAULT_MAX_STEPS)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        model = build_model(point, seed)
+        if series is not None:
+            _record_round(series, 0, model)
+        while not model.is_game_over() and model.step_count < max_steps:
+            round_count = model.round_count
+            model.step()
+            if series is not None and model.round_count != round_count:
+                _record_round(series, model.round_count, model)
+        if series is not None:
+            _record_round(series, model.round_count, model)
+    return {
+        "won": model.game_won,
+        "lost": model.game_lost,
+        "rescued": len(model.rescued_victims),
+        "victims_lost": len(model.lost_victims),
+        "damage": model.damage_count,
+        "rounds": model.round_count,
+        "steps": model.step_count,
+        "end_reason": model.end_reason,
+    }
+
+
+_store = None  # ResultStore del worker, conectado en _attach_store
+
+
+def _attach_store(spec):
+    global _store
+    _store = ResultStore.attach(spec)
+
+
+def _play_task(task):
+    # El resultado se escribe en los arrays compartidos: solo vuelve el número de fila
+    row, key, point, seed = task
+    series = _store.series[row]
+    result = play_game(point, seed, series)
+    _store.write(row, result, min(result["rounds"] + 1, len(series)))
+    return row, key
+
+
+class ResultCache:
+    """Resultados de partidas en SQLite, indexados por cache_key."""
+
+    def __init__(self, path=DEFAULT_CACHE):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL)"
+        )
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT key, result FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((key, json.loads(result)) for key, result in rows)
+        return found
+
+    def put_many(self, items):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results (key, result) VALUES (?, ?)",
+                [(key, json.dumps(result)) for key, result in items],
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def run_batch(points, seeds, processes=None, cache=None, progress=None, path=None,
+              target=None, chunk=DEFAULT_CHUNK):
+    """Jugar cada (punto, semilla) que falte en la cache.
+
+    Con `target` = (métrica, anchura) las semillas se juegan por tandas de
+    `chunk` y un punto deja de recibir partidas en cuanto el IC 95% de la
+    métrica ("win_rate" o "rescued") es tan estrecho como se pidió; las tandas
+    siguientes ya no se programan. Un punto siempre usa un prefijo de `seeds`
+    (store.played[punto]), así que el resultado no depende del número de
+    procesos.
+
+    Devuelve un ResultStore (fila = punto x semilla; en `path` si se da, si
+    no en memoria compartida) y el número de partidas jugadas. Quien llama
+    debe cerrarlo.
+    """
+    version = code_version()
+    seeds = list(seeds)
+    # Fallar aquí y no en cada worker
+    invalid = [seed for seed in seeds if not 0 <= seed < MAX_SEED]
+    if invalid:
+        raise ValueError(f"Seeds must be between 0 and {MAX_SEED - 1}: {invalid[0]} is not")
+    rounds = max((series_rounds(point) for point in points), default=0)
+    store = ResultStore.create(points, seeds, rounds, path, version)
+    if target is not None:
+        metric, width = target
+        if metric not in TARGET_METRICS:
+            raise ValueError(f"Unknown target metric: {metric} (expected one of {', '.join(TARGET_METRICS)})")
+        store.played = [0] * len(points)
+    step = chunk if target is not None else max(1, len(seeds))
+
+    active = list(range(len(points)))
+    played = 0
+    with contextlib.ExitStack() as stack:
+        pool = None
+        for start in range(0, len(seeds), step):
+            stop = min(start + step, len(seeds))
+            tasks = [(store.row(point_index, seed_index), cache_key(version, points[point_index], seeds[seed_index]),
+                      points[point_index], seeds[seed_index])
+                     for point_index in active for seed_index in range(start, stop)]
+            cached = cache.get_many(key for _, key, _, _ in tasks) if cache else {}
+
+            missing = []
+            for task in tasks:
+                row, key = task[:2]
+                if key in cached:
+                    store.write(row, cached[key])
+                else:
+                    missing.append(task)
+
+            if missing:
+                if pool is None:
+                    pool = stack.enter_context(multiprocessing.Pool(
+                        processes, initializer=_attach_store, initargs=(store.spec(),)))
+                # Total estimado: lo jugado, esta tanda y las siguientes si nadie se para antes
+                total = played + len(missing) + len(active) * (len(seeds) - stop)
+                pending = []
+                for row, key in pool.imap_unordered(_play_task, missing, chunksize=4):
+                    played += 1
+                    if cache:
+                        pending.append((key, store.outcome(row)))
+                        if len(pending) >= 200:
+                            cache.put_many(pending)
+                            pending = []
+                    if progress:
+                        progress(played, total)
+                if cache and pending:
+                    cache.put_many(pending)
+
+            if target is None:
+                break
+            for point_index in active:
+                store.played[point_index] = stop
+            active = [point_index for point_index in active
+                      if interval_width(store.outcomes[store.rows(point_index)], metric) > width]
+            if not active:
+                break
+    store.flush()
+
+    return store, played
+
+
+def wilson_interval(successes, total, z=1.96):
+    """Intervalo de confianza de Wilson para una proporción."""
+    if total == 0:
+        return 0.0, 1.0
+    proportion = successes / total
+    denominator = 1 + z * z / total
+    centre = (proportion + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(proportion * (1 - proportion) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def interval_width(outcomes, metric, z=1.96):
+    """Anchura del IC de la tasa de victoria (Wilson) o de la media de rescatados (normal)."""
+    games = len(outcomes)
+    if metric == "win_rate":
+        low, high = wilson_interval(int(outcomes["won"].sum()), games, z)
+        return high - low
+    if games < 2:
+        return float("inf")
+    return 2 * z * float(outcomes["rescued"].std(ddof=1)) / math.sqrt(games)
+
+
+def summarize(outcomes):
+    """Resumen de un array de resultados (OUTCOME_DTYPE): tasa de victoria con IC y medias."""
+    games = len(outcomes)
+    wins = int(outcomes["won"].sum())
+    low, high = wilson_interval(wins, games)
+
+    def mean(name):
+        return float(outcomes[name].mean()) if games else 0.0
+
+    return {
+        "games": games,
+        "wins": wins,
+        "win_rate": wins / games if games else 0.0,
+        "win_rate_ci": [low, high],
+        "mean_rescued": mean("rescued"),
+        "mean_victims_lost": mean("victims_lost"),
+        "mean_damage": mean("damage"),
+        "mean_rounds": mean("rounds"),
+        "unfinished": int((~outcomes["won"] & ~outcomes["lost"]).sum()),
+    }
+
+
+def paired_difference(values, baseline, z=1.96):
+    """Media de las diferencias por semilla (values - baseline) con su IC normal.
+
+    Con números aleatorios comunes las dos partidas de una semilla están
+    correlacionadas y la varianza de la diferencia es mucho menor que la de
+    dos muestras independientes.
+    """
+    differences = values.astype(np.float64) - baseline.astype(np.float64)
+    games = len(differences)
+    if games == 0:
+        return {"mean": 0.0, "ci": [0.0, 0.0]}
+    mean = float(differences.mean())
+    margin = z * float(differences.std(ddof=1)) / math.sqrt(games) if games > 1 else float("inf")
+    return {"mean": mean, "ci": [mean - margin, mean + margin]}
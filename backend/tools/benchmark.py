@@ -0,0 +1,375 @@
+"""
+Reproducible benchmarks for the simulation engine and the web layer.
+
+Every benchmark uses fixed seeds. Results are written as JSON and compared
+against a stored baseline (``tools/benchmark_baseline.json`` by default):
+
+    cd backend
+    python -m tools.benchmark --output results.json
+    python -m tools.benchmark --quick --fail-on-regression
+    python -m tools.benchmark --save-baseline
+
+Suites:
+    engine     FireRescueModel.step throughput on the stock and tiled boards,
+               and step latency on a 10x10 tiled building
+    functions  per-call cost of djikstra, assign_roles, spread_smoke_to_fire
+               and find_nearest_fire
+    web_inprocess
+               SimulationManager.get_state encode time, REST step latency,
+               Socket.IO fan-out time with N simulated clients in one room, the
+               stepping-thread cost of the same with the frame pipeline, and
+               emit time to 1000 spectators
+
+The web_inprocess numbers come from Flask's and Flask-SocketIO's test clients
+inside this process, one request or step at a time: they measure the server
+code (routing, serialization, fan-out to the clients' queues), not network
+round-trips or concurrent load. ``tools/loadtest.py`` measures real workers
+and clients.
+
+The model prints a lot; stdout is discarded while benchmarking.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import engineio.socket
+
+from models.boardLayouts import tile_layout
+from models.fireRescueModel import FireRescueModel, grid_data
+from models.modelSnapshot import capture_snapshot, restore_snapshot
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "tools", "benchmark_baseline.json")
+
+BOARDS = {
+    "stock": lambda: grid_data.copy(),
+    "tiled_2x2": lambda: tile_layout(2, 2),
+    "tiled_4x4": lambda: tile_layout(4, 4),
+}
+SPECTATORS = 1000
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def result(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def per_call_us(func, number, repeat=5):
+    """Mejor tiempo medio por llamada (microsegundos) de `repeat` tandas."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def per_call_us_with_setup(func, setup, number):
+    """Mediana por llamada cuando cada llamada necesita un estado nuevo."""
+    samples = []
+    for _ in range(number):
+        argument = setup()
+        start = time.perf_counter()
+        func(argument)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def midgame_model(seed=7, steps=20, board="stock"):
+    with quiet():
+        model = FireRescueModel(BOARDS[board](), seed=seed)
+        for _ in range(steps):
+            if model.is_game_over():
+                break
+            model.step()
+    return model
+
+
+def bench_engine(quick):
+    results = {}
+    games = 5 if quick else 30
+    max_steps = 400 if quick else 2000
+    for board in BOARDS:
+        total_steps = 0
+        finished = 0
+        with quiet():
+            start = time.perf_counter()
+            for seed in range(games):
+                model = FireRescueModel(BOARDS[board](), seed=seed)
+                while not model.is_game_over() and model.step_count < max_steps:
+                    model.step()
+                total_steps += model.step_count
+                finished += 1
+            elapsed = time.perf_counter() - start
+        results[f"engine.{board}.steps_per_sec"] = result(total_steps / elapsed, "steps/s", "higher")
+        results[f"engine.{board}.games_per_sec"] = result(finished / elapsed, "games/s", "higher")
+
+    # Latencia de un paso en un edificio de 4800 celdas
+    with quiet():
+        model = FireRescueModel(tile_layout(10, 10), seed=0)
+        steps = 100 if quick else 400
+        start = time.perf_counter()
+        while not model.is_game_over() and model.step_count < steps:
+            model.step()
+        elapsed = time.perf_counter() - start
+    results["engine.tiled_10x10.step_ms"] = result(elapsed / model.step_count * 1000, "ms", "lower")
+    return results
+
+
+def bench_functions(quick):
+    results = {}
+    number = 200 if quick else 2000
+    for board in ("stock", "tiled_4x4"):
+        model = midgame_model(board=board)
+        snapshot = capture_snapshot(model)
+        agent = model.agent_list[0]
+        rng = random.Random(42)
+        cells = [(x, y) for y in range(model.height) for x in range(model.width)]
+        pairs = [(rng.choice(cells), rng.choice(cells)) for _ in range(64)]
+        pair_iter = iter(pairs * (number * 5 // len(pairs) + 2))
+
+        with quiet():
+            results[f"functions.{board}.djikstra_us"] = result(
+                per_call_us(lambda: agent.djikstra(*next(pair_iter)), number), "us", "lower"
+            )
+            results[f"functions.{board}.assign_roles_us"] = result(
+                per_call_us(model.assign_roles, number), "us", "lower"
+            )
+            results[f"functions.{board}.find_nearest_fire_us"] = result(
+                per_call_us(agent.find_nearest_fire, number), "us", "lower"
+            )
+            results[f"functions.{board}.spread_smoke_to_fire_us"] = result(
+                per_call_us_with_setup(
+                    lambda fresh: fresh.spread_smoke_to_fire(),
+                    lambda: restore_snapshot(snapshot),
+                    number // 4,
+                ),
+                "us",
+                "lower",
+            )
+    return results
+
+
+def bench_web_inprocess(quick):
+    # La capa web usa un almacen en memoria para no tocar el disco
+    os.environ.setdefault("SIMULATION_STORE", "memory://")
+    with quiet():
+        import app as web
+        from codec import encode_binary_state
+
+    results = {}
+    number = 200 if quick else 2000
+
+    sim_manager = web.SimulationManager("benchmark", model=midgame_model())
+    logs = sim_manager.current_logs()
+    results["web_inprocess.get_state_json_us"] = result(
+        per_call_us(lambda: json.dumps(sim_manager.build_state(logs)), number), "us", "lower"
+    )
+    results["web_inprocess.get_state_binary_us"] = result(
+        per_call_us(lambda: encode_binary_state(sim_manager.model, logs), number), "us", "lower"
+    )
+    results["web_inprocess.get_state_cached_us"] = result(
+        per_call_us(lambda: sim_manager.get_state("json_text"), number), "us", "lower"
+    )
+
+    client = web.app.test_client()
+    with quiet():
+        simulation_id = client.post("/api/create_simulation").get_json()["simulation_id"]
+        start = time.perf_counter()
+        steps = 20 if quick else 100
+        for _ in range(steps):
+            client.post(f"/api/simulation/{simulation_id}/step")
+        elapsed = time.perf_counter() - start
+    results["web_inprocess.rest_step_ms"] = result(elapsed / steps * 1000, "ms", "lower")
+
+    # Sin pacing por cliente: se mide el coste de serializar y repartir cada frame
+    manager = web.client_manager
+    pacing = (manager.max_fps, manager.max_backlog, manager.metrics)
+    manager.configure_pacing(0, 0, manager.metrics)
+
+    # Espectadores con sockets Engine.IO sin transporte: se mide el reparto hasta
+    # sus colas de salida (antes de crear test clients, que sustituyen el envío)
+    simulation_id = "benchmark-spectators"
+    with quiet():
+        sim_manager = web.SimulationManager(simulation_id, model=FireRescueModel(grid_data.copy(), seed=3))
+    server = web.socketio.server
+    spectators = []
+    for index in range(SPECTATORS):
+        eio_sid = f"benchmark-spectator-{index}"
+        server.eio.sockets[eio_sid] = engineio.socket.Socket(server.eio, eio_sid)
+        sid = manager.connect(eio_sid, "/")
+        manager.enter_room(sid, "/", simulation_id)
+        spectators.append((eio_sid, sid))
+    samples = []
+    with quiet():
+        for _ in range(10 if quick else 40):
+            if sim_manager.model.is_game_over():
+                break
+            sim_manager.step()
+            start = time.perf_counter()
+            sim_manager.emit_update()
+            samples.append(time.perf_counter() - start)
+            for eio_sid, _ in spectators:
+                server.eio.sockets[eio_sid].queue = server.eio.create_queue()
+    for eio_sid, sid in spectators:
+        manager.disconnect(sid, "/")
+        del server.eio.sockets[eio_sid]
+    results[f"web_inprocess.socketio_emit_{SPECTATORS}_spectators_ms"] = result(
+        statistics.median(samples) * 1000, "ms", "lower"
+    )
+
+    for clients in (1, 10, 100):
+        simulation_id = f"benchmark-fanout-{clients}"
+        with quiet():
+            sim_manager = web.SimulationManager(
+                simulation_id, model=FireRescueModel(grid_data.copy(), seed=3)
+            )
+            sim_manager.checkpoint(immediate=True)
+        web.active_simulations[simulation_id] = sim_manager
+        socket_clients = []
+        samples = []
+        published = []
+        with quiet():
+            for _ in range(clients):
+                socket_client = web.socketio.test_client(web.app)
+                socket_client.emit("join_simulation", {"simulation_id": simulation_id})
+                socket_client.get_received()
+                socket_clients.append(socket_client)
+
+            for _ in range(10 if quick else 40):
+                if sim_manager.model.is_game_over():
+                    break
+                start = time.perf_counter()
+                sim_manager.step()
+                sim_manager.emit_update()
+                samples.append(time.perf_counter() - start)
+                for socket_client in socket_clients:
+                    socket_client.get_received()
+
+            # Como auto_run: el hilo que avanza solo captura el frame y lo entrega al pipeline
+            for _ in range(10 if quick else 40):
+                if sim_manager.model.is_game_over():
+                    break
+                start = time.perf_counter()
+                sim_manager.step()
+                sim_manager.publish_frame()
+                published.append(time.perf_counter() - start)
+                web.frame_pipeline.wait_idle()
+                for socket_client in socket_clients:
+                    socket_client.get_received()
+            for socket_client in socket_clients:
+                socket_client.disconnect()
+        results[f"web_inprocess.socketio_step_and_fanout_{clients}_clients_ms"] = result(
+            statistics.median(samples) * 1000, "ms", "lower"
+        )
+        if published:
+            results[f"web_inprocess.socketio_step_and_publish_{clients}_clients_ms"] = result(
+                statistics.median(published) * 1000, "ms", "lower"
+            )
+    manager.configure_pacing(*pacing)
+    return results
+
+
+SUITES = {
+    "engine": bench_engine,
+    "functions": bench_functions,
+    "web_inprocess": bench_web_inprocess,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Comparar con la baseline; devuelve (cambios, regresiones)."""
+    changes = {}
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        changes[name] = change
+        worse = -change if current["better"] == "higher" else change
+        if worse > tolerance:
+            regressions.append(name)
+    return changes, regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Rescue benchmark suite")
+    parser.add_argument("--suites", default=",".join(SUITES), help="comma separated suites")
+    parser.add_argument("--quick", action="store_true", help="fewer games and iterations")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for suite in args.suites.split(","):
+        results.update(SUITES[suite](args.quick))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "quick": args.quick,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        changes, regressions = compare(results, baseline, args.tolerance)
+        report["comparison"] = {
+            "baseline_commit": baseline.get("meta", {}).get("commit"),
+            "changes": changes,
+            "regressions": regressions,
+        }
+
+    for name, current in results.items():
+        change = report.get("comparison", {}).get("changes", {}).get(name)
+        suffix = f" ({change:+.1%} vs baseline)" if change is not None else ""
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:60s} {current['value']:12.2f} {current['unit']}{suffix}{flag}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Socket.IO fan-out load test.
+
+For each worker count it starts the local broker and that many server
+processes sharing one SQLite store, connects N Socket.IO clients spread
+round-robin over the workers (as a load balancer would) and auto-runs a few
+simulations. It reports delivered updates per second, deliveries per worker
+process and the fan-out spread (time between the first and the last client
+receiving the same step).
+
+    cd backend
+    python -m tools.loadtest --workers 1,2,4 --clients 200 --simulations 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+import socketio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(port):
+    """Punto de entrada de cada proceso servidor."""
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as web
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        web.socketio.run(web.app, host="127.0.0.1", port=port, allow_unsafe_werkzeug=True)
+
+
+def _wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def _client_group(urls, simulation_ids, duration, results):
+    """Conectar un grupo de clientes y registrar la hora de llegada de cada paso."""
+    clients = []
+    received = []
+    for index, (url, simulation_id) in enumerate(zip(urls, simulation_ids)):
+        client = socketio.Client(reconnection=False)
+
+        def on_update(state, simulation_id=simulation_id, index=index):
+            received.append((simulation_id, state["step_count"], index, time.time()))
+
+        client.on("simulation_update", on_update)
+        client.connect(url, wait_timeout=10)
+        client.emit("join_simulation", {"simulation_id": simulation_id})
+        clients.append(client)
+
+    time.sleep(duration)
+    for client in clients:
+        client.disconnect()
+    results.put(received)
+
+
+def run_scenario(workers, clients, simulations, client_processes, step_delay, duration):
+    tmp = tempfile.mkdtemp(prefix="fire-rescue-loadtest-")
+    queue_url = f"unix://{tmp}/broker.sock"
+    env = dict(
+        os.environ,
+        SOCKETIO_MESSAGE_QUEUE=queue_url,
+        SIMULATION_STORE=f"sqlite:///{tmp}/simulations.db",
+        CHECKPOINT_FLUSH_INTERVAL="0.1",
+    )
+    processes = [
+        subprocess.Popen([sys.executable, "broker.py", "--address", queue_url], cwd=BACKEND_DIR, env=env,
+                         stdout=subprocess.DEVNULL)
+    ]
+    time.sleep(0.5)
+    ports = [5100 + index for index in range(workers)]
+    for port in ports:
+        processes.append(
+            subprocess.Popen([sys.executable, "-c", f"from tools.loadtest import serve; serve({port})"],
+                             cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        )
+    try:
+        urls = [f"http://127.0.0.1:{port}" for port in ports]
+        for url in urls:
+            _wait_for(url)
+
+        simulation_ids = [
+            requests.post(f"{urls[0]}/api/create_simulation").json()["simulation_id"]
+            for _ in range(simulations)
+        ]
+        client_urls = [urls[index % workers] for index in range(clients)]
+        client_sims = [simulation_ids[index % simulations] for index in range(clients)]
+
+        results = multiprocessing.Queue()
+        groups = []
+        for group in range(client_processes):
+            process = multiprocessing.Process(
+                target=_client_group,
+                args=(client_urls[group::client_processes], client_sims[group::client_processes],
+                      duration, results),
+            )
+            process.start()
+            groups.append(process)
+        time.sleep(2)  # dejar que todos los clientes se unan a sus salas
+
+        # Cada simulacion la ejecuta un worker distinto
+        for index, simulation_id in enumerate(simulation_ids):
+            requests.post(f"{urls[index % workers]}/api/simulation/{simulation_id}/auto_start",
+                          json={"step_delay": step_delay})
+
+        received = []
+        for _ in groups:
+            received.extend(results.get())
+        for process in groups:
+            process.join()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    arrivals = {}
+    for simulation_id, step_count, _, arrival in received:
+        arrivals.setdefault((simulation_id, step_count), []).append(arrival)
+    spreads = [max(times) - min(times) for times in arrivals.values() if len(times) > 1]
+    first = min((arrival for *_, arrival in received), default=0)
+    last = max((arrival for *_, arrival in received), default=0)
+    elapsed = max(last - first, 1e-9)
+    return {
+        "workers": workers,
+        "clients": clients,
+        "deliveries": len(received),
+        "deliveries_per_sec": len(received) / elapsed,
+        "deliveries_per_sec_per_worker": len(received) / elapsed / workers,
+        "fanout_spread_p50_ms": statistics.median(spreads) * 1000 if spreads else None,
+        "fanout_spread_p95_ms": (
+            statistics.quantiles(spreads, n=20)[-1] * 1000 if len(spreads) >= 20 else None
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker Socket.IO fan-out load test")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--simulations", type=int, default=4)
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--step-delay", type=float, default=0.05)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for workers in [int(value) for value in args.workers.split(",")]:
+        result = run_scenario(workers, args.clients, args.simulations, args.client_processes,
+                              args.step_delay, args.duration)
+        results.append(result)
+        print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
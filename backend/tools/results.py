@@ -0,0 +1,174 @@
+"""
+Preallocated NumPy result arrays for batch runs.
+
+A ``ResultStore`` holds one row per (point, seed) game:
+
+    outcomes  structured array: won, lost, rescued, victims_lost, damage,
+              rounds, steps, series_rounds and end_reason
+    series    int32 array (games, rounds + 1, len(SERIES_FIELDS)) with the
+              board state at the start of every round; row ``rounds`` is the
+              final state
+
+Batch workers attach to the same arrays and write their game's row in place,
+so only row numbers travel back to the parent. The arrays live in
+``multiprocessing.shared_memory`` segments, or in ``.npy`` files memory-mapped
+from a directory when the run is larger than RAM or should be kept:
+
+    store = ResultStore.open("data/runs/sweep-1")
+    store.outcomes["won"][store.rows(0)].mean()
+    store.series[store.rows(0), :, SERIES_FIELDS.index("fire")]
+
+Games taken from the result cache only have an outcome: their
+``series_rounds`` is 0. A run with a target precision can stop a point before
+its last seed; ``played[point]`` is the number of seeds it used (always a
+prefix of ``seeds``) and ``rows`` only covers those.
+"""
+
+import json
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+OUTCOME_DTYPE = np.dtype([
+    ("won", np.bool_),
+    ("lost", np.bool_),
+    ("rescued", np.int16),
+    ("victims_lost", np.int16),
+    ("damage", np.int32),
+    ("rounds", np.int32),
+    ("steps", np.int32),
+    ("series_rounds", np.int32),  # filas de series escritas (0 = resultado de la cache)
+    ("end_reason", "U48"),
+])
+SERIES_FIELDS = ("fire", "smoke", "damage", "rescued", "lost")
+OUTCOME_FIELDS = ("won", "lost", "rescued", "victims_lost", "damage", "rounds", "steps", "end_reason")
+
+
+class ResultStore:
+    def __init__(self, points, seeds, rounds, path=None):
+        self.points = list(points)
+        self.seeds = list(seeds)
+        self.rounds = rounds
+        self.path = path
+        self.played = [len(self.seeds)] * len(self.points)  # semillas usadas por punto
+        self.version = None
+        self.outcomes = None
+        self.series = None
+        self._segments = []  # SharedMemory de este proceso
+        self._owner = False
+
+    @property
+    def games(self):
+        return len(self.points) * len(self.seeds)
+
+    def _shapes(self):
+        return {
+            "outcomes": ((self.games,), OUTCOME_DTYPE),
+            "series": ((self.games, self.rounds + 1, len(SERIES_FIELDS)), np.dtype(np.int32)),
+        }
+
+    @classmethod
+    def create(cls, points, seeds, rounds, path=None, version=None):
+        """Reservar los arrays: en memoria compartida, o en `path` (directorio de .npy)."""
+        store = cls(points, seeds, rounds, path)
+        store.version = version
+        store._owner = True
+        if path:
+            os.makedirs(path, exist_ok=True)
+            store._write_index()
+            for name, (shape, dtype) in store._shapes().items():
+                setattr(store, name, np.lib.format.open_memmap(
+                    os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape))
+        else:
+            for name, (shape, dtype) in store._shapes().items():
+                size = max(1, int(np.prod(shape)) * dtype.itemsize)
+                segment = shared_memory.SharedMemory(create=True, size=size)
+                store._segments.append(segment)
+                array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+                array.fill(0)
+                setattr(store, name, array)
+        return store
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """Reabrir los resultados guardados en `path` sin recalcularlos."""
+        with open(os.path.join(path, "index.json")) as index:
+            meta = json.load(index)
+        store = cls(meta["points"], meta["seeds"], meta["rounds"], path)
+        store.version = meta["version"]
+        store.played = meta.get("played", store.played)
+        for name in store._shapes():
+            setattr(store, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+        return store
+
+    def _write_index(self):
+        with open(os.path.join(self.path, "index.json"), "w") as index:
+            json.dump({"version": self.version, "points": self.points, "seeds": self.seeds,
+                       "rounds": self.rounds, "series_fields": SERIES_FIELDS,
+                       "played": self.played}, index)
+
+    def spec(self):
+        """Datos (picklables) para que un worker se conecte a los mismos arrays."""
+        names = [segment.name for segment in self._segments]
+        return self.points, self.seeds, self.rounds, self.path, names
+
+    @classmethod
+    def attach(cls, spec):
+        points, seeds, rounds, path, names = spec
+        if path:
+            return cls.open(path, mode="r+")
+        store = cls(points, seeds, rounds)
+        for name, segment_name in zip(store._shapes(), names):
+            # Los workers comparten el resource tracker del padre: registrar otra vez
+            # el segmento no cambia nada y solo el padre hace unlink
+            segment = shared_memory.SharedMemory(name=segment_name)
+            store._segments.append(segment)
+            shape, dtype = store._shapes()[name]
+            setattr(store, name, np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+        return store
+
+    def row(self, point_index, seed_index):
+        return point_index * len(self.seeds) + seed_index
+
+    def rows(self, point_index):
+        """Filas jugadas de un punto (slice: las vistas no copian)."""
+        start = point_index * len(self.seeds)
+        return slice(start, start + self.played[point_index])
+
+    def write(self, row, result, series_rounds=0):
+        outcome = self.outcomes[row]
+        for name in OUTCOME_FIELDS:
+            outcome[name] = result[name]
+        outcome["series_rounds"] = series_rounds
+
+    def outcome(self, row):
+        """Resultado de una fila como dict (el formato de la cache)."""
+        outcome = self.outcomes[row]
+        return {name: outcome[name].item() for name in OUTCOME_FIELDS}
+
+    def flush(self):
+        if self.path and self._owner:
+            self._write_index()
+        for array in (self.outcomes, self.series):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def close(self):
+        """Soltar los arrays; el proceso que los creó libera también la memoria compartida.
+
+        Con memoria compartida no deben quedar vistas vivas de los arrays.
+        """
+        self.flush()
+        self.outcomes = self.series = None
+        for segment in self._segments:
+            segment.close()
+            if self._owner:
+                segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,259 @@
+"""
+Soak test: memory accounting for a long-lived server.
+
+Imports the app in this process (its own temporary SQLite store and history
+directory) and repeats a cycle until ``--duration`` or ``--cycles`` runs out:
+create simulations (one by one and in bulk), join some with Socket.IO test
+clients, step them, read their state, risk map and journal, auto-run half of
+them, then stop, disconnect and delete everything. After each cycle, once the
+auto-run threads are gone, their frames are emitted and the warm pool has refilled, it takes a
+``tracemalloc`` reading; the first ``--warmup`` cycles are left out as
+warm-up (caches, interned strings, metric series).
+
+The report gives the bytes per live simulation (traced memory with the
+cycle's simulations loaded minus the same reading after deleting them), the
+steady-state drift of the post-cycle readings, the object types whose live
+count grew and the source lines that allocated the growth. The exit status is
+1 when the drift exceeds ``--max-drift`` bytes or when threads or simulations
+outlive their cycle.
+
+    cd backend
+    python -m tools.soak --duration 3600
+    python -m tools.soak --cycles 50 --simulations 8 --output soak.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from flask_socketio.test_client import SocketIOTestClient
+
+from memory import process_memory, thread_names, type_counts
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_FRAMES = 8
+SETTLE_TIMEOUT = 10  # segundos de espera a que terminen los hilos y se rellene el pool
+
+
+def load_app(workdir):
+    """Importar app.py con un almacén y un historial propios en `workdir`."""
+    os.environ["SIMULATION_STORE"] = f"sqlite:///{os.path.join(workdir, 'simulations.db')}"
+    os.environ["HISTORY_SPILL_DIR"] = os.path.join(workdir, "history")
+    import app as web
+    return web
+
+
+def settle(web):
+    """Esperar a que acaben los hilos de auto_run, se emitan sus frames y el pool se rellene."""
+    expected = web.SIMULATION_POOL_SIZE * len(web.SIMULATION_POOL_BOARDS)
+    deadline = time.monotonic() + SETTLE_TIMEOUT
+    while time.monotonic() < deadline:
+        if not thread_names("auto-run-") and web.frame_pipeline.wait_idle(0) \
+                and web.simulation_pool.available() >= expected:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def traced_bytes():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def close_client(web, client):
+    """Desconectar un test client como lo haría un cliente real al cerrar el transporte.
+
+    El test client solo envía el DISCONNECT de Socket.IO: sin el cierre de
+    Engine.IO el servidor conserva su environ y su sesión, y el propio test
+    client se queda en un dict de clase.
+    """
+    client.disconnect()
+    web.socketio.server._handle_eio_disconnect(client.eio_sid)
+    SocketIOTestClient.clients.pop(client.eio_sid, None)
+
+
+def run_cycle(web, http, args):
+    """Un ciclo completo; devuelve los bytes trazados con sus simulaciones cargadas."""
+    ids = [http.post("/api/create_simulation", json={}).get_json()["simulation_id"]
+           for _ in range(args.simulations - args.simulations // 2)]
+    ids += http.post("/api/create_simulations",
+                     json={"count": args.simulations // 2}).get_json()["simulation_ids"]
+    for simulation_id in ids:
+        web.active_simulations[simulation_id].step_delay = args.step_delay
+
+    clients = []
+    for index, simulation_id in enumerate(ids[:args.clients]):
+        client = web.socketio.test_client(web.app)
+        client.emit("join_simulation", {"simulation_id": simulation_id,
+                                        "format": "binary" if index % 2 else "json"})
+        clients.append(client)
+
+    for simulation_id in ids:
+        for _ in range(args.steps):
+            http.post(f"/api/simulation/{simulation_id}/step")
+        http.get(f"/api/simulation/{simulation_id}/state")
+        http.get(f"/api/simulation/{simulation_id}/state?format=binary")
+        http.get(f"/api/simulation/{simulation_id}/risk?horizon=2")
+        http.get(f"/api/simulation/{simulation_id}/journal")
+
+    auto_ids = ids[::2]
+    for simulation_id in auto_ids:
+        http.post(f"/api/simulation/{simulation_id}/auto_start")
+    time.sleep(args.auto_seconds)
+    for client in clients:
+        client.get_received()
+    loaded = traced_bytes()
+
+    for simulation_id in auto_ids:
+        http.post(f"/api/simulation/{simulation_id}/auto_stop")
+    for client in clients:
+        close_client(web, client)
+    for simulation_id in ids:
+        http.delete(f"/api/simulation/{simulation_id}/delete")
+    return loaded, len(ids)
+
+
+def allocation_site(traceback):
+    """Línea que asignó la memoria y, si está fuera del backend, la última del backend que llevó a ella."""
+    innermost = traceback[-1]
+    site = f"{innermost.filename}:{innermost.lineno}"
+    for frame in reversed(traceback):
+        if frame.filename.startswith(BACKEND_DIR):
+            if frame is not innermost:
+                site += f" (from {os.path.relpath(frame.filename, BACKEND_DIR)}:{frame.lineno})"
+            break
+    return site
+
+
+def drift_slope(samples):
+    """Pendiente (bytes/hora) por mínimos cuadrados de [(segundos, bytes)]."""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = statistics.fmean(t for t, _ in samples)
+    mean_b = statistics.fmean(b for _, b in samples)
+    variance = sum((t - mean_t) ** 2 for t, _ in samples)
+    if variance == 0:
+        return 0.0
+    return sum((t - mean_t) * (b - mean_b) for t, b in samples) / variance * 3600
+
+
+def soak(web, args):
+    http = web.app.test_client()
+    start = time.monotonic()
+    per_simulation, baselines = [], []
+    steady_snapshot = steady_types = None
+    problems = []
+
+    cycle = 0
+    while (args.cycles is None or cycle < args.cycles) and \
+            (args.duration is None or time.monotonic() - start < args.duration):
+        loaded, count = run_cycle(web, http, args)
+        if not settle(web):
+            problems.append(f"cycle {cycle}: auto-run threads still alive: {thread_names('auto-run-')}")
+        if web.active_simulations:
+            problems.append(f"cycle {cycle}: {len(web.active_simulations)} simulations left loaded")
+            web.active_simulations.clear()
+
+        if cycle == args.warmup:
+            steady_types = type_counts()  # antes de medir: el propio Counter ocupa memoria
+        baseline = traced_bytes()
+        per_simulation.append((loaded - baseline) / count)
+        if cycle == args.warmup:
+            steady_snapshot = tracemalloc.take_snapshot()
+        if cycle >= args.warmup:
+            baselines.append((time.monotonic() - start, baseline))
+        cycle += 1
+        print(f"\rcycle {cycle}: {baseline / 1024:.0f} KiB traced", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+    report = {
+        "cycles": cycle,
+        "seconds": round(time.monotonic() - start, 1),
+        "bytes_per_simulation": round(statistics.median(per_simulation)) if per_simulation else None,
+        "process": process_memory(),
+        "problems": problems,
+    }
+    if len(baselines) >= 2:
+        window = max(1, min(3, len(baselines) // 2))
+        first = statistics.median(b for _, b in baselines[:window])
+        last = statistics.median(b for _, b in baselines[-window:])
+        report["steady_first_bytes"] = first
+        report["steady_last_bytes"] = last
+        report["drift_bytes"] = last - first
+        report["drift_bytes_per_hour"] = round(drift_slope(baselines))
+
+        grown = type_counts() - steady_types
+        report["leaked_objects"] = dict(grown.most_common(args.top))
+        stats = tracemalloc.take_snapshot().compare_to(steady_snapshot, "traceback")
+        report["top_growth"] = [
+            {"source": allocation_site(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in stats[:args.top] if stat.size_diff > 0
+        ]
+        if report["drift_bytes"] > args.max_drift:
+            problems.append(f"steady-state memory grew {report['drift_bytes']} bytes "
+                            f"(limit {args.max_drift})")
+    else:
+        problems.append(f"not enough cycles after the {args.warmup} warm-up cycles to measure drift")
+    return report
+
+
+def format_report(report):
+    lines = [f"{report['cycles']} cycles in {report['seconds']}s"]
+    if report["bytes_per_simulation"] is not None:
+        lines.append(f"bytes per live simulation: {report['bytes_per_simulation']}")
+    if "drift_bytes" in report:
+        lines.append(f"steady state: {report['steady_first_bytes'] / 1024:.0f} KiB -> "
+                     f"{report['steady_last_bytes'] / 1024:.0f} KiB "
+                     f"(drift {report['drift_bytes']:+d} bytes, {report['drift_bytes_per_hour']:+d} bytes/h)")
+        if report["leaked_objects"]:
+            lines.append("objects that grew since warm-up:")
+            lines.extend(f"  {count:+6d}  {name}" for name, count in report["leaked_objects"].items())
+        if report["top_growth"]:
+            lines.append("allocations that grew since warm-up:")
+            lines.extend(f"  {stat['size_diff']:+8d} B  {stat['source']}" for stat in report["top_growth"])
+    lines.extend(f"FAIL: {problem}" for problem in report["problems"])
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Rescue server soak test with memory accounting")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default: 300 without --cycles)")
+    parser.add_argument("--cycles", type=int, default=None, help="number of cycles to run")
+    parser.add_argument("--warmup", type=int, default=5, help="cycles left out of the drift measurement")
+    parser.add_argument("--simulations", type=int, default=6, help="simulations created per cycle")
+    parser.add_argument("--clients", type=int, default=4, help="Socket.IO test clients per cycle")
+    parser.add_argument("--steps", type=int, default=20, help="REST steps per simulation")
+    parser.add_argument("--auto-seconds", type=float, default=1.0, help="how long half the simulations auto-run")
+    parser.add_argument("--step-delay", type=float, default=0.01, help="auto-run delay between steps")
+    parser.add_argument("--max-drift", type=int, default=256 * 1024,
+                        help="allowed steady-state growth in bytes")
+    parser.add_argument("--top", type=int, default=15, help="rows in the leak tables")
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+    if args.duration is None and args.cycles is None:
+        args.duration = 300
+
+    tracemalloc.start(TRACE_FRAMES)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Los modelos escriben por consola en cada paso
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            web = load_app(workdir)
+            report = soak(web, args)
+            web.checkpoint_writer.flush()
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    sys.exit(1 if report["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Parameter sweep over game rules and board layouts.
+
+Every combination of the ``--param`` values is played with the same seeds in
+a process pool. Results are cached on disk (see ``tools/batch.py``), so
+rerunning a sweep with more values or seeds only plays the missing games.
+
+    cd backend
+    python -m tools.sweep --param max_rescuers=2,3,4 --param max_knockout_time=1,2,3 --seeds 200
+    python -m tools.sweep --param board=stock,tiled_2x2 --param firefighters=4,6,8 --output sweep.json
+    python -m tools.sweep --param max_rescuers=2,3 --seeds 1000 --no-cache --store data/runs/rescuers
+    python -m tools.sweep --param max_rescuers=2,3,4 --seeds 10000 --target-width 0.02
+
+Parameters are the ``GameRules`` fields (``models/gameRules.py``) plus
+``board`` and ``max_steps``. With ``--store`` the outcomes and per-round series
+are kept as memory-mapped ``.npy`` files (``tools/results.py``) that can be
+reopened with ``ResultStore.open`` for analysis.
+
+With ``--target-width`` ``--seeds`` is an upper bound: seeds are played in
+chunks and a point stops as soon as the 95% interval of ``--target-metric`` is
+that narrow. The ``games`` column shows how many seeds each point used.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from dataclasses import fields
+
+from models.fireRescueModel import MAX_SEED
+from models.gameRules import GameRules
+from tools.batch import DEFAULT_CACHE, DEFAULT_CHUNK, TARGET_METRICS, ResultCache, run_batch, summarize
+
+SWEEP_PARAMS = {field.name for field in fields(GameRules)} | {"board", "max_steps"}
+
+
+def parse_param(text):
+    name, _, values = text.partition("=")
+    if name not in SWEEP_PARAMS or not values:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME=V1,V2,... with NAME in {', '.join(sorted(SWEEP_PARAMS))}"
+        )
+    parsed = [value if name == "board" else int(value) for value in values.split(",")]
+    return name, parsed
+
+
+def build_points(params):
+    names = [name for name, _ in params]
+    return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in params))]
+
+
+def format_table(names, rows):
+    header = names + ["games", "win rate", "95% CI", "rescued", "lost", "damage", "rounds"]
+    lines = [header]
+    for point, summary in rows:
+        low, high = summary["win_rate_ci"]
+        lines.append(
+            [str(point.get(name, "")) for name in names]
+            + [
+                str(summary["games"]),
+                f"{summary['win_rate']:.1%}",
+                f"[{low:.1%}, {high:.1%}]",
+                f"{summary['mean_rescued']:.2f}",
+                f"{summary['mean_victims_lost']:.2f}",
+                f"{summary['mean_damage']:.1f}",
+                f"{summary['mean_rounds']:.1f}",
+            ]
+        )
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Rescue rule/layout parameter sweep")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="NAME=V1,V2,... (repeatable)")
+    parser.add_argument("--seeds", type=int, default=100, help="games per point (seeds 0..N-1)")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="pool size (default: CPU count)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="SQLite result cache")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--sort", choices=["params", "win_rate"], default="params")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--store", default=None,
+                        help="keep outcomes and per-round series as .npy files in this directory")
+    parser.add_argument("--target-width", type=float, default=None,
+                        help="stop each point once its 95%% CI is this wide (--seeds becomes the maximum)")
+    parser.add_argument("--target-metric", choices=TARGET_METRICS, default="win_rate")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK,
+                        help="seeds per point between precision checks")
+    args = parser.parse_args()
+    target = (args.target_metric, args.target_width) if args.target_width is not None else None
+
+    points = build_points(args.param)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    if seeds and not (0 <= seeds[0] and seeds[-1] < MAX_SEED):
+        parser.error(f"--first-seed/--seeds: seeds must be between 0 and {MAX_SEED - 1}")
+    cache = None if args.no_cache else ResultCache(args.cache)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print(f"\r{done}/{total} games", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    store, played = run_batch(points, seeds, args.processes, cache, progress, args.store,
+                              target=target, chunk=args.chunk)
+    elapsed = time.perf_counter() - start
+    if played:
+        print(file=sys.stderr)
+    if cache:
+        cache.close()
+
+    with store:
+        rows = [(point, summarize(store.outcomes[store.rows(index)])) for index, point in enumerate(points)]
+        games = sum(store.played)
+    if args.sort == "win_rate":
+        rows.sort(key=lambda row: row[1]["win_rate"], reverse=True)
+
+    print(format_table([name for name, _ in args.param], rows))
+    print(f"\n{games} games, {played} played, {games - played} cached, {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump([{"params": point, **summary} for point, summary in rows], output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Policy tournament with common random numbers.
+
+Every policy plays the same seeds, and the games are built with
+``split_streams``: fire spread and POI placement draw from their own random
+streams, so for a given seed every policy faces the same sequence of fire
+spots and POI draws whatever its firefighters do. Results are compared seed
+by seed against the first policy (the baseline); the paired differences have
+far less variance than comparing two independent samples, so a difference
+shows up with fewer games.
+
+    cd backend
+    python -m tools.tournament --seeds 500
+    python -m tools.tournament --policy greedy --policy routed --param max_rescuers=2,3
+    python -m tools.tournament --policy greedy --policy mypackage.policies:Cautious --no-cache
+
+Policies are the names in ``models/policies.py`` or ``module:ClassName`` for a
+``Policy`` subclass defined elsewhere. The result cache only tracks changes to
+``models/`` and the batch tools, so use ``--no-cache`` while iterating on a
+policy that lives outside them. ``--param`` takes the same rule/board values as ``tools.sweep``;
+each combination is a separate tournament.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from models.fireRescueModel import MAX_SEED
+from models.policies import POLICIES, resolve_policy
+from tools.batch import DEFAULT_CACHE, ResultCache, paired_difference, run_batch, summarize
+from tools.sweep import build_points, parse_param
+
+
+def build_variants(points, policies, split_streams=True):
+    """Un punto por (combinación de parámetros, política), agrupados por combinación."""
+    return [dict(point, policy=policy, split_streams=split_streams)
+            for point in points for policy in policies]
+
+
+def compare(outcomes, baseline):
+    """Resumen de una política y sus diferencias pareadas con la de referencia."""
+    return {
+        **summarize(outcomes),
+        "win_rate_diff": paired_difference(outcomes["won"], baseline["won"]),
+        "rescued_diff": paired_difference(outcomes["rescued"], baseline["rescued"]),
+    }
+
+
+def format_table(names, rows):
+    header = names + ["policy", "games", "win rate", "rescued", "Δ win rate", "95% CI", "Δ rescued", "95% CI"]
+    lines = [header]
+    for point, summary in rows:
+        win, rescued = summary["win_rate_diff"], summary["rescued_diff"]
+        lines.append(
+            [str(point.get(name, "")) for name in names]
+            + [
+                point["policy"],
+                str(summary["games"]),
+                f"{summary['win_rate']:.1%}",
+                f"{summary['mean_rescued']:.2f}",
+                f"{win['mean']:+.1%}",
+                f"[{win['ci'][0]:+.1%}, {win['ci'][1]:+.1%}]",
+                f"{rescued['mean']:+.2f}",
+                f"[{rescued['ci'][0]:+.2f}, {rescued['ci'][1]:+.2f}]",
+            ]
+        )
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Rescue policy tournament (paired seeds)")
+    parser.add_argument("--policy", action="append", default=[],
+                        help="policy name or module:Class (repeatable; the first one is the baseline; "
+                             f"default: {', '.join(POLICIES)})")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="NAME=V1,V2,... rule/board values, as in tools.sweep (repeatable)")
+    parser.add_argument("--seeds", type=int, default=200, help="games per policy (seeds 0..N-1)")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--independent", action="store_true",
+                        help="share one random stream between agents, fire and POIs (no common random numbers)")
+    parser.add_argument("--processes", type=int, default=None, help="pool size (default: CPU count)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="SQLite result cache")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    policies = args.policy or list(POLICIES)
+    for policy in policies:
+        try:
+            resolve_policy(policy)  # fallar aquí y no en cada worker
+        except (ValueError, ImportError, AttributeError) as error:
+            parser.error(f"--policy {policy}: {error}")
+
+    base_points = build_points(args.param)
+    points = build_variants(base_points, policies, split_streams=not args.independent)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    if seeds and not (0 <= seeds[0] and seeds[-1] < MAX_SEED):
+        parser.error(f"--first-seed/--seeds: seeds must be between 0 and {MAX_SEED - 1}")
+    cache = None if args.no_cache else ResultCache(args.cache)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print(f"\r{done}/{total} games", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    store, played = run_batch(points, seeds, args.processes, cache, progress)
+    elapsed = time.perf_counter() - start
+    if played:
+        print(file=sys.stderr)
+    if cache:
+        cache.close()
+
+    rows = []
+    with store:
+        for index, point in enumerate(points):
+            baseline_index = index - index % len(policies)
+            rows.append((point, compare(store.outcomes[store.rows(index)],
+                                        store.outcomes[store.rows(baseline_index)])))
+
+    print(format_table([name for name, _ in args.param], rows))
+    print(f"\nbaseline: {policies[0]}; {len(points) * len(seeds)} games, {played} played, "
+          f"{len(points) * len(seeds) - played} cached, {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump([{"params": point, **summary} for point, summary in rows], output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
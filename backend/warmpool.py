@@ -0,0 +1,71 @@
+"""
+Warm pool of pre-built simulations for fast creation.
+
+Creating a simulation means building a ``FireRescueModel`` (POI pool, initial
+POIs and fires, firefighter placement, Mesa grid and agent registration),
+writing the journal's first keyframe, encoding the first checkpoint and
+serializing the initial state. ``WarmPool`` keeps up to ``size`` items with
+all of that already done per scenario (a board name, see
+``models.boardLayouts.build_board``), each model with its own random seed.
+``take`` hands one out in O(1) and wakes the background refill task; when the
+pool is empty the caller builds the item itself. A factory that raises is
+logged and retried after ``RETRY_DELAY`` seconds; it does not stop the refill
+task.
+"""
+
+import threading
+import traceback
+from collections import deque
+
+RETRY_DELAY = 5.0  # segundos antes de reintentar tras un fallo de una factory
+
+
+class WarmPool:
+    def __init__(self, factories, size):
+        # factories: {escenario: función sin argumentos que construye un elemento nuevo}
+        self.factories = dict(factories)
+        self.size = size
+        self._items = {scenario: deque() for scenario in self.factories}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def take(self, scenario):
+        """Elemento listo del escenario, o None si no está precalentado o se agotó."""
+        with self._lock:
+            items = self._items.get(scenario)
+            item = items.popleft() if items else None
+        if item is not None:
+            self._wake.set()
+        return item
+
+    def available(self, scenario=None):
+        with self._lock:
+            if scenario is not None:
+                return len(self._items.get(scenario, ()))
+            return sum(len(items) for items in self._items.values())
+
+    def fill(self):
+        """Construir elementos hasta llenar el pool; devuelve cuántos se construyeron."""
+        built = 0
+        for scenario, factory in self.factories.items():
+            while self.available(scenario) < self.size:
+                # Construir fuera del lock: take() nunca espera a una construcción
+                item = factory()
+                with self._lock:
+                    self._items[scenario].append(item)
+                built += 1
+        return built
+
+    def run(self):
+        """Tarea de fondo: rellenar el pool cada vez que se saca un elemento."""
+        while True:
+            try:
+                self.fill()
+            except Exception:
+                # Sin el pool las simulaciones se construyen al pedirlas; reintentar más tarde
+                traceback.print_exc()
+                self._wake.wait(RETRY_DELAY)
+                self._wake.clear()
+                continue
+            self._wake.wait()
+            self._wake.clear()
@@ -19,6 +19,12 @@ const WALL_TYPES = {
   4: "door-closed",
 };
 
+// Formato de estado negociado con el servidor ("binary" por defecto, ?format=json para JSON)
+const STATE_FORMAT =
+  new URLSearchParams(window.location.search).get("format") === "json"
+    ? "json"
+    : "binary";
+
 // Inicialización
 document.addEventListener("DOMContentLoaded", function () {
   initializeSimulation();
@@ -67,11 +73,17 @@ function initializeSocket() {
   socket.on("connect", function () {
     console.log("Connected to server");
     if (simulationId) {
-      socket.emit("join_simulation", { simulation_id: simulationId });
+      socket.emit("join_simulation", {
+        simulation_id: simulationId,
+        format: STATE_FORMAT,
+      });
     }
   });
 
   socket.on("simulation_update", function (state) {
+    if (state instanceof ArrayBuffer) {
+      state = decodeBinaryState(state);
+    }
     updateDisplay(state);
   });
 
@@ -113,14 +125,17 @@ async function createNewSimulation() {
       
       // Join new simulation room for WebSocket updates
       if (socket) {
-        socket.emit("join_simulation", { simulation_id: simulationId });
+        socket.emit("join_simulation", {
+          simulation_id: simulationId,
+          format: STATE_FORMAT,
+        });
       }
       
       // Reset auto running state
       autoRunning = false;
       
       // Clear log history for new simulation
-      logHistory = [];
+      resetActivityLog();
       
       updateDisplay(data.state);
     } else {
@@ -253,23 +268,45 @@ function updateControlButtons() {
   }
 }
 
+// Render por requestAnimationFrame: los updates que llegan entre dos frames se
+// agrupan y solo se pinta el último estado
+let pendingState = null;
+let renderScheduled = false;
+let gameOverShown = false;
+
 function updateDisplay(state) {
   currentState = state;
+  // Los logs se acumulan en cada estado aunque ese estado no llegue a pintarse
+  recordLogs(state.logs, state.round_count, state.step_count);
+  pendingState = state;
+  if (!renderScheduled) {
+    renderScheduled = true;
+    requestAnimationFrame(renderPendingState);
+  }
+}
+
+function renderPendingState() {
+  renderScheduled = false;
+  const state = pendingState;
+  pendingState = null;
+  if (state) {
+    renderState(state);
+  }
+}
 
+function renderState(state) {
   // Actualizar estadísticas principales
-  document.getElementById("round-count").textContent = state.round_count;
-  document.getElementById("current-phase").textContent = translatePhase(
-    state.phase
-  );
-  document.getElementById("rescued-count").textContent = state.rescued_victims;
-  document.getElementById("lost-count").textContent = state.lost_victims;
-  document.getElementById("damage-count").textContent = state.damage_count;
-  document.getElementById("step-count").textContent = state.step_count;
+  setText("round-count", state.round_count);
+  setText("current-phase", translatePhase(state.phase));
+  setText("rescued-count", state.rescued_victims);
+  setText("lost-count", state.lost_victims);
+  setText("damage-count", state.damage_count);
+  setText("step-count", state.step_count);
 
   // Actualizar estadísticas de fuego
-  document.getElementById("fire-count").textContent = state.stats.fire_count;
-  document.getElementById("smoke-count").textContent = state.stats.smoke_count;
-  document.getElementById("clear-count").textContent = state.stats.clear_count;
+  setText("fire-count", state.stats.fire_count);
+  setText("smoke-count", state.stats.smoke_count);
+  setText("clear-count", state.stats.clear_count);
 
   // Actualizar tablero
   updateGameBoard(state);
@@ -281,68 +318,182 @@ function updateDisplay(state) {
   updatePOIsList(state.pois);
 
   // Actualizar activity log
-  updateActivityLog(state.logs, state.round_count);
+  renderActivityLog();
 
   // Update control buttons based on current state
   updateControlButtons();
 
-  // Verificar fin del juego
+  // Verificar fin del juego (el modal se muestra una vez por partida)
   if (state.game_over) {
     autoRunning = false; // Stop auto if game ends
-    showGameOverModal(state);
+    if (!gameOverShown) {
+      gameOverShown = true;
+      showGameOverModal(state);
+    }
+  } else {
+    gameOverShown = false;
   }
 }
 
-function updateGameBoard(state) {
-  const board = document.getElementById("game-board");
-  board.innerHTML = "";
+function setText(id, value) {
+  const element = document.getElementById(id);
+  const text = String(value);
+  if (element.textContent !== text) {
+    element.textContent = text;
+  }
+}
+
+// Tablero con nodos persistentes: cada celda recuerda el fuego y las paredes que
+// pinta, y agentes y POIs se indexan por id, así que solo se toca lo que cambió
+const boardView = {
+  width: 0,
+  height: 0,
+  cells: [], // {element, fire, walls}
+  agents: new Map(), // id -> {element, cell, slot, signature}
+  pois: new Map(), // id -> {element, cell, signature}
+};
 
+function updateGameBoard(state) {
   const height = state.fire_states.length;
   const width = state.fire_states[0].length;
+  if (width !== boardView.width || height !== boardView.height) {
+    buildBoard(width, height);
+  }
+
+  for (let y = 0; y < height; y++) {
+    const fireRow = state.fire_states[y];
+    const wallRow = state.grid_data[y];
+    for (let x = 0; x < width; x++) {
+      const cell = boardView.cells[y * width + x];
+      const fire = fireRow[x];
+      if (cell.fire !== fire) {
+        cell.element.classList.remove(FIRE_STATES[cell.fire]);
+        cell.element.classList.add(FIRE_STATES[fire]);
+        cell.fire = fire;
+      }
+      const walls = wallRow[x].join("");
+      if (cell.walls !== walls) {
+        cell.element
+          .querySelectorAll(":scope > .wall, :scope > .door")
+          .forEach((element) => element.remove());
+        // Las paredes van antes que agentes y POIs, como al crear la celda
+        const fragment = document.createDocumentFragment();
+        addWallClasses(fragment, wallRow[x]);
+        cell.element.prepend(fragment);
+        cell.walls = walls;
+      }
+    }
+  }
+
+  updateBoardAgents(state.agents, state.current_agent_index);
+  updateBoardPOIs(state.pois);
+}
+
+function buildBoard(width, height) {
+  const board = document.getElementById("game-board");
+  board.innerHTML = "";
+  // Solo las dimensiones: el tamaño de celda lo decide el CSS (--cell-size)
+  board.style.setProperty("--board-columns", width);
+  board.style.setProperty("--board-rows", height);
+  boardView.width = width;
+  boardView.height = height;
+  boardView.cells = [];
+  boardView.agents.clear();
+  boardView.pois.clear();
 
   for (let y = 0; y < height; y++) {
     for (let x = 0; x < width; x++) {
-      const cell = createCell(x, y, state);
-      board.appendChild(cell);
+      const element = document.createElement("div");
+      element.className = "cell clear";
+      element.id = `cell-${x}-${y}`;
+      board.appendChild(element);
+      boardView.cells.push({ element: element, fire: 0, walls: "" });
     }
   }
 }
 
-function createCell(x, y, state) {
-  const cell = document.createElement("div");
-  cell.className = "cell";
-  cell.id = `cell-${x}-${y}`;
+function cellAt(x, y) {
+  return boardView.cells[y * boardView.width + x].element;
+}
 
-  // Estado de fuego
-  const fireState = state.fire_states[y][x];
-  cell.classList.add(FIRE_STATES[fireState]);
+function updateBoardAgents(agents, currentAgentIndex) {
+  const seen = new Set();
+  const slots = new Map(); // celda -> agentes ya colocados en ella
 
-  // Paredes
-  const cellData = state.grid_data[y][x];
-  addWallClasses(cell, cellData);
+  agents.forEach((agent) => {
+    seen.add(agent.id);
+    let view = boardView.agents.get(agent.id);
+    if (!view) {
+      view = { element: document.createElement("div"), cell: null, slot: -1, signature: "" };
+      boardView.agents.set(agent.id, view);
+    }
+    if (!agent.pos) {
+      view.element.remove();
+      view.cell = null;
+      return;
+    }
 
-  // Agentes en esta celda
-  const agentsInCell = state.agents.filter(
-    (agent) => agent.pos && agent.pos[0] === x && agent.pos[1] === y
-  );
+    const key = agent.pos[1] * boardView.width + agent.pos[0];
+    const slot = slots.get(key) || 0;
+    slots.set(key, slot + 1);
+    if (view.cell !== key) {
+      cellAt(agent.pos[0], agent.pos[1]).appendChild(view.element);
+      view.cell = key;
+    }
+    if (view.slot !== slot) {
+      // Posición múltiple de agentes
+      view.element.style.left = `${2 + (slot % 2) * 14}px`;
+      view.element.style.top = `${2 + Math.floor(slot / 2) * 14}px`;
+      view.slot = slot;
+    }
 
-  agentsInCell.forEach((agent, index) => {
-    const agentElement = createAgentElement(
-      agent,
-      index,
-      state.current_agent_index
-    );
-    cell.appendChild(agentElement);
+    const signature = [
+      agent.role,
+      agent.carrying_victim,
+      agent.is_knocked_out,
+      agent.id === currentAgentIndex,
+      agent.action_points,
+    ].join("|");
+    if (view.signature !== signature) {
+      styleAgentElement(view.element, agent, currentAgentIndex);
+      view.signature = signature;
+    }
   });
 
-  // POIs en esta celda
-  const poisInCell = state.pois.filter((poi) => poi.x === x && poi.y === y);
-  poisInCell.forEach((poi) => {
-    const poiElement = createPOIElement(poi);
-    cell.appendChild(poiElement);
+  removeMissing(boardView.agents, seen);
+}
+
+function updateBoardPOIs(pois) {
+  const seen = new Set();
+  pois.forEach((poi) => {
+    seen.add(poi.id);
+    let view = boardView.pois.get(poi.id);
+    if (!view) {
+      view = { element: document.createElement("div"), cell: null, signature: "" };
+      boardView.pois.set(poi.id, view);
+    }
+    const key = poi.y * boardView.width + poi.x;
+    if (view.cell !== key) {
+      cellAt(poi.x, poi.y).appendChild(view.element);
+      view.cell = key;
+    }
+    const signature = `${poi.type}|${poi.revealed}`;
+    if (view.signature !== signature) {
+      stylePOIElement(view.element, poi);
+      view.signature = signature;
+    }
   });
 
-  return cell;
+  removeMissing(boardView.pois, seen);
+}
+
+function removeMissing(views, seen) {
+  views.forEach((view, id) => {
+    if (!seen.has(id)) {
+      view.element.remove();
+      views.delete(id);
+    }
+  });
 }
 
 function addWallClasses(cell, cellData) {
@@ -377,15 +528,10 @@ function addWallClasses(cell, cellData) {
   });
 }
 
-function createAgentElement(agent, index, currentAgentIndex) {
-  const agentElement = document.createElement("div");
+function styleAgentElement(agentElement, agent, currentAgentIndex) {
   agentElement.className = "agent";
   agentElement.textContent = agent.id;
 
-  // Posición múltiple de agentes
-  agentElement.style.left = `${2 + (index % 2) * 14}px`;
-  agentElement.style.top = `${2 + Math.floor(index / 2) * 14}px`;
-
   // Rol del agente
   if (agent.carrying_victim) {
     agentElement.classList.add("carrying");
@@ -409,12 +555,9 @@ function createAgentElement(agent, index, currentAgentIndex) {
   agentElement.title = `Agent ${agent.id} - ${agent.role || "No Role"} - AP: ${
     agent.action_points
   }`;
-
-  return agentElement;
 }
 
-function createPOIElement(poi) {
-  const poiElement = document.createElement("div");
+function stylePOIElement(poiElement, poi) {
   poiElement.className = "poi";
   poiElement.textContent = poi.id;
 
@@ -431,16 +574,38 @@ function createPOIElement(poi) {
   poiElement.title = `POI ${poi.id} - ${poi.type} - ${
     poi.revealed ? "Revealed" : "Hidden"
   }`;
-
-  return poiElement;
 }
 
+// Listas laterales indexadas por id: un elemento solo se reescribe si su contenido cambia
+const agentItems = new Map(); // id -> {element, signature}
+const poiItems = new Map();
+
 function updateAgentsList(agents, currentAgentIndex) {
   const agentsList = document.getElementById("agents-list");
-  agentsList.innerHTML = "";
+  const seen = new Set();
+
+  agents.forEach((agent, index) => {
+    seen.add(agent.id);
+    let item = agentItems.get(agent.id);
+    if (!item) {
+      item = { element: document.createElement("div"), signature: "" };
+      agentItems.set(agent.id, item);
+    }
+    if (agentsList.children[index] !== item.element) {
+      agentsList.insertBefore(item.element, agentsList.children[index] || null);
+    }
 
-  agents.forEach((agent) => {
-    const agentItem = document.createElement("div");
+    const signature = [
+      agent.role,
+      agent.carrying_victim,
+      agent.is_knocked_out,
+      agent.id === currentAgentIndex,
+      agent.action_points,
+    ].join("|");
+    if (item.signature === signature) return;
+    item.signature = signature;
+
+    const agentItem = item.element;
     agentItem.className = "agent-item";
 
     if (agent.id === currentAgentIndex) {
@@ -462,22 +627,43 @@ function updateAgentsList(agents, currentAgentIndex) {
                 <span class="agent-ap">${agent.action_points} AP</span>
             </div>
         `;
-
-    agentsList.appendChild(agentItem);
   });
+
+  removeMissing(agentItems, seen);
 }
 
 function updatePOIsList(pois) {
   const poisList = document.getElementById("pois-list");
-  poisList.innerHTML = "";
+  const empty = poisList.querySelector(":scope > .text-muted");
 
   if (pois.length === 0) {
-    poisList.innerHTML = '<div class="text-muted">No active POIs</div>';
+    removeMissing(poiItems, new Set());
+    if (!empty) {
+      poisList.innerHTML = '<div class="text-muted">No active POIs</div>';
+    }
     return;
   }
+  if (empty) {
+    empty.remove();
+  }
 
-  pois.forEach((poi) => {
-    const poiItem = document.createElement("div");
+  const seen = new Set();
+  pois.forEach((poi, index) => {
+    seen.add(poi.id);
+    let item = poiItems.get(poi.id);
+    if (!item) {
+      item = { element: document.createElement("div"), signature: "" };
+      poiItems.set(poi.id, item);
+    }
+    if (poisList.children[index] !== item.element) {
+      poisList.insertBefore(item.element, poisList.children[index] || null);
+    }
+
+    const signature = `${poi.x}|${poi.y}|${poi.type}|${poi.revealed}`;
+    if (item.signature === signature) return;
+    item.signature = signature;
+
+    const poiItem = item.element;
     poiItem.className = "poi-item";
 
     if (poi.type === "FALSE") {
@@ -502,9 +688,9 @@ function updatePOIsList(pois) {
                 ${poi.revealed ? "👁️" : "❓"}
             </div>
         `;
-
-    poisList.appendChild(poiItem);
   });
+
+  removeMissing(poiItems, seen);
 }
 
 function showGameOverModal(state) {
@@ -568,50 +754,197 @@ function translateRole(role) {
 }
 
 // Activity Log
-let logHistory = [];
-
-function updateActivityLog(logs, roundCount) {
+const MAX_LOG_ENTRIES = 100;
+// Entradas registradas que todavía no están en el DOM
+let unrenderedLogs = [];
+// Tras "clear" el contenedor muestra un aviso que se quita con la siguiente entrada
+let logPlaceholder = false;
+// Los logs van ligados a un paso: el mismo estado puede llegar por REST y por socket
+let lastLoggedStep = null;
+
+function recordLogs(logs, roundCount, stepCount) {
+  if (stepCount === lastLoggedStep) return;
+  lastLoggedStep = stepCount;
   if (!logs || logs.length === 0) return;
-  
-  const logContainer = document.getElementById("activity-log");
-  
+
   // Add new logs to history with round info
-  logs.forEach(log => {
-    logHistory.push({
-      ...log,
-      round: roundCount
-    });
+  logs.forEach((log) => {
+    unrenderedLogs.push({ ...log, round: roundCount });
   });
-  
+
   // Keep only last 100 log entries
-  if (logHistory.length > 100) {
-    logHistory = logHistory.slice(-100);
-  }
-  
-  // Render logs (newest first)
-  logContainer.innerHTML = "";
-  
-  // Group logs and display newest first
-  const reversedLogs = [...logHistory].reverse();
-  
-  reversedLogs.forEach((log) => {
+  if (unrenderedLogs.length > MAX_LOG_ENTRIES) {
+    unrenderedLogs = unrenderedLogs.slice(-MAX_LOG_ENTRIES);
+  }
+}
+
+function renderActivityLog() {
+  if (unrenderedLogs.length === 0) return;
+
+  const logContainer = document.getElementById("activity-log");
+  if (logPlaceholder) {
+    logContainer.innerHTML = "";
+    logPlaceholder = false;
+  }
+
+  // Las entradas nuevas van arriba (newest first)
+  const fragment = document.createDocumentFragment();
+  for (let i = unrenderedLogs.length - 1; i >= 0; i--) {
+    const log = unrenderedLogs[i];
     const logEntry = document.createElement("div");
     logEntry.className = `log-entry ${log.type}`;
-    
+
     logEntry.innerHTML = `
       <span class="log-round">R${log.round}</span>
       <span class="log-message">${log.message}</span>
     `;
-    
-    logContainer.appendChild(logEntry);
-  });
-  
+
+    fragment.appendChild(logEntry);
+  }
+  unrenderedLogs = [];
+  logContainer.prepend(fragment);
+
+  while (logContainer.children.length > MAX_LOG_ENTRIES) {
+    logContainer.lastElementChild.remove();
+  }
+
   // Scroll to top to show newest
   logContainer.scrollTop = 0;
 }
 
+function resetActivityLog() {
+  unrenderedLogs = [];
+  lastLoggedStep = null;
+  logPlaceholder = false;
+  document.getElementById("activity-log").innerHTML = "";
+}
+
 function clearActivityLog() {
-  logHistory = [];
+  unrenderedLogs = [];
+  logPlaceholder = true;
   const logContainer = document.getElementById("activity-log");
   logContainer.innerHTML = '<div class="log-entry info"><span class="log-message">Log cleared</span></div>';
 }
+
+// Decodificador del formato binario (ver backend/codec.py)
+const BINARY_PHASES = ["AGENT_TURN", "FIRE_SPREAD"];
+const BINARY_ROLES = [null, "rescuer", "extinguisher"];
+const BINARY_POI_TYPES = ["false", "victim"];
+
+function decodeBinaryState(buffer) {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  const textDecoder = new TextDecoder("utf-8");
+
+  // "FRS" + version 1
+  if (bytes[0] !== 70 || bytes[1] !== 82 || bytes[2] !== 83 || bytes[3] !== 1) {
+    throw new Error("Unsupported binary state");
+  }
+
+  const width = view.getUint16(4, true);
+  const height = view.getUint16(6, true);
+  const stepCount = view.getUint32(8, true);
+  const roundCount = view.getUint32(12, true);
+  const phase = BINARY_PHASES[view.getUint8(16)];
+  const currentAgentIndex = view.getUint8(17);
+  const flags = view.getUint8(18);
+  const damageCount = view.getUint16(19, true);
+  const rescued = view.getUint16(21, true);
+  const lost = view.getUint16(23, true);
+  const agentCount = view.getUint16(25, true);
+  const poiCount = view.getUint16(27, true);
+  let offset = 29;
+
+  // Fuego: 2 bits por celda
+  const stats = { fire_count: 0, smoke_count: 0, clear_count: 0 };
+  const fireStates = [];
+  for (let y = 0; y < height; y++) {
+    const row = [];
+    for (let x = 0; x < width; x++) {
+      const index = y * width + x;
+      const code = (bytes[offset + (index >> 2)] >> ((index & 3) * 2)) & 3;
+      row.push(code);
+      if (code === 2) stats.fire_count++;
+      else if (code === 1) stats.smoke_count++;
+      else stats.clear_count++;
+    }
+    fireStates.push(row);
+  }
+  offset += Math.ceil((width * height) / 4);
+
+  // Paredes: 3 bits por borde (top, right, bottom, left)
+  const gridData = [];
+  let edge = 0;
+  for (let y = 0; y < height; y++) {
+    const row = [];
+    for (let x = 0; x < width; x++) {
+      const cell = [];
+      for (let direction = 0; direction < 4; direction++) {
+        let value = 0;
+        for (let bit = 0; bit < 3; bit++) {
+          const position = edge * 3 + bit;
+          value |= ((bytes[offset + (position >> 3)] >> (position & 7)) & 1) << bit;
+        }
+        cell.push(value);
+        edge++;
+      }
+      row.push(cell);
+    }
+    gridData.push(row);
+  }
+  offset += Math.ceil((width * height * 4 * 3) / 8);
+
+  const agents = [];
+  for (let i = 0; i < agentCount; i++) {
+    const knockoutTimer = view.getUint8(offset + 10);
+    agents.push({
+      id: view.getUint16(offset, true),
+      pos: [view.getUint16(offset + 2, true), view.getUint16(offset + 4, true)],
+      role: BINARY_ROLES[view.getUint8(offset + 6)],
+      action_points: view.getUint8(offset + 7),
+      carrying_victim: view.getUint16(offset + 8, true) || null,
+      knockout_timer: knockoutTimer,
+      is_knocked_out: knockoutTimer > 0,
+    });
+    offset += 11;
+  }
+
+  const pois = [];
+  for (let i = 0; i < poiCount; i++) {
+    pois.push({
+      id: view.getUint16(offset, true),
+      x: view.getUint16(offset + 2, true),
+      y: view.getUint16(offset + 4, true),
+      type: BINARY_POI_TYPES[view.getUint8(offset + 6)],
+      revealed: view.getUint8(offset + 7) === 1,
+    });
+    offset += 8;
+  }
+
+  const reasonLength = view.getUint16(offset, true);
+  offset += 2;
+  const endReason = textDecoder.decode(bytes.subarray(offset, offset + reasonLength));
+  offset += reasonLength;
+  const logsLength = view.getUint32(offset, true);
+  offset += 4;
+  const logs = JSON.parse(textDecoder.decode(bytes.subarray(offset, offset + logsLength)));
+
+  return {
+    step_count: stepCount,
+    round_count: roundCount,
+    phase: phase,
+    current_agent_index: currentAgentIndex,
+    fire_states: fireStates,
+    grid_data: gridData,
+    agents: agents,
+    pois: pois,
+    rescued_victims: rescued,
+    lost_victims: lost,
+    damage_count: damageCount,
+    game_over: (flags & 1) !== 0,
+    game_won: (flags & 2) !== 0,
+    end_reason: endReason,
+    stats: stats,
+    logs: logs,
+  };
+}